@@ -0,0 +1,78 @@
+# dashboard/estatisticas.py
+"""
+Cache das estatísticas do dashboard.
+
+As contagens só mudam quando clientes ou pessoas são criados, apagados ou
+reclassificados, mas o dashboard pede as estatísticas a cada carregamento de
+página. Por isso o resultado fica no cache (por DASHBOARD_STATS_TTL segundos,
+no máximo) e é descartado pelos sinais em dashboard/signals.py assim que os
+dados mudam. Junto com o resultado guardamos um ETag e a data da última
+alteração, para que o front-end receba 304 quando nada mudou.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from usuarios.models import Cliente, Pessoa
+
+CHAVE_STATS = 'dashboard:stats'
+# Guarda o ETag e a data da última mudança real, sem expirar, para que a
+# Last-Modified não avance só porque o TTL venceu e os números são os mesmos.
+CHAVE_ULTIMA_VERSAO = 'dashboard:stats:ultima-versao'
+
+
+def calcular_stats():
+    # Contagem total de clientes (pessoas com o papel de cliente)
+    total_clientes = Cliente.objects.count()
+
+    # Contagem total de leads (todas as Pessoas que NÃO são clientes)
+    total_leads = Pessoa.objects.exclude(cliente__isnull=False).count()
+
+    # Agrupa os clientes pela situação e conta quantos há em cada grupo
+    contagem_por_situacao = Cliente.objects.values('situacao').annotate(
+        count=Count('situacao')
+    ).order_by('-count') # Ordena do maior para o menor
+
+    # Agrupa os clientes pela classificação do modelo de ML e conta
+    contagem_por_classificacao = Cliente.objects.values('classificacao').annotate(
+        count=Count('classificacao')
+    ).order_by('-count')
+
+    # Monta o objeto JSON final que será enviado ao front-end
+    return {
+        "total_clientes": total_clientes,
+        "total_leads": total_leads,
+        "contagem_por_situacao": list(contagem_por_situacao),
+        "contagem_por_classificacao": list(contagem_por_classificacao),
+    }
+
+
+def obter_stats():
+    """
+    Retorna um dicionário com 'stats', 'etag' e 'atualizado_em',
+    recalculando as estatísticas só se não estiverem no cache.
+    """
+    entrada = cache.get(CHAVE_STATS)
+    if entrada is not None:
+        return entrada
+
+    stats = calcular_stats()
+    etag = hashlib.md5(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+    ultima = cache.get(CHAVE_ULTIMA_VERSAO)
+    if ultima is not None and ultima['etag'] == etag:
+        atualizado_em = ultima['atualizado_em']
+    else:
+        atualizado_em = timezone.now().replace(microsecond=0)
+        cache.set(CHAVE_ULTIMA_VERSAO, {'etag': etag, 'atualizado_em': atualizado_em}, None)
+
+    entrada = {'stats': stats, 'etag': etag, 'atualizado_em': atualizado_em}
+    cache.set(CHAVE_STATS, entrada, getattr(settings, 'DASHBOARD_STATS_TTL', 60))
+    return entrada
+
+
+def invalidar_stats():
+    cache.delete(CHAVE_STATS)
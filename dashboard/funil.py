@@ -0,0 +1,198 @@
+# dashboard/funil.py
+"""
+Funil de conversão lead -> cliente -> venda.
+
+Etapas, para cada pessoa que não é usuário do sistema:
+
+- lead: toda pessoa (clientes inclusive: todo cliente já foi lead);
+- cliente: a pessoa tem cadastro de Cliente;
+- comprador: o cliente tem pelo menos uma venda no intervalo pedido.
+
+O tempo até a venda é medido do primeiro atendimento do cliente até a
+primeira venda dele no intervalo (Pessoa e Cliente não guardam data de
+criação, então o primeiro contato registrado é o começo do funil). Clientes
+sem atendimento antes da venda ficam de fora da mediana.
+
+O tempo em cada etapa (situação do cliente) sai do HistoricoSituacao: é o
+intervalo entre a mudança que levou o cliente à etapa e a que o tirou dela,
+contado para as saídas dentro do intervalo pedido. A passagem por NOVO só
+conta o tempo se a entrada nela também estiver no histórico.
+
+O cálculo é feito por um único motor: três consultas (pessoas em blocos pela
+chave primária, primeira venda por cliente e primeiro atendimento por
+cliente, as duas últimas com GROUP BY no banco, sobre os índices
+(cliente, -data)) juntadas num DataFrame; cada quebra (município, faixa
+etária, faixa de lead_score, classificação) é um groupby vetorizado. O
+resultado fica no cache por intervalo de datas, até que pessoas, clientes,
+situações ou vendas mudem (dashboard/signals.py) ou o DASHBOARD_FUNIL_TTL vença.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from operacoes.models import Atendimento, Venda
+from operacoes.resumos import filtrar_intervalo
+from usuarios.models import Cliente, HistoricoSituacao, Pessoa
+from .vendas import nova_versao
+
+TAMANHO_LOTE_PADRAO = 5000
+CHAVE_VERSAO = 'dashboard:funil:versao'
+
+MUNICIPIO_DESCONHECIDO = 'Desconhecido'
+SEM_IDADE = 'Sem idade'
+SEM_CADASTRO = 'Lead sem cadastro de cliente'
+
+# Faixas [início, fim) de idade e de lead_score.
+FAIXAS_ETARIAS = ([0, 25, 35, 45, 55, 65, np.inf], ['até 24', '25-34', '35-44', '45-54', '55-64', '65+'])
+FAIXAS_LEAD_SCORE = ([-np.inf, 4, 7, np.inf], ['0-3', '4-6', '7+'])
+
+# Nome da quebra na resposta -> coluna do DataFrame.
+QUEBRAS = {
+    'por_municipio': 'municipio',
+    'por_faixa_etaria': 'faixa_etaria',
+    'por_lead_score': 'faixa_lead_score',
+    'por_classificacao': 'classificacao',
+}
+
+
+def em_blocos(linhas, colunas, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Lê um values_list (com a chave primária na primeira coluna) em blocos pela chave, num DataFrame."""
+    linhas = linhas.order_by('pk')
+    blocos = []
+    ultimo_pk = None
+    while True:
+        lote = linhas if ultimo_pk is None else linhas.filter(pk__gt=ultimo_pk)
+        lote = list(lote[:tamanho_lote])
+        if not lote:
+            break
+        ultimo_pk = lote[-1][0]
+        blocos.append(pd.DataFrame(lote, columns=colunas))
+    if not blocos:
+        return pd.DataFrame(columns=colunas)
+    return pd.concat(blocos, ignore_index=True)
+
+
+def carregar_pessoas(tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """DataFrame com uma linha por pessoa (sem os usuários)."""
+    pessoas = Pessoa.objects.filter(usuario__isnull=True) \
+        .values_list('pk', 'endereco', 'idade', 'lead_score', 'cliente__classificacao')
+    return em_blocos(pessoas, ['pessoa_id', 'endereco', 'idade', 'lead_score', 'classificacao'], tamanho_lote)
+
+
+def primeira_data(queryset, campo_data, nome):
+    """Série {cliente_id: menor data}, calculada com GROUP BY no banco."""
+    linhas = queryset.order_by().values('cliente').annotate(primeira=Min(campo_data)).values_list('cliente', 'primeira')
+    serie = pd.Series(dict(linhas), name=nome, dtype=object)
+    return pd.to_datetime(serie, utc=True)
+
+
+def montar_dados(inicio=None, fim=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Uma linha por pessoa com as colunas das quebras e as etapas do funil."""
+    dados = carregar_pessoas(tamanho_lote)
+    primeira_venda = primeira_data(filtrar_intervalo(Venda.objects.all(), inicio, fim), 'data_venda', 'primeira_venda')
+    primeiro_contato = primeira_data(Atendimento.objects.all(), 'data_atendimento', 'primeiro_contato')
+    dados = dados.join(primeira_venda, on='pessoa_id').join(primeiro_contato, on='pessoa_id')
+
+    dados['cliente'] = dados['classificacao'].notna()
+    dados['comprador'] = dados['primeira_venda'].notna()
+    dias = (dados['primeira_venda'] - dados['primeiro_contato']).dt.total_seconds() / 86400
+    # Atendimento registrado só depois da venda não diz nada sobre o tempo até ela.
+    dados['dias_ate_venda'] = dias.where(dias >= 0)
+
+    dados['municipio'] = dados['endereco'].replace('', np.nan).fillna(MUNICIPIO_DESCONHECIDO)
+    idades = pd.to_numeric(dados['idade'], errors='coerce')
+    dados['faixa_etaria'] = faixas(idades, FAIXAS_ETARIAS).fillna(SEM_IDADE)
+    dados['faixa_lead_score'] = faixas(pd.to_numeric(dados['lead_score']), FAIXAS_LEAD_SCORE)
+    rotulos = dict(Cliente.ClassificacaoCliente.choices)
+    dados['classificacao'] = dados['classificacao'].map(rotulos).fillna(SEM_CADASTRO)
+    return dados
+
+
+def faixas(valores, limites_e_rotulos):
+    limites, rotulos = limites_e_rotulos
+    return pd.cut(valores, limites, labels=rotulos, right=False).astype(object)
+
+
+def resumir(grupos):
+    """Contagens, taxas e mediana de um groupby (ou do DataFrame inteiro)."""
+    resumo = grupos.agg(
+        leads=('pessoa_id', 'size'),
+        clientes=('cliente', 'sum'),
+        compradores=('comprador', 'sum'),
+        vendas_com_tempo=('dias_ate_venda', 'count'),
+        mediana_dias_ate_venda=('dias_ate_venda', 'median'),
+    )
+    resumo['taxa_lead_cliente'] = resumo['clientes'] / resumo['leads']
+    resumo['taxa_cliente_venda'] = resumo['compradores'] / resumo['clientes'].replace(0, np.nan)
+    resumo['taxa_lead_venda'] = resumo['compradores'] / resumo['leads']
+    return resumo
+
+
+def como_registros(resumo):
+    """DataFrame de resumo -> lista de dicts para o JSON (NaN vira None, taxas com 4 casas)."""
+    resumo = resumo.round({'taxa_lead_cliente': 4, 'taxa_cliente_venda': 4, 'taxa_lead_venda': 4,
+                           'mediana_dias_ate_venda': 1})
+    registros = resumo.astype(object).where(resumo.notna(), None).to_dict('records')
+    for registro in registros:
+        for campo in ('leads', 'clientes', 'compradores', 'vendas_com_tempo'):
+            registro[campo] = int(registro[campo])
+    return registros
+
+
+def tempos_por_etapa(inicio=None, fim=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Quantas saídas de cada situação houve no intervalo e a mediana de dias que os clientes ficaram nela."""
+    historico = em_blocos(
+        HistoricoSituacao.objects.values_list('pk', 'cliente', 'situacao_anterior', 'alterado_em'),
+        ['id', 'cliente', 'etapa', 'saiu_em'], tamanho_lote,
+    )
+    historico['saiu_em'] = pd.to_datetime(historico['saiu_em'], utc=True)
+    historico = historico.sort_values(['cliente', 'saiu_em', 'id'])
+    # A mudança anterior do mesmo cliente é a que o colocou na etapa de que ele está saindo.
+    historico['entrou_em'] = historico.groupby('cliente')['saiu_em'].shift()
+    historico['dias'] = (historico['saiu_em'] - historico['entrou_em']).dt.total_seconds() / 86400
+
+    fuso = timezone.get_current_timezone()
+    if inicio:
+        historico = historico[historico['saiu_em'] >= pd.Timestamp(inicio, tz=fuso)]
+    if fim:
+        historico = historico[historico['saiu_em'] < pd.Timestamp(fim, tz=fuso) + pd.Timedelta(days=1)]
+
+    resumo = historico.groupby('etapa').agg(saidas=('id', 'size'), mediana_dias=('dias', 'median'))
+    resumo = resumo.round({'mediana_dias': 1}).astype(object)
+    resumo = resumo.where(resumo.notna(), None)
+    return [
+        {'etapa': etapa, 'nome': nome, 'saidas': int(resumo.at[etapa, 'saidas']),
+         'mediana_dias': resumo.at[etapa, 'mediana_dias']}
+        for etapa, nome in Cliente.SituacaoAtendimento.choices if etapa in resumo.index
+    ]
+
+
+def calcular_funil(inicio=None, fim=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    dados = montar_dados(inicio, fim, tamanho_lote)
+    chave_total = pd.Series('total', index=dados.index)
+    resultado = {'total': como_registros(resumir(dados.groupby(chave_total)))[0] if len(dados) else None}
+    for nome, coluna in QUEBRAS.items():
+        resumo = resumir(dados.groupby(coluna)).sort_values('leads', ascending=False)
+        resultado[nome] = [
+            {'grupo': grupo, **registro} for grupo, registro in zip(resumo.index, como_registros(resumo))
+        ]
+    resultado['por_etapa'] = tempos_por_etapa(inicio, fim, tamanho_lote)
+    return resultado
+
+
+def obter_funil(inicio=None, fim=None):
+    """O funil do intervalo, do cache se já foi calculado desde a última mudança nos dados."""
+    versao = cache.get_or_set(CHAVE_VERSAO, nova_versao, None)
+    chave = f'dashboard:funil:{versao}:{inicio}:{fim}'
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular_funil(inicio, fim)
+        cache.set(chave, resultado, getattr(settings, 'DASHBOARD_FUNIL_TTL', 300))
+    return resultado
+
+
+def invalidar_funil():
+    cache.set(CHAVE_VERSAO, nova_versao(), None)
@@ -0,0 +1,49 @@
+# dashboard/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from operacoes.models import VendaResumoDiario
+from usuarios.models import Cliente, Pessoa
+from usuarios.signals import alteracao_em_lote
+from .estatisticas import invalidar_stats
+from .funil import invalidar_funil
+from .vendas import invalidar_vendas
+
+# Campos de Cliente lidos pelas estatísticas e pelo funil (a existência do
+# cliente conta à parte); a situação muda junto com o histórico de onde saem
+# os tempos por etapa.
+CAMPOS_CLIENTE_DASHBOARD = {'situacao', 'classificacao'}
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_salvo(sender, instance, created, update_fields=None, **kwargs):
+    # Um save(update_fields=[...]) que não mexe em situação/classificação
+    # não muda nenhum número do dashboard.
+    if not created and update_fields is not None and not CAMPOS_CLIENTE_DASHBOARD & set(update_fields):
+        return
+    invalidar_stats()
+    invalidar_funil()
+
+
+@receiver(post_save, sender=Pessoa)
+def pessoa_salva(sender, instance, created, **kwargs):
+    # Editar os dados de uma pessoa não muda as contagens; criar muda o total de leads.
+    if created:
+        invalidar_stats()
+    # O funil quebra por município, idade e lead_score: qualquer edição conta.
+    invalidar_funil()
+
+
+# Exclusões de Pessoa e Cliente chegam pelo alteracao_em_lote com campos=None
+# (ver usuarios.signals.avisar_exclusao), e não por post_delete.
+@receiver(alteracao_em_lote)
+def alteracao_em_lote_recebida(sender, campos=None, **kwargs):
+    if sender is Pessoa or (sender is Cliente and (campos is None or CAMPOS_CLIENTE_DASHBOARD & set(campos))):
+        invalidar_stats()
+        invalidar_funil()
+    # As análises de vendas leem o resumo diário; quando ele é recalculado
+    # (venda nova, importação, veículo que trocou de segmento), o cache cai.
+    # O funil também: quem comprou no intervalo muda junto com o resumo.
+    if sender is VendaResumoDiario:
+        invalidar_vendas()
+        invalidar_funil()
@@ -1,3 +1,177 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from operacoes.models import Atendimento, Venda
+from produtos.models import Veiculo
+from usuarios.models import Cliente, HistoricoSituacao, Pessoa, Usuario
+from .funil import calcular_funil
+
+
+def em(dia):
+    return datetime.fromisoformat(dia).replace(tzinfo=timezone.utc)
+
+
+class FunilTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # 6 leads (fora o vendedor): 4 viraram clientes e 2 compraram.
+        dados = [
+            ('ANA', 'Goiânia', 22, 8), ('BIA', 'Goiânia', 30, 9), ('CAIO', 'Goiânia', 41, 5),
+            ('DANI', 'Anápolis', 50, 2), ('EDU', 'Anápolis', None, 1), ('FABI', None, 70, 7),
+        ]
+        Pessoa.objects.bulk_create(
+            Pessoa(nome=nome, cpf_cnpj=f'{i:011d}', endereco=cidade, idade=idade, lead_score=score)
+            for i, (nome, cidade, idade, score) in enumerate(dados)
+        )
+        pessoas = {pessoa.nome: pessoa for pessoa in Pessoa.objects.all()}
+        alto, padrao = Cliente.ClassificacaoCliente.ALTO_POTENCIAL, Cliente.ClassificacaoCliente.POTENCIAL_PADRAO
+        cls.ana = Cliente.objects.create(pessoa=pessoas['ANA'], classificacao=alto)
+        cls.bia = Cliente.objects.create(pessoa=pessoas['BIA'], classificacao=alto)
+        Cliente.objects.create(pessoa=pessoas['CAIO'], classificacao=padrao)
+        Cliente.objects.create(pessoa=pessoas['DANI'], classificacao=padrao)
+
+        vendedor = Usuario.objects.create(
+            pessoa=Pessoa.objects.create(nome='VENDEDOR', cpf_cnpj='99999999999'),
+            senha_hash='x', perfil=Usuario.Perfil.VENDEDOR,
+        )
+        moto = Veiculo.objects.create(modelo='CG 160')
+        for cliente, dia in ((cls.ana, '2025-03-11'), (cls.bia, '2025-06-21')):
+            Venda.objects.create(cliente=cliente, veiculo=moto, vendedor=vendedor,
+                                 valor_final=Decimal('15000.00'), data_venda=em(dia))
+        # Primeiro contato da Ana 10 dias antes da venda, o da Bia 20 dias antes.
+        Atendimento.objects.create(cliente=cls.ana, canal='Loja', descricao='-', data_atendimento=em('2025-03-01'))
+        Atendimento.objects.create(cliente=cls.ana, canal='Loja', descricao='-', data_atendimento=em('2025-03-05'))
+        Atendimento.objects.create(cliente=cls.bia, canal='Loja', descricao='-', data_atendimento=em('2025-06-01'))
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    @staticmethod
+    def por_grupo(linhas):
+        return {linha['grupo']: linha for linha in linhas}
+
+    def test_total_e_quebras(self):
+        funil = calcular_funil(tamanho_lote=2)
+        self.assertEqual(
+            funil['total'],
+            {'leads': 6, 'clientes': 4, 'compradores': 2, 'vendas_com_tempo': 2, 'mediana_dias_ate_venda': 15.0,
+             'taxa_lead_cliente': 0.6667, 'taxa_cliente_venda': 0.5, 'taxa_lead_venda': 0.3333},
+        )
+
+        municipios = self.por_grupo(funil['por_municipio'])
+        self.assertEqual([linha['grupo'] for linha in funil['por_municipio']], ['Goiânia', 'Anápolis', 'Desconhecido'])
+        self.assertEqual((municipios['Goiânia']['clientes'], municipios['Goiânia']['compradores']), (3, 2))
+        self.assertEqual(municipios['Anápolis']['taxa_cliente_venda'], 0.0)
+        # Sem nenhum cliente, a taxa cliente -> venda não existe.
+        self.assertIsNone(municipios['Desconhecido']['taxa_cliente_venda'])
+
+        idades = self.por_grupo(funil['por_faixa_etaria'])
+        self.assertEqual(set(idades), {'até 24', '25-34', '35-44', '45-54', '65+', 'Sem idade'})
+        self.assertEqual(idades['até 24']['mediana_dias_ate_venda'], 10.0)
+
+        scores = self.por_grupo(funil['por_lead_score'])
+        self.assertEqual({grupo: linha['leads'] for grupo, linha in scores.items()}, {'0-3': 2, '4-6': 1, '7+': 3})
+
+        classificacoes = self.por_grupo(funil['por_classificacao'])
+        self.assertEqual(classificacoes['Potencial Alto']['compradores'], 2)
+        self.assertEqual(classificacoes['Lead sem cadastro de cliente']['leads'], 2)
+
+    def test_intervalo_limita_as_vendas(self):
+        resposta = self.api.get('/api/dashboard/funil/?inicio=2025-06-01&fim=2025-06-30')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['total']['compradores'], 1)
+        self.assertEqual(resposta.data['total']['mediana_dias_ate_venda'], 20.0)
+
+        resposta = self.api.get('/api/dashboard/funil/?inicio=2025-07-01&fim=2025-06-30')
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_cache_cai_quando_os_dados_mudam(self):
+        self.assertEqual(self.api.get('/api/dashboard/funil/').data['total']['leads'], 6)
+        with self.assertNumQueries(0):
+            self.api.get('/api/dashboard/funil/')
+
+        Pessoa.objects.create(nome='GUI', cpf_cnpj='00000000099', endereco='Goiânia')
+        self.assertEqual(self.api.get('/api/dashboard/funil/').data['total']['leads'], 7)
+
+    def test_tempo_por_etapa_sai_do_historico(self):
+        mudancas = [
+            (self.ana, 'NOVO', 'NEGOCIANDO', '2025-03-01'), (self.ana, 'NEGOCIANDO', 'VENDIDO', '2025-03-11'),
+            (self.bia, 'NOVO', 'NEGOCIANDO', '2025-06-01'), (self.bia, 'NEGOCIANDO', 'VENDIDO', '2025-06-21'),
+        ]
+        HistoricoSituacao.objects.bulk_create(
+            HistoricoSituacao(cliente=cliente, situacao_anterior=de, situacao_nova=para, alterado_em=em(dia))
+            for cliente, de, para, dia in mudancas
+        )
+        etapas = {linha['etapa']: linha for linha in calcular_funil()['por_etapa']}
+        # A entrada em NOVO não está no histórico: a saída conta, o tempo não.
+        self.assertEqual((etapas['NOVO']['saidas'], etapas['NOVO']['mediana_dias']), (2, None))
+        self.assertEqual((etapas['NEGOCIANDO']['saidas'], etapas['NEGOCIANDO']['mediana_dias']), (2, 15.0))
+
+        etapas = calcular_funil(inicio=em('2025-06-01').date())['por_etapa']
+        self.assertEqual([(linha['etapa'], linha['saidas'], linha['mediana_dias']) for linha in etapas],
+                         [('NOVO', 1, None), ('NEGOCIANDO', 1, 20.0)])
+
+    def test_mudanca_de_situacao_derruba_o_cache(self):
+        self.assertEqual(self.api.get('/api/dashboard/funil/').data['por_etapa'], [])
+        self.api.patch('/api/clientes/situacao-lote/', {'ids': [self.ana.pk], 'situacao': 'NEGOCIANDO'}, format='json')
+        self.assertEqual(self.api.get('/api/dashboard/funil/').data['por_etapa'][0]['saidas'], 1)
+
+
+class ExclusaoTests(TestCase):
+    """Pessoa e Cliente não têm post_delete; quem apaga avisa o dashboard."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(4))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in Pessoa.objects.order_by('id'))
+        cls.ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def total_clientes(self):
+        return self.api.get('/api/dashboard/stats/').json()['total_clientes']
+
+    def test_pela_api(self):
+        self.assertEqual(self.total_clientes(), 4)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.api.delete(f'/api/clientes/{self.ids[0]}/').status_code, 204)
+        # Antes do commit, o cache ainda não caiu.
+        self.assertEqual(self.total_clientes(), 4)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.total_clientes(), 3)
+
+    def test_pelo_admin(self):
+        self.assertEqual(self.total_clientes(), 4)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/usuarios/pessoa/{self.ids[0]}/delete/', {'post': 'yes'})
+        self.assertEqual(self.total_clientes(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/usuarios/cliente/', {
+                'action': 'delete_selected', '_selected_action': self.ids[1:3], 'post': 'yes',
+            })
+        self.assertEqual(self.total_clientes(), 1)
 
-# Create your tests here.
+    def test_cascata_le_so_a_chave_dos_clientes(self):
+        # Com um receptor de delete em Cliente, o Django leria todas as colunas
+        # de cada cliente para montar as instâncias do sinal.
+        with CaptureQueriesContext(connection) as consultas:
+            Pessoa.objects.filter(pk__in=self.ids[:2]).delete()
+        leituras = [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'usuarios_cliente' in c['sql']]
+        self.assertTrue(leituras)
+        for sql in leituras:
+            colunas = sql.split(' FROM ')[0]
+            self.assertNotIn('situacao', colunas, sql)
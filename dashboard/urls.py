@@ -1,8 +1,11 @@
 # dashboard/urls.py
 
 from django.urls import path
-from .views import DashboardStatsView
+from .views import DashboardStatsView, FunilView, VendasSerieView, VendasAgrupadasView
 
 urlpatterns = [
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('dashboard/funil/', FunilView.as_view(), name='dashboard-funil'),
+    path('dashboard/vendas/serie/', VendasSerieView.as_view(), name='dashboard-vendas-serie'),
+    path('dashboard/vendas/por-<str:dimensao>/', VendasAgrupadasView.as_view(), name='dashboard-vendas-agrupadas'),
 ]
\ No newline at end of file
@@ -0,0 +1,96 @@
+# dashboard/vendas.py
+"""
+Análises de vendas para o dashboard.
+
+Toda a agregação é feita no banco, sobre a tabela pré-agregada
+VendaResumoDiario (uma linha por dia/segmento/vendedor/forma de pagamento),
+então nem o front-end nem a API precisam varrer as vendas uma a uma. Os
+resultados ficam no cache, separados por parâmetros; uma "versão" guardada no
+cache é trocada sempre que o resumo é recalculado, o que descarta de uma vez
+todas as combinações já calculadas.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from operacoes.models import VendaResumoDiario
+
+PERIODOS = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+# Para cada dimensão: o campo agrupado (id) e o rótulo mostrado no front-end.
+DIMENSOES = {
+    'segmento': ('segmento', 'segmento__nome_segmento'),
+    'pagamento': ('tipo_pagamento', 'tipo_pagamento'),
+    'vendedor': ('vendedor', 'vendedor__pessoa__nome'),
+}
+
+CHAVE_VERSAO = 'dashboard:vendas:versao'
+
+
+def filtrar_intervalo(resumo, inicio=None, fim=None):
+    """Filtra o resumo pelo intervalo de datas (as duas pontas inclusive)."""
+    if inicio:
+        resumo = resumo.filter(dia__gte=inicio)
+    if fim:
+        resumo = resumo.filter(dia__lte=fim)
+    return resumo
+
+
+def serie_temporal(periodo, inicio=None, fim=None):
+    """Quantidade e receita das vendas agrupadas por dia, semana ou mês."""
+    truncar = PERIODOS[periodo]
+    linhas = (
+        filtrar_intervalo(VendaResumoDiario.objects.all(), inicio, fim)
+        .annotate(periodo=truncar('dia'))
+        .values('periodo')
+        .annotate(quantidade=Sum('qtd'), receita=Sum('total'))
+        .order_by('periodo')
+    )
+    return [
+        {'periodo': linha['periodo'].isoformat(), 'quantidade': linha['quantidade'], 'receita': linha['receita']}
+        for linha in linhas
+    ]
+
+
+def vendas_por(dimensao, inicio=None, fim=None):
+    """Quantidade e receita das vendas agrupadas por segmento, forma de pagamento ou vendedor."""
+    campo, rotulo = DIMENSOES[dimensao]
+    linhas = (
+        filtrar_intervalo(VendaResumoDiario.objects.all(), inicio, fim)
+        .values(campo, rotulo)
+        .annotate(quantidade=Sum('qtd'), receita=Sum('total'))
+        .order_by('-quantidade')
+    )
+    return [
+        {'id': linha[campo], 'nome': linha[rotulo], 'quantidade': linha['quantidade'], 'receita': linha['receita']}
+        for linha in linhas
+    ]
+
+
+def em_cache(nome, parametros, calcular):
+    """
+    Devolve o resultado guardado para (nome, parametros) ou calcula e guarda.
+    A versão atual entra na chave, então invalidar_vendas() vale para todas.
+    """
+    versao = cache.get_or_set(CHAVE_VERSAO, nova_versao, None)
+    chave = ':'.join(['dashboard:vendas', versao, nome] + [str(valor) for valor in parametros])
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(chave, resultado, getattr(settings, 'DASHBOARD_VENDAS_TTL', 300))
+    return resultado
+
+
+def nova_versao():
+    return uuid.uuid4().hex
+
+
+def invalidar_vendas():
+    cache.set(CHAVE_VERSAO, nova_versao(), None)
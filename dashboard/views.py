@@ -1,42 +1,122 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Count
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
 
-from usuarios.models import Cliente, Pessoa
+from .estatisticas import obter_stats
+from .funil import obter_funil
+from .vendas import DIMENSOES, PERIODOS, em_cache, serie_temporal, vendas_por
 
 class DashboardStatsView(APIView):
     """
     Uma view somente leitura que calcula e retorna as principais
     estatísticas do sistema para o dashboard.
+
+    As estatísticas vêm do cache (veja dashboard/estatisticas.py). Se o
+    front-end mandar If-None-Match/If-Modified-Since e nada tiver mudado,
+    a resposta é um 304 sem corpo.
     """
     def get(self, request, format=None):
         try:
-            # Contagem total de clientes (pessoas com o papel de cliente)
-            total_clientes = Cliente.objects.count()
-
-            # Contagem total de leads (todas as Pessoas que NÃO são clientes)
-            total_leads = Pessoa.objects.exclude(cliente__isnull=False).count()
-
-            # Agrupa os clientes pela situação e conta quantos há em cada grupo
-            contagem_por_situacao = Cliente.objects.values('situacao').annotate(
-                count=Count('situacao')
-            ).order_by('-count') # Ordena do maior para o menor
-
-            # Agrupa os clientes pela classificação do modelo de ML e conta
-            contagem_por_classificacao = Cliente.objects.values('classificacao').annotate(
-                count=Count('classificacao')
-            ).order_by('-count')
-
-            # Monta o objeto JSON final que será enviado ao front-end
-            stats = {
-                "total_clientes": total_clientes,
-                "total_leads": total_leads,
-                "contagem_por_situacao": list(contagem_por_situacao),
-                "contagem_por_classificacao": list(contagem_por_classificacao),
-            }
-            
-            return Response(stats, status=status.HTTP_200_OK)
+            entrada = obter_stats()
+            etag = quote_etag(entrada['etag'])
+            ultima_alteracao = int(entrada['atualizado_em'].timestamp())
+
+            nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_alteracao)
+            if nao_modificado is not None:
+                return nao_modificado
+
+            response = Response(entrada['stats'], status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(ultima_alteracao)
+            # Obriga o navegador a revalidar a cada pedido (e receber o 304).
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
 
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def ler_intervalo(request):
+    """
+    Lê ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD da URL.
+    Retorna (inicio, fim, erro); as datas são opcionais.
+    """
+    datas = {}
+    for nome in ('inicio', 'fim'):
+        valor = request.query_params.get(nome)
+        if not valor:
+            datas[nome] = None
+            continue
+        try:
+            datas[nome] = parse_date(valor)
+        except ValueError:
+            datas[nome] = None
+        if datas[nome] is None:
+            return None, None, f"Data inválida em '{nome}'. Use o formato AAAA-MM-DD."
+    if datas['inicio'] and datas['fim'] and datas['inicio'] > datas['fim']:
+        return None, None, "'inicio' deve ser anterior ou igual a 'fim'."
+    return datas['inicio'], datas['fim'], None
+
+
+class VendasSerieView(APIView):
+    """
+    Quantidade e receita das vendas ao longo do tempo.
+
+    Parâmetros na URL:
+    - ?periodo=dia|semana|mes   (padrão: mes)
+    - ?inicio=2024-01-01&fim=2024-12-31   (opcionais, inclusive)
+    """
+    def get(self, request, format=None):
+        periodo = request.query_params.get('periodo', 'mes')
+        if periodo not in PERIODOS:
+            return Response(
+                {"error": f"Período inválido. Opções são: {list(PERIODOS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        inicio, fim, erro = ler_intervalo(request)
+        if erro:
+            return Response({"error": erro}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados = em_cache('serie', [periodo, inicio, fim], lambda: serie_temporal(periodo, inicio, fim))
+        return Response({"periodo": periodo, "inicio": inicio, "fim": fim, "resultados": resultados})
+
+
+class VendasAgrupadasView(APIView):
+    """
+    Quantidade e receita das vendas por segmento, forma de pagamento ou vendedor.
+    Ex.: /api/dashboard/vendas/por-segmento/?inicio=2024-01-01
+    """
+    def get(self, request, dimensao, format=None):
+        if dimensao not in DIMENSOES:
+            return Response(
+                {"error": f"Agrupamento inválido. Opções são: {list(DIMENSOES)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        inicio, fim, erro = ler_intervalo(request)
+        if erro:
+            return Response({"error": erro}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados = em_cache(dimensao, [inicio, fim], lambda: vendas_por(dimensao, inicio, fim))
+        return Response({"agrupamento": dimensao, "inicio": inicio, "fim": fim, "resultados": resultados})
+
+
+class FunilView(APIView):
+    """
+    Funil lead -> cliente -> venda, no total e quebrado por município,
+    faixa etária, faixa de lead_score e classificação, com as taxas de
+    conversão e a mediana de dias do primeiro atendimento até a venda; em
+    "por_etapa", quantos clientes saíram de cada situação e quanto tempo
+    ficaram nela (do HistoricoSituacao).
+
+    ?inicio=2024-01-01&fim=2024-12-31 (opcionais) limitam as vendas que contam;
+    leads e clientes não têm data de cadastro e entram sempre. Veja dashboard/funil.py.
+    """
+    def get(self, request, format=None):
+        inicio, fim, erro = ler_intervalo(request)
+        if erro:
+            return Response({"error": erro}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"inicio": inicio, "fim": fim, **obter_funil(inicio, fim)})
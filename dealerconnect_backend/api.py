@@ -0,0 +1,262 @@
+# dealerconnect_backend/api.py
+"""
+Peças reaproveitadas pelos ViewSets dos vários apps.
+
+?fields= e ?expand=
+-------------------
+Serializers com CamposDinamicosMixin devolvem as relações como IDs e só
+aninham o objeto completo quando o front-end pede, por exemplo:
+
+    /api/vendas/?expand=cliente,veiculo
+    /api/vendas/?fields=id,data_venda,cliente
+
+O ViewSet (CamposDinamicosViewSetMixin) passa esses parâmetros ao serializer
+e ajusta o queryset: select_related só das relações expandidas e .only()
+com as colunas que realmente serão mostradas.
+
+/export/
+--------
+ExportacaoMixin acrescenta a exportação completa (CSV ou NDJSON) em streaming,
+para extrações grandes que não cabem numa página.
+
+NDJSON na entrada
+-----------------
+NDJSONParser faz o caminho inverso: um corpo application/x-ndjson (um objeto
+JSON por linha) chega na view como uma lista, igual a um array JSON.
+"""
+import csv
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.response import Response
+
+from .metricas import medir_serializacao
+
+
+def ler_lista(valor):
+    """Transforma 'a,b, c' em ('a', 'b', 'c')."""
+    return tuple(item.strip() for item in valor.split(',') if item.strip())
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin para ModelSerializer.
+
+    Declare na subclasse:
+    - campos_expansiveis = {'campo': (SerializerAninhado, 'caminho__do__select_related')}
+    - expandir_padrao = ('campo',)   (relações aninhadas quando o ?expand= não é enviado)
+    """
+    campos_expansiveis = {}
+    expandir_padrao = ()
+
+    def __init__(self, *args, campos=None, expandir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandir = self.expandir_padrao if expandir is None else expandir
+
+        for nome, (serializer_aninhado, _) in self.campos_expansiveis.items():
+            if nome not in self.fields:
+                continue
+            if nome in expandir:
+                self.fields[nome] = serializer_aninhado(read_only=True)
+            else:
+                self.fields[nome] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+        if campos is not None:
+            for nome in set(self.fields) - set(campos):
+                self.fields.pop(nome)
+
+
+def colunas_do_caminho(modelo, caminho):
+    """
+    Para 'cliente__pessoa' a partir de Venda, devolve todas as colunas de
+    Cliente e de Pessoa no formato do .only() ('cliente__classificacao', ...).
+    """
+    colunas = []
+    prefixo = []
+    for parte in caminho.split('__'):
+        modelo = modelo._meta.get_field(parte).related_model
+        prefixo.append(parte)
+        colunas += ['__'.join(prefixo + [campo.name]) for campo in modelo._meta.concrete_fields]
+    return colunas
+
+
+class CamposDinamicosViewSetMixin:
+    """
+    Mixin para ViewSets cujo serializer usa CamposDinamicosMixin.
+    Chame self.otimizar_queryset(queryset) no get_queryset.
+    """
+    # Ações em que o .only() é aplicado. Nas outras (update, ações de escrita)
+    # o objeto precisa vir completo, senão o save() gravaria só parte dele.
+    acoes_com_campos_dinamicos = ('list', 'retrieve', 'export')
+
+    def campos_pedidos(self):
+        valor = self.request.query_params.get('fields') if self.request else None
+        return ler_lista(valor) if valor else None
+
+    def expansoes_pedidas(self):
+        serializer_class = self.get_serializer_class()
+        permitidas = getattr(serializer_class, 'campos_expansiveis', {})
+        if self.request is None or 'expand' not in self.request.query_params:
+            return tuple(getattr(serializer_class, 'expandir_padrao', ()))
+        return tuple(nome for nome in ler_lista(self.request.query_params['expand']) if nome in permitidas)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, CamposDinamicosMixin):
+            kwargs.setdefault('campos', self.campos_pedidos())
+            kwargs.setdefault('expandir', self.expansoes_pedidas())
+        # O tempo de serialização entra nas métricas do endpoint (ver metricas.py).
+        return medir_serializacao(super().get_serializer(*args, **kwargs))
+
+    def otimizar_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if self.action not in self.acoes_com_campos_dinamicos or not issubclass(serializer_class, CamposDinamicosMixin):
+            return queryset
+
+        modelo = queryset.model
+        campos = self.campos_pedidos()
+        expandir = self.expansoes_pedidas()
+        if campos is not None:
+            expandir = tuple(nome for nome in expandir if nome in campos)
+        caminhos = [serializer_class.campos_expansiveis[nome][1] for nome in expandir]
+
+        # Colunas do próprio model que aparecem na resposta (a chave primária sempre).
+        nomes = campos if campos is not None else serializer_class.Meta.fields
+        colunas = {modelo._meta.pk.name}
+        for nome in nomes:
+            try:
+                colunas.add(modelo._meta.get_field(nome).name)
+            except FieldDoesNotExist:
+                # Campo calculado do serializer, sem coluna própria.
+                continue
+        for caminho in caminhos:
+            colunas.update(colunas_do_caminho(modelo, caminho))
+        # O cursor da página seguinte é montado com os campos da ordenação; sem
+        # eles no .only(), cada página faria mais uma consulta por campo adiado.
+        colunas.update(self.colunas_da_ordenacao(queryset))
+
+        # Descarta o select_related do queryset base e refaz só com o que foi
+        # expandido. Sem nenhum caminho não dá para chamar select_related(): sem
+        # argumentos ele junta todas as chaves estrangeiras não nulas.
+        queryset = queryset.select_related(None)
+        if caminhos:
+            queryset = queryset.select_related(*caminhos)
+        return queryset.only(*colunas)
+
+
+    def colunas_da_ordenacao(self, queryset):
+        """Campos da própria tabela na ordenação da paginação por cursor (os de outras tabelas vêm anotados)."""
+        paginador = self.paginator
+        if not hasattr(paginador, 'get_ordering'):
+            return set()
+        colunas = set()
+        for campo in paginador.get_ordering(self.request, queryset, self):
+            nome = campo.lstrip('-')
+            if '__' in nome:
+                continue
+            try:
+                colunas.add(queryset.model._meta.get_field(nome).name)
+            except FieldDoesNotExist:
+                # 'pk' (a chave primária já entra) ou anotações, como a relevância da busca.
+                continue
+        return colunas
+
+
+class NDJSONParser(BaseParser):
+    """
+    Lê um objeto JSON por linha e devolve a lista deles. O corpo é lido linha a
+    linha (sem montar a string inteira antes do json.loads); linhas em branco
+    são ignoradas e uma linha inválida vira 400 com o número dela.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        registros = []
+        for numero, linha in enumerate(stream, start=1):
+            try:
+                linha = linha.decode('utf-8').strip()
+                if linha:
+                    registros.append(json.loads(linha))
+            except (UnicodeDecodeError, ValueError) as erro:
+                raise ParseError(f'NDJSON inválido na linha {numero}: {erro}')
+        return registros
+
+
+class _Eco:
+    """Arquivo "de mentira" para o csv.writer: devolve a linha em vez de gravá-la."""
+    def write(self, valor):
+        return valor
+
+
+def achatar(dados, prefixo=''):
+    """{'cliente': {'pessoa': {'nome': 'X'}}} vira {'cliente.pessoa.nome': 'X'}, para o CSV."""
+    linha = {}
+    for chave, valor in dados.items():
+        if isinstance(valor, dict):
+            linha.update(achatar(valor, f'{prefixo}{chave}.'))
+        else:
+            linha[prefixo + chave] = valor
+    return linha
+
+
+class ExportacaoMixin:
+    """
+    Acrescenta ao ViewSet a ação GET /export/, que devolve TODO o resultado
+    filtrado (sem paginação) como CSV ou NDJSON (?formato=csv|ndjson).
+
+    A resposta é um StreamingHttpResponse: as linhas são lidas do banco em
+    blocos com .iterator(chunk_size=...) e enviadas conforme são geradas, então
+    a memória usada é a mesma para cem ou para um milhão de registros.
+    Os parâmetros ?fields= e ?expand= continuam valendo.
+    """
+    nome_exportacao = 'exportacao'
+    tamanho_bloco_exportacao = 2000
+    formatos_exportacao = ('csv', 'ndjson')
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in self.formatos_exportacao:
+            return Response(
+                {'erro': f"Formato inválido. Use um destes: {', '.join(self.formatos_exportacao)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Um único serializer para todas as linhas: instanciar um por registro
+        # custaria mais do que a própria consulta.
+        serializer = self.get_serializer()
+        registros = (
+            serializer.to_representation(objeto)
+            for objeto in queryset.iterator(chunk_size=self.tamanho_bloco_exportacao)
+        )
+
+        if formato == 'ndjson':
+            linhas = (json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for registro in registros)
+            tipo = 'application/x-ndjson'
+        else:
+            linhas = self.linhas_csv(registros)
+            tipo = 'text/csv; charset=utf-8'
+
+        resposta = StreamingHttpResponse(linhas, content_type=tipo)
+        resposta['Content-Disposition'] = f'attachment; filename="{self.nome_exportacao}.{formato}"'
+        return resposta
+
+    def linhas_csv(self, registros):
+        escritor = csv.writer(_Eco())
+        colunas = None
+        for registro in registros:
+            linha = achatar(registro)
+            if colunas is None:
+                # O cabeçalho sai das chaves do primeiro registro.
+                colunas = list(linha)
+                yield escritor.writerow(colunas)
+            yield escritor.writerow([linha.get(coluna) for coluna in colunas])
@@ -0,0 +1,59 @@
+# dealerconnect_backend/apos_commit.py
+"""
+Trabalho agrupado para depois do commit.
+
+Vários sinais (venda apagada, atendimento editado, entrada do modelo
+alterada...) só anotam o que foi afetado; o recálculo roda uma vez só,
+depois do commit, com tudo o que a transação juntou. Apagar mil vendas pelo
+admin gera um recálculo, e não mil.
+
+    _recalculo = LoteAposCommit(recalcular_contadores)
+
+    def agendar_recalculo(clientes_ids):
+        _recalculo.agendar(clientes_ids)
+
+Se a transação for desfeita, o Django descarta o callback junto; o próximo
+agendar() percebe isso e começa um lote novo. Fora de transação o
+on_commit roda na hora, então cada agendar() executa logo.
+"""
+import threading
+
+from django.db import transaction
+
+
+class LoteAposCommit:
+    """Junta os itens recebidos na transação atual e chama `executar(itens)` depois do commit."""
+
+    def __init__(self, executar):
+        self.executar = executar
+        self._local = threading.local()
+
+    def agendar(self, itens):
+        conexao = transaction.get_connection()
+        pendente = getattr(self._local, 'atual', None)
+        if pendente is not None and agendado(conexao, pendente.disparar):
+            pendente.itens.update(itens)
+            return
+        pendente = self._local.atual = _Pendente(self)
+        # Os itens entram antes do on_commit: fora de transação ele dispara na hora.
+        pendente.itens.update(itens)
+        transaction.on_commit(pendente.disparar)
+
+
+class _Pendente:
+    def __init__(self, lote):
+        self.lote = lote
+        self.itens = set()
+
+    def disparar(self):
+        if getattr(self.lote._local, 'atual', None) is self:
+            self.lote._local.atual = None
+        self.lote.executar(self.itens)
+
+
+def agendado(conexao, callback):
+    """
+    O callback ainda está na fila do on_commit? O Django não tem API pública
+    para isso; a lista (sids, callback, robust) da conexão é lida só aqui.
+    """
+    return any(item[1] == callback for item in conexao.run_on_commit)
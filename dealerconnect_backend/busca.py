@@ -0,0 +1,182 @@
+# dealerconnect_backend/busca.py
+"""
+Busca de clientes e veículos por prefixo de palavras.
+
+O SearchFilter do DRF gera LIKE '%termo%', que não usa índice: cada letra
+digitada na caixa de busca varria a tabela inteira. Aqui cada nome é quebrado
+em palavras normalizadas (sem acento, minúsculas) e guardado numa tabela de
+termos indexada (PessoaTermo, VeiculoTermo). A busca "jose sil" vira duas
+consultas de prefixo nesse índice ("jose%" e "sil%"), que funcionam igual no
+MySQL e no SQLite, e o resultado é ordenado pela relevância:
+
+- cada palavra digitada que bate inteira com uma palavra do nome vale 2,
+  e a que bate só no começo vale 1;
+- +1 se a primeira palavra digitada é o começo do primeiro nome.
+
+Se o texto digitado só tem números (com ou sem pontos e traços), a busca vai
+direto ao CPF/CNPJ, que já tem índice único.
+"""
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+TAMANHO_MAXIMO_TERMO = 50
+# Com menos dígitos que isso, a busca por CPF traria meio cadastro.
+MINIMO_DIGITOS_DOCUMENTO = 3
+
+
+def normalizar(texto):
+    """'  Joãozinho D'Ávila ' -> 'joaozinho d avila'"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(letra for letra in texto if not unicodedata.combining(letra))
+    return re.sub(r'[^a-z0-9]+', ' ', texto.lower()).strip()
+
+
+def termos_do_texto(*textos):
+    """Lista de palavras normalizadas, na ordem em que aparecem (sem repetir)."""
+    termos = []
+    for texto in textos:
+        for termo in normalizar(texto).split():
+            termo = termo[:TAMANHO_MAXIMO_TERMO]
+            if termo not in termos:
+                termos.append(termo)
+    return termos
+
+
+def filtro_prefixo(campo, prefixo):
+    """
+    Q para "campo começa com prefixo" que aproveita o índice do campo.
+    No MySQL, LIKE 'abc%' já usa o índice. O LIKE do SQLite não diferencia
+    maiúsculas e por isso ignora índices comuns; lá a consulta vira o
+    intervalo equivalente: 'abc' <= campo < 'abd'.
+    """
+    if connection.vendor == 'sqlite':
+        proximo = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+        return Q(**{f'{campo}__gte': prefixo, f'{campo}__lt': proximo})
+    return Q(**{f'{campo}__istartswith': prefixo})
+
+
+class IndiceDeBusca:
+    """
+    Descreve a tabela de termos de um model: qual model é indexado, o model
+    de termos, o nome da ForeignKey nele e os campos de texto indexados.
+    """
+
+    def __init__(self, modelo, modelo_termo, campo_fk, campos_texto):
+        self.modelo = modelo
+        self.modelo_termo = modelo_termo
+        self.campo_fk = campo_fk
+        self.campos_texto = tuple(campos_texto)
+
+    def termos(self):
+        return self.modelo_termo.objects.all()
+
+    def campos_afetados(self, campos):
+        """Diz se uma alteração nesses campos (None = qualquer um) muda o índice."""
+        return campos is None or bool(set(campos) & set(self.campos_texto))
+
+    def reindexar(self, ids=None, tamanho_lote=1000):
+        """
+        Refaz os termos dos objetos informados (ou de todos). Só apaga e grava
+        os termos de quem realmente mudou, então rodar de novo sem alterações
+        custa duas leituras e nenhuma escrita. Retorna quantos objetos mudaram.
+        """
+        objetos = self.modelo.objects.all()
+        termos = self.termos()
+        if ids is not None:
+            ids = list(ids)
+            objetos = objetos.filter(pk__in=ids)
+            termos = termos.filter(**{f'{self.campo_fk}_id__in': ids})
+
+        esperados = {
+            pk: termos_do_texto(*textos)
+            for pk, *textos in objetos.values_list('pk', *self.campos_texto).iterator(chunk_size=tamanho_lote)
+        }
+        atuais = {}
+        for pk, termo, posicao in termos.order_by('posicao').values_list(f'{self.campo_fk}_id', 'termo', 'posicao'):
+            atuais.setdefault(pk, []).append(termo)
+
+        mudaram = [pk for pk, lista in esperados.items() if atuais.get(pk) != lista]
+        # Termos de objetos que já não existem (ou não estão mais na lista).
+        orfaos = [pk for pk in atuais if pk not in esperados]
+
+        with transaction.atomic():
+            apagar = mudaram + orfaos
+            for inicio in range(0, len(apagar), tamanho_lote):
+                self.termos().filter(**{f'{self.campo_fk}_id__in': apagar[inicio:inicio + tamanho_lote]}).delete()
+            self.modelo_termo.objects.bulk_create(
+                (
+                    self.modelo_termo(**{f'{self.campo_fk}_id': pk}, termo=termo, posicao=posicao)
+                    for pk in mudaram
+                    for posicao, termo in enumerate(esperados[pk])
+                ),
+                batch_size=tamanho_lote,
+            )
+        return len(mudaram)
+
+    def reindexar_alteracao(self, campos=None, alterados=None, inseridos=None):
+        """
+        Atende ao sinal alteracao_em_lote. Se o remetente disse quais linhas
+        mudaram, só elas são relidas; senão (campos=None e nenhuma lista) não
+        há como saber e o índice inteiro é comparado.
+        """
+        if alterados is None and inseridos is None:
+            if self.campos_afetados(campos):
+                return self.reindexar()
+            return 0
+        ids = list(inseridos or [])
+        ids += [pk for pk, campos_da_linha in (alterados or {}).items() if self.campos_afetados(campos_da_linha)]
+        return self.reindexar(ids) if ids else 0
+
+    def filtrar(self, queryset, campo_id, texto, campo_documento=None):
+        """
+        Aplica a busca de `texto` ao queryset. `campo_id` é o caminho, no
+        queryset, até a chave do objeto indexado (ex.: 'pessoa_id' em Cliente)
+        e `campo_documento` o do CPF/CNPJ, quando houver.
+        """
+        digitos = re.sub(r'[\s./-]', '', texto)
+        if campo_documento and digitos.isdigit() and len(digitos) >= MINIMO_DIGITOS_DOCUMENTO:
+            return queryset.filter(filtro_prefixo(campo_documento, digitos))
+
+        palavras = termos_do_texto(texto)
+        if not palavras:
+            return queryset
+
+        relevancia = Value(0, output_field=IntegerField())
+        for palavra in palavras:
+            com_prefixo = self.termos().filter(filtro_prefixo('termo', palavra))
+            queryset = queryset.filter(**{f'{campo_id}__in': com_prefixo.values(f'{self.campo_fk}_id')})
+            palavra_inteira = self.termos().filter(**{f'{self.campo_fk}_id': OuterRef(campo_id)}, termo=palavra)
+            relevancia = relevancia + Case(When(Exists(palavra_inteira), then=Value(2)), default=Value(1))
+
+        primeiro_nome = self.termos().filter(
+            filtro_prefixo('termo', palavras[0]), **{f'{self.campo_fk}_id': OuterRef(campo_id)}, posicao=0,
+        )
+        relevancia = relevancia + Case(When(Exists(primeiro_nome), then=Value(1)), default=Value(0))
+        return queryset.annotate(relevancia=relevancia)
+
+
+class BuscaPorTermos(BaseFilterBackend):
+    """
+    Filter backend que substitui o filters.SearchFilter, usando o mesmo
+    parâmetro ?search=. No ViewSet, defina:
+
+    - indice_busca = <IndiceDeBusca>
+    - campo_indice_busca = 'pessoa_id'           (caminho até o objeto indexado)
+    - campo_documento_busca = 'pessoa__cpf_cnpj' (opcional, busca por números)
+
+    Os resultados ganham a anotação 'relevancia'; a PaginacaoPorCursor
+    ordena por ela antes da ordenação normal da listagem.
+    """
+    parametro = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.parametro, '').strip()
+        if not texto:
+            return queryset
+        return view.indice_busca.filtrar(
+            queryset, view.campo_indice_busca, texto, getattr(view, 'campo_documento_busca', None),
+        )
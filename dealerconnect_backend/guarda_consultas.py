@@ -0,0 +1,223 @@
+# dealerconnect_backend/guarda_consultas.py
+"""
+Guarda contra consultas N+1.
+
+O caso típico é um acesso preguiçoso a uma relação dentro de um laço: o
+__str__ de Venda lê self.cliente.pessoa.nome, então uma lista de 100 vendas
+sem select_related faz 1 + 200 consultas. Cada uma delas tem o mesmo SQL,
+só muda o id. A guarda conta os SELECTs por "forma" (o SQL com os
+parâmetros de fora e as listas IN (...) resumidas) e, quando uma mesma forma
+se repete mais que o limite, aponta:
+
+- o SQL repetido e quantas vezes ele rodou;
+- o atributo do model que disparou a carga (Venda.cliente, Cliente.pessoa...);
+- a linha do nosso código de onde veio o acesso (operacoes/models.py:33 em __str__).
+
+Três jeitos de usar:
+
+    with GuardaConsultas():                    # levanta ConsultasRepetidas
+        ...
+    class MeusTestes(SemNMaisUmMixin, TestCase)  # assertSemNMaisUm / assertConsultasNaoCrescem
+    GUARDA_CONSULTAS = 'log' ou 'erro'         # GuardaConsultasMiddleware, em cada requisição
+
+Só SELECTs entram na conta: UPDATEs em lote repetidos (um por grupo, como
+em usuarios/classificacao.py) são intencionais.
+"""
+import logging
+import os
+import re
+import sys
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Uma mesma consulta repetida mais que isso numa requisição vira alerta. Uma
+# página padrão (25 itens) com N+1 passa bem longe; laços de lote legítimos
+# (keyset de 1000 em 1000) só chegam perto com dezenas de milhares de linhas.
+LIMITE_PADRAO = 10
+
+_DJANGO_DB = os.path.join('django', 'db', '')
+_DJANGO_MODELS = os.path.join('django', 'db', 'models')
+
+
+class ConsultasRepetidas(AssertionError):
+    """Levantada no modo 'erro'. É um AssertionError para falhar testes do jeito normal."""
+
+
+@dataclass(frozen=True)
+class Repeticao:
+    sql: str
+    vezes: int
+    atributo: str
+    origem: str
+
+    def __str__(self):
+        return f'{self.vezes}x {self.atributo or "?"} (em {self.origem or "?"}): {self.sql}'
+
+
+def forma_do_sql(sql):
+    """O SQL sem o que muda de uma execução para outra (listas IN e espaços)."""
+    sql = re.sub(r'\bIN \((?:%s|\?)(?:, *(?:%s|\?))*\)', 'IN (...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def atributo_do_descritor(descritor):
+    """'Model.campo' a partir do descritor do Django que fez a carga."""
+    campo = getattr(descritor, 'field', None)
+    if campo is not None and getattr(campo, 'model', None) is not None:
+        # ForeignKey/OneToOne (venda.cliente) ou campo adiado por .only()/.defer().
+        return f'{campo.model.__name__}.{campo.name}'
+    relacao = getattr(descritor, 'related', None)
+    if relacao is not None:
+        # Lado reverso de um OneToOne (pessoa.cliente).
+        return f'{relacao.model.__name__}.{relacao.get_accessor_name()}'
+    return ''
+
+
+def rastrear():
+    """
+    Percorre a pilha de quem fez a consulta e devolve (atributo, origem):
+    o descritor do Django mais próximo (a carga preguiçosa) e a primeira
+    linha do código do projeto. Sem descritor na pilha (um cliente.vendas.all()
+    dentro de um laço, por exemplo), o atributo fica com a tabela consultada.
+
+    A origem só é procurada depois que a pilha sai do django.db: antes dele
+    ficam os outros execute_wrapper (o do MetricasMiddleware, por exemplo),
+    que também são código do projeto mas não dizem nada sobre o N+1.
+    """
+    atributo = origem = ''
+    passou_pelo_orm = False
+    base = str(settings.BASE_DIR)
+    quadro = sys._getframe(2)
+    while quadro is not None and not (atributo and origem):
+        arquivo = quadro.f_code.co_filename
+        if _DJANGO_DB in arquivo:
+            passou_pelo_orm = True
+            if not atributo and _DJANGO_MODELS in arquivo and quadro.f_code.co_name == '__get__':
+                atributo = atributo_do_descritor(quadro.f_locals.get('self'))
+        elif not origem and passou_pelo_orm and arquivo.startswith(base) and 'site-packages' not in arquivo:
+            origem = f'{os.path.relpath(arquivo, base)}:{quadro.f_lineno} em {quadro.f_code.co_name}'
+        quadro = quadro.f_back
+    return atributo, origem
+
+
+def tabela_do_sql(sql):
+    encontrada = re.search(r'\bFROM [`"]?(\w+)', sql)
+    return f'tabela {encontrada.group(1)}' if encontrada else ''
+
+
+class GuardaConsultas:
+    """
+    Context manager que conta os SELECTs por forma em todas as conexões.
+    modo='erro' levanta ConsultasRepetidas na saída, modo='log' só avisa no log
+    e modo=None só coleta (veja .repeticoes e .relatorio()).
+    """
+
+    def __init__(self, limite=None, modo='erro', descricao=''):
+        self.limite = limite if limite is not None else getattr(settings, 'GUARDA_CONSULTAS_LIMITE', LIMITE_PADRAO)
+        self.modo = modo
+        self.descricao = descricao
+        self.total = 0
+        self._contagens = {}
+        self._rastros = {}
+        self._pilha = None
+
+    def __enter__(self):
+        self._pilha = ExitStack()
+        for conexao in connections.all():
+            self._pilha.enter_context(conexao.execute_wrapper(self._registrar))
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        self._pilha.close()
+        if tipo is None:
+            self.verificar()
+        return False
+
+    def _registrar(self, execute, sql, params, many, context):
+        self.total += 1
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            forma = forma_do_sql(sql)
+            self._contagens[forma] = self._contagens.get(forma, 0) + 1
+            # A pilha só é percorrida na primeira repetição de cada forma.
+            if self._contagens[forma] == 2:
+                atributo, origem = rastrear()
+                self._rastros[forma] = (atributo or tabela_do_sql(forma), origem)
+        return execute(sql, params, many, context)
+
+    @property
+    def repeticoes(self):
+        """As formas de SQL que passaram do limite, da mais repetida para a menos."""
+        return sorted(
+            (Repeticao(forma, vezes, *self._rastros.get(forma, ('', '')))
+             for forma, vezes in self._contagens.items() if vezes > self.limite),
+            key=lambda repeticao: -repeticao.vezes,
+        )
+
+    def relatorio(self):
+        linhas = [f'Possível N+1{" em " + self.descricao if self.descricao else ""}: '
+                  f'{self.total} consultas, com SQL repetido acima do limite de {self.limite}:']
+        linhas += [f'  - {repeticao}' for repeticao in self.repeticoes]
+        return '\n'.join(linhas)
+
+    def verificar(self):
+        if self.modo is None or not self.repeticoes:
+            return
+        if self.modo == 'erro':
+            raise ConsultasRepetidas(self.relatorio())
+        logger.warning(self.relatorio())
+
+
+class SemNMaisUmMixin:
+    """
+    Asserções para TestCases:
+
+    - assertSemNMaisUm(limite): context manager, falha se algum SELECT se
+      repetir mais que `limite` vezes dentro do bloco.
+    - assertConsultasNaoCrescem(url): pede a URL com dois tamanhos de página
+      e falha se a quantidade de consultas mudar, mostrando o SQL repetido.
+    """
+    limite_consultas_repetidas = 3
+
+    def assertSemNMaisUm(self, limite=None, descricao=''):
+        return GuardaConsultas(limite=limite if limite is not None else self.limite_consultas_repetidas,
+                               modo='erro', descricao=descricao)
+
+    def assertConsultasNaoCrescem(self, url, tamanhos=(2, 20), parametro='page_size', client=None):
+        client = client or self.client
+        contagens = []
+        for tamanho in tamanhos:
+            separador = '&' if '?' in url else '?'
+            # Sem modo: a guarda só junta o relatório; quem decide é a comparação.
+            with GuardaConsultas(limite=min(tamanhos) - 1, modo=None) as guarda:
+                resposta = client.get(f'{url}{separador}{parametro}={tamanho}')
+            self.assertLess(resposta.status_code, 400, f'{url} respondeu {resposta.status_code}')
+            contagens.append((tamanho, guarda.total, guarda))
+        (_, menor, _), (tamanho, maior, guarda) = contagens[0], contagens[-1]
+        if maior != menor:
+            guarda.descricao = f'{url} com {parametro}={tamanho}'
+            self.fail(f'{menor} consultas com {parametro}={contagens[0][0]} e {maior} com {tamanho}.\n'
+                      + guarda.relatorio())
+
+
+class GuardaConsultasMiddleware:
+    """
+    Aplica a GuardaConsultas em cada requisição quando GUARDA_CONSULTAS é
+    'log' (avisa no log) ou 'erro' (a requisição falha). Sem a configuração
+    o middleware se desliga sozinho e não custa nada.
+    """
+
+    def __init__(self, get_response):
+        self.modo = getattr(settings, 'GUARDA_CONSULTAS', None)
+        if self.modo not in ('log', 'erro'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with GuardaConsultas(modo=self.modo, descricao=f'{request.method} {request.path}'):
+            return self.get_response(request)
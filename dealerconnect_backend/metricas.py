@@ -0,0 +1,249 @@
+# dealerconnect_backend/metricas.py
+"""
+Métricas por endpoint: latência, consultas ao banco, tempo de serialização e
+tamanho da resposta, expostas em GET /api/metrics/ no formato de texto do
+Prometheus.
+
+O MetricasMiddleware mede cada requisição e anota com a view e a ação do DRF
+que a atenderam (ClienteViewSet/list, ClienteViewSet/classificar...). As
+consultas são contadas com connection.execute_wrapper, que só envolve a
+chamada ao cursor: não guarda o SQL como o CaptureQueriesContext (nem exige
+DEBUG=True). O custo por requisição é de algumas chamadas ao relógio e um
+lock ao final, pequeno o bastante para ficar ligado em produção.
+
+Os números ficam na memória de cada processo. Com vários workers (gunicorn),
+cada um responde pelas próprias requisições; o Prometheus junta as séries
+somando por instância, como faz com qualquer exporter por processo.
+
+Com DEBUG=True a resposta ganha também um cabeçalho Server-Timing, que o
+DevTools do navegador mostra na aba Network.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+# Limites (em segundos) dos baldes do histograma de latência.
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites dos baldes do histograma de consultas por requisição: uma view cuja
+# contagem sobe junto com o tamanho da página aparece aqui (N+1).
+BALDES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class Medicao:
+    """Acumula o que acontece durante uma requisição."""
+    __slots__ = ('consultas', 'tempo_banco', 'tempo_serializacao')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.tempo_serializacao = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Assinatura de connection.execute_wrapper.
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_banco += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class SerieEndpoint:
+    """Todas as medidas de um endpoint (view + ação + método)."""
+
+    def __init__(self):
+        self.respostas = {}
+        self.latencia = Histograma(BALDES_LATENCIA)
+        self.consultas = Histograma(BALDES_CONSULTAS)
+        self.tempo_banco = 0.0
+        self.tempo_serializacao = 0.0
+        self.bytes_resposta = 0
+        self.respostas_com_tamanho = 0
+
+
+class RegistroMetricas:
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, rotulos, status, duracao, medicao, tamanho):
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = SerieEndpoint()
+            serie.respostas[status] = serie.respostas.get(status, 0) + 1
+            serie.latencia.observar(duracao)
+            serie.consultas.observar(medicao.consultas)
+            serie.tempo_banco += medicao.tempo_banco
+            serie.tempo_serializacao += medicao.tempo_serializacao
+            if tamanho is not None:
+                serie.bytes_resposta += tamanho
+                serie.respostas_com_tamanho += 1
+
+    def limpar(self):
+        with self._lock:
+            self._series.clear()
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            series = sorted(self._series.items())
+            linhas = []
+
+            linhas += cabecalho('http_requests', 'counter', 'Requisições atendidas, por endpoint e status.')
+            for rotulos, serie in series:
+                for status, quantidade in sorted(serie.respostas.items()):
+                    linhas.append(f'dealerconnect_http_requests_total{{{formatar(rotulos, status=status)}}} {quantidade}')
+
+            linhas += cabecalho('http_request_duration_seconds', 'histogram', 'Latência das requisições.')
+            for rotulos, serie in series:
+                linhas += linhas_histograma('dealerconnect_http_request_duration_seconds', rotulos, serie.latencia)
+
+            linhas += cabecalho('db_queries_per_request', 'histogram', 'Consultas ao banco por requisição.')
+            for rotulos, serie in series:
+                linhas += linhas_histograma('dealerconnect_db_queries_per_request', rotulos, serie.consultas)
+
+            linhas += cabecalho('db_duration_seconds', 'counter', 'Tempo total gasto em consultas ao banco.')
+            for rotulos, serie in series:
+                linhas.append(f'dealerconnect_db_duration_seconds_total{{{formatar(rotulos)}}} {serie.tempo_banco:.6f}')
+
+            linhas += cabecalho('serialization_duration_seconds', 'counter',
+                                'Tempo total gasto nos serializers (to_representation).')
+            for rotulos, serie in series:
+                linhas.append(
+                    f'dealerconnect_serialization_duration_seconds_total{{{formatar(rotulos)}}} {serie.tempo_serializacao:.6f}'
+                )
+
+            linhas += cabecalho('http_response_size_bytes', 'summary',
+                                'Tamanho do corpo das respostas (respostas em streaming ficam de fora).')
+            for rotulos, serie in series:
+                linhas.append(f'dealerconnect_http_response_size_bytes_sum{{{formatar(rotulos)}}} {serie.bytes_resposta}')
+                linhas.append(f'dealerconnect_http_response_size_bytes_count{{{formatar(rotulos)}}} {serie.respostas_com_tamanho}')
+        return '\n'.join(linhas) + '\n'
+
+
+def cabecalho(nome, tipo, descricao):
+    nome = f'dealerconnect_{nome}'
+    return [f'# HELP {nome} {descricao}', f'# TYPE {nome} {tipo}']
+
+
+def formatar(rotulos, **extras):
+    view, acao, metodo = rotulos
+    pares = [('view', view), ('action', acao), ('method', metodo)] + [(chave, str(valor)) for chave, valor in extras.items()]
+    return ','.join(f'{chave}="{escapar(valor)}"' for chave, valor in pares)
+
+
+def escapar(valor):
+    return valor.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def linhas_histograma(nome, rotulos, histograma):
+    linhas = []
+    acumulado = 0
+    for limite, quantidade in zip(histograma.baldes, histograma.contagens):
+        acumulado += quantidade
+        linhas.append(f'{nome}_bucket{{{formatar(rotulos, le=limite)}}} {acumulado}')
+    linhas.append(f'{nome}_bucket{{{formatar(rotulos, le="+Inf")}}} {histograma.total}')
+    linhas.append(f'{nome}_sum{{{formatar(rotulos)}}} {histograma.soma:.6f}')
+    linhas.append(f'{nome}_count{{{formatar(rotulos)}}} {histograma.total}')
+    return linhas
+
+
+# Instância única por processo.
+metricas = RegistroMetricas()
+
+
+def nome_do_endpoint(request, view_func):
+    """(view, ação, método) da requisição, como aparecem nos rótulos das métricas."""
+    metodo = request.method
+    if view_func is None:
+        return ('nao_encontrada', '', metodo)
+    classe = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    nome = classe.__name__ if classe is not None else getattr(view_func, '__name__', 'view')
+    # Nos ViewSets do DRF, view_func.actions diz qual ação atende o método
+    # ({'get': 'list', 'post': 'create'}); nas APIView a ação é o próprio método.
+    acoes = getattr(view_func, 'actions', None) or {}
+    return (nome, acoes.get(metodo.lower(), metodo.lower()), metodo)
+
+
+def medir_serializacao(serializer):
+    """
+    Conta o tempo do to_representation do serializer na requisição que está
+    sendo medida. Fora do middleware (comandos, testes) devolve o serializer
+    sem mexer em nada.
+    """
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return serializer
+    original = serializer.to_representation
+
+    def to_representation(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            medicao.tempo_serializacao += time.perf_counter() - inicio
+
+    serializer.to_representation = to_representation
+    return serializer
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        request._endpoint_metricas = None
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(medicao))
+                response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        duracao = time.perf_counter() - inicio
+
+        rotulos = request._endpoint_metricas or nome_do_endpoint(request, None)
+        tamanho = None if response.streaming else len(response.content)
+        metricas.registrar(rotulos, response.status_code, duracao, medicao, tamanho)
+
+        if settings.DEBUG:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={medicao.tempo_banco * 1000:.1f};desc="consultas: {medicao.consultas}"',
+                f'ser;dur={medicao.tempo_serializacao * 1000:.1f};desc="serializers"',
+                f'total;dur={duracao * 1000:.1f}',
+            ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._endpoint_metricas = nome_do_endpoint(request, view_func)
+
+
+def exportar_metricas(request):
+    """GET /api/metrics/: as métricas deste processo, para o Prometheus."""
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
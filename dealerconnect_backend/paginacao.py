@@ -0,0 +1,214 @@
+# dealerconnect_backend/paginacao.py
+"""
+Paginação por cursor (keyset) para as listagens grandes.
+
+Com a PageNumberPagination, cada página faz um COUNT(*) na tabela inteira e
+um OFFSET que cresce a cada página: para chegar na página 400, o banco lê e
+descarta 10 mil linhas. Aqui a página seguinte é pedida "a partir da última
+linha vista", algo como
+
+    WHERE (data_venda < x) OR (data_venda = x AND id > y)
+    ORDER BY data_venda DESC, id LIMIT 26
+
+que anda pelo índice e custa o mesmo na primeira página ou na milésima.
+
+O CursorPagination do DRF usa só o primeiro campo da ordenação como posição
+(e um deslocamento para desempatar), e não aceita campos de outras tabelas
+(pessoa__nome). Esta versão guarda no cursor o valor de todos os campos da
+ordenação, então a posição é sempre única desde que o último campo seja a
+chave primária.
+
+Campos que aceitam NULL entram na ordenação com os nulos valendo "menos que
+qualquer valor" (o padrão do MySQL e do SQLite): no fim em ordem decrescente,
+no começo em ordem crescente. O filtro da página seguinte segue a mesma regra.
+"""
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class PaginacaoPorCursor(CursorPagination):
+    """
+    Base das paginações por cursor. Nas subclasses, defina `ordering` terminando
+    na chave primária, por exemplo ('-data_venda', 'id').
+
+    Outras ordenações podem ser liberadas em `ordenacoes`, escolhidas com
+    ?ordering=<nome>: {'-prob_alto': ('-prob_alto', 'pessoa_id')}. Nomes fora
+    da lista são ignorados, como no OrderingFilter do DRF.
+    """
+    ordering = ('pk',)
+    ordenacoes = {}
+    parametro_ordenacao = 'ordering'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        escolhida = request.query_params.get(self.parametro_ordenacao)
+        ordering = tuple(self.ordenacoes.get(escolhida, type(self).ordering))
+        # Resultados de uma busca (dealerconnect_backend/busca.py) vêm primeiro
+        # pelos mais relevantes; a ordenação normal desempata.
+        if 'relevancia' in queryset.query.annotations:
+            ordering = ('-relevancia',) + ordering
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.campos_nulos = campos_que_aceitam_nulo(queryset.model, self.ordering)
+        queryset = self.anotar_posicao(queryset)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordenacao = self.ordering if not reverse else tuple(inverter(campo) for campo in self.ordering)
+        queryset = queryset.order_by(*(self.expressao_de_ordem(campo) for campo in ordenacao))
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self.filtro_apos(ordenacao, current_position))
+            except (TypeError, ValueError, ValidationError):
+                # Cursor adulterado: um valor que não serve para o campo ('abc' num número).
+                raise NotFound(self.invalid_cursor_message)
+
+        # Busca um item a mais só para saber se existe página seguinte.
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        # Daqui em diante a lógica é a mesma do CursorPagination do DRF.
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def anotar_posicao(self, queryset):
+        """
+        Campos de outras tabelas (pessoa__nome) são trazidos como anotação na
+        mesma consulta, para montar o cursor sem carregar a relação de novo.
+        """
+        anotacoes = {
+            nome_da_anotacao(campo): F(campo.lstrip('-'))
+            for campo in self.ordering if '__' in campo
+        }
+        return queryset.annotate(**anotacoes) if anotacoes else queryset
+
+    def expressao_de_ordem(self, campo):
+        nome = campo.lstrip('-')
+        if nome not in self.campos_nulos:
+            return campo
+        # Nulos sempre como o menor valor, em qualquer banco. No MySQL isso já
+        # é o padrão, então o ORDER BY sai sem nada a mais e o índice é usado.
+        if campo.startswith('-'):
+            return F(nome).desc(nulls_last=True)
+        return F(nome).asc(nulls_first=True)
+
+    def filtro_apos(self, ordenacao, posicao):
+        """
+        Monta o "depois desta posição" para uma ordenação de vários campos:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        filtro = Q()
+        iguais = Q()
+        for campo, valor in zip(ordenacao, posicao):
+            nome = campo.lstrip('-')
+            depois = self.depois_do_valor(nome, campo.startswith('-'), valor)
+            if depois is not None:
+                filtro |= iguais & depois
+            iguais &= Q(**{nome + '__isnull': True}) if valor is None else Q(**{nome: valor})
+        return filtro
+
+    def depois_do_valor(self, nome, decrescente, valor):
+        """
+        "Vem depois de `valor`" para um campo só. Com nulos (o menor valor):
+        em ordem decrescente, depois de x vêm os menores e os nulos, e depois
+        do nulo não vem nada; em ordem crescente, depois do nulo vem qualquer valor.
+        """
+        comparacao = Q(**{nome + ('__lt' if decrescente else '__gt'): valor}) if valor is not None else None
+        if nome not in self.campos_nulos:
+            return comparacao
+        if decrescente:
+            return comparacao | Q(**{nome + '__isnull': True}) if comparacao is not None else None
+        return comparacao if comparacao is not None else Q(**{nome + '__isnull': False})
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            posicao = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(posicao, list) or len(posicao) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=cursor.offset, reverse=cursor.reverse, position=tuple(posicao))
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = Cursor(offset=cursor.offset, reverse=cursor.reverse, position=json.dumps(list(cursor.position)))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        posicao = []
+        for campo in ordering:
+            nome = campo.lstrip('-')
+            if '__' in nome:
+                nome = nome_da_anotacao(campo)
+            valor = instance[nome] if isinstance(instance, dict) else getattr(instance, nome)
+            posicao.append(None if valor is None else str(valor))
+        return tuple(posicao)
+
+
+def campos_que_aceitam_nulo(modelo, ordenacao):
+    """Campos da própria tabela, entre os da ordenação, que aceitam NULL."""
+    nulos = set()
+    for campo in ordenacao:
+        nome = campo.lstrip('-')
+        if '__' in nome:
+            continue
+        try:
+            if modelo._meta.get_field(nome).null:
+                nulos.add(nome)
+        except FieldDoesNotExist:
+            # Anotações (como a relevância da busca) nunca são nulas aqui.
+            pass
+    return nulos
+
+
+def inverter(campo):
+    return campo[1:] if campo.startswith('-') else '-' + campo
+
+
+def nome_da_anotacao(campo):
+    return 'cursor_' + campo.lstrip('-').replace('__', '_')
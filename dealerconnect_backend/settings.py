@@ -51,6 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista, para medir a requisição inteira (ver dealerconnect_backend/metricas.py).
+    'dealerconnect_backend.metricas.MetricasMiddleware',
+    # Só fica ativo com GUARDA_CONSULTAS definido (ver abaixo).
+    'dealerconnect_backend.guarda_consultas.GuardaConsultasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -146,4 +150,48 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 25  # Define que cada "página" de resultados terá 25 itens.
-}
\ No newline at end of file
+}
+
+# Cache usado pelas estatísticas do dashboard. O LocMemCache vale só para o
+# processo atual; em produção, com vários workers, aponte para um cache
+# compartilhado (Redis ou Memcached) para que a invalidação valha para todos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dealerconnect',
+    }
+}
+
+# Tempo máximo (em segundos) que as estatísticas do dashboard ficam em cache.
+# Criar/apagar/reclassificar clientes invalida o cache antes disso.
+DASHBOARD_STATS_TTL = 300
+
+# Tempo máximo (em segundos) que as análises de vendas ficam em cache.
+DASHBOARD_VENDAS_TTL = 300
+
+# Tempo máximo (em segundos) que o funil de conversão fica em cache. Pessoas,
+# clientes e vendas novas invalidam antes; atendimentos novos (que só mexem na
+# mediana do tempo até a venda) esperam o TTL.
+DASHBOARD_FUNIL_TTL = 600
+
+# Pasta onde ficam os modelos de Machine Learning (.joblib).
+ML_MODELS_DIR = BASE_DIR / 'ml_models'
+
+# Carrega os modelos na inicialização de cada processo que serve a API
+# (wsgi.py/asgi.py), em vez de esperar a primeira requisição de classificação.
+ML_PRECARREGAR_MODELOS = True
+
+# Quantas combinações (idade, município, lead_score) o cache de previsões
+# guarda por processo (usuarios/cache_previsoes.py).
+ML_CACHE_PREVISOES_TAMANHO = 50000
+
+# Quando idade, endereço ou lead_score de um cliente mudam, ele volta para a
+# fila de classificação (processada pelo comando processar_classificacoes).
+# A espera junta edições seguidas do mesmo cliente numa só reclassificação.
+CLASSIFICACAO_AUTOMATICA = True
+CLASSIFICACAO_ESPERA_SEGUNDOS = 5
+
+# Aviso de consultas N+1 em cada requisição (dealerconnect_backend/guarda_consultas.py):
+# 'log' escreve um warning com o SQL repetido e o atributo que o disparou,
+# 'erro' faz a requisição falhar, None desliga. Ligado só em desenvolvimento.
+GUARDA_CONSULTAS = 'log' if DEBUG else None
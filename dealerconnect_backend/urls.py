@@ -17,6 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metricas import exportar_metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # Adicionamos os caminhos para a nossa API
@@ -25,5 +27,7 @@ urlpatterns = [
         path('', include('produtos.urls')),
         path('', include('operacoes.urls')),
         path('', include('dashboard.urls')),
+        # Métricas por endpoint no formato do Prometheus.
+        path('metrics/', exportar_metricas, name='metricas'),
     ]))
 ]
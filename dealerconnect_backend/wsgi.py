@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dealerconnect_backend.settings')
 
 application = get_wsgi_application()
+
+# Só quem serve a API paga a carga do modelo na inicialização; comandos do
+# manage.py não importam este arquivo.
+from usuarios.ml_registry import precarregar  # noqa: E402
+
+precarregar()
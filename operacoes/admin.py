@@ -1,5 +1,14 @@
 from django.contrib import admin
 from .models import Venda, Atendimento
 
-admin.site.register(Venda)
-admin.site.register(Atendimento)
\ No newline at end of file
+
+# O __str__ de Venda e de Atendimento mostra o nome do cliente (cliente.pessoa.nome);
+# sem o list_select_related, cada linha da listagem do admin faria duas consultas a mais.
+@admin.register(Venda)
+class VendaAdmin(admin.ModelAdmin):
+    list_select_related = ('cliente__pessoa',)
+
+
+@admin.register(Atendimento)
+class AtendimentoAdmin(admin.ModelAdmin):
+    list_select_related = ('cliente__pessoa',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OperacoesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'operacoes'
+
+    def ready(self):
+        # Conecta os sinais que mantêm o resumo diário de vendas atualizado.
+        from . import signals  # noqa: F401
@@ -0,0 +1,153 @@
+# operacoes/atendimentos.py
+"""
+Registro de atendimentos e manutenção dos contadores em Cliente.
+
+Atendimento é a tabela que mais recebe escritas: cada ligação, visita ou
+mensagem vira uma linha. Para a listagem de clientes poder ordenar por
+"último contato" sem agregar os atendimentos de cada cliente, Cliente guarda
+qtd_atendimentos e ultimo_atendimento_em:
+
+- atendimento novo (um só ou em lote): os contadores são incrementados com
+  um UPDATE ... SET qtd = qtd + n, ultimo = GREATEST(...), sem ler nada;
+- atendimento apagado, editado ou trocado de cliente: os contadores dos
+  clientes envolvidos são recalculados a partir da tabela, uma vez só,
+  depois do commit (mesma ideia do agendar_atualizacao de resumos.py).
+
+O comando recalcular_contadores (ou recalcular_contadores() aqui) refaz
+tudo a partir dos atendimentos, caso alguém grave direto no banco.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from rest_framework.exceptions import ValidationError
+
+from dealerconnect_backend.apos_commit import LoteAposCommit
+from usuarios.models import Cliente, Usuario
+from usuarios.signals import alteracao_em_lote
+from .models import Atendimento
+
+TAMANHO_LOTE_PADRAO = 1000
+# Acima disso o pedido é recusado: o corpo inteiro fica na memória durante a validação.
+MAXIMO_LINHAS = 10000
+
+CAMPOS_CONTADORES = ['qtd_atendimentos', 'ultimo_atendimento_em']
+
+
+def incrementar_contadores(atendimentos):
+    """
+    Soma os atendimentos recém-criados aos contadores dos clientes. Clientes
+    com a mesma quantidade nova e a mesma data mais recente (o caso comum de
+    um lote gravado "agora") são atualizados num único UPDATE.
+    """
+    por_cliente = {}
+    for atendimento in atendimentos:
+        quantidade, ultimo = por_cliente.get(atendimento.cliente_id, (0, None))
+        data = atendimento.data_atendimento
+        por_cliente[atendimento.cliente_id] = (quantidade + 1, data if ultimo is None or data > ultimo else ultimo)
+
+    grupos = {}
+    for cliente_id, par in por_cliente.items():
+        grupos.setdefault(par, []).append(cliente_id)
+    for (quantidade, ultimo), ids in grupos.items():
+        Cliente.objects.filter(pk__in=ids).update(
+            qtd_atendimentos=F('qtd_atendimentos') + quantidade,
+            # GREATEST com NULL dá NULL no MySQL; o Coalesce cobre o primeiro atendimento.
+            ultimo_atendimento_em=Greatest(Coalesce('ultimo_atendimento_em', Value(ultimo)), Value(ultimo)),
+        )
+
+
+def recalcular_contadores(clientes_ids=None):
+    """
+    Refaz os contadores a partir da tabela de atendimentos, para os clientes
+    informados ou para todos. Um UPDATE com subconsultas, que usam o índice
+    (cliente, -data_atendimento). Retorna quantos clientes foram gravados.
+    """
+    do_cliente = Atendimento.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+    clientes = Cliente.objects.all()
+    if clientes_ids is not None:
+        clientes = clientes.filter(pk__in=list(clientes_ids))
+    total = clientes.update(
+        qtd_atendimentos=Coalesce(Subquery(do_cliente.annotate(qtd=Count('id')).values('qtd')), 0),
+        ultimo_atendimento_em=Subquery(do_cliente.annotate(ultimo=Max('data_atendimento')).values('ultimo')),
+    )
+    if total:
+        alteracao_em_lote.send(sender=Cliente, campos=CAMPOS_CONTADORES)
+    return total
+
+
+_recalculo = LoteAposCommit(recalcular_contadores)
+
+
+def agendar_recalculo(clientes_ids):
+    """
+    Junta os clientes afetados dentro da transação atual e recalcula os
+    contadores deles uma vez só, depois do commit.
+    """
+    _recalculo.agendar(clientes_ids)
+
+
+def validar(linhas, serializer):
+    """
+    Valida as linhas com o serializer (uma instância só) e confere, com uma
+    consulta IN para cada tabela, se os clientes e atendentes existem.
+    Devolve (atendimentos válidos com a posição, {posição: erros}).
+    """
+    # Linhas sem data recebem todas o mesmo "agora": assim os clientes do lote
+    # caem no mesmo grupo do incrementar_contadores (um UPDATE para todos).
+    agora = timezone.now()
+    validos, erros = [], {}
+    for posicao, linha in enumerate(linhas):
+        if not isinstance(linha, dict):
+            erros[posicao] = {'non_field_errors': ['Cada linha deve ser um objeto JSON.']}
+            continue
+        try:
+            validos.append((posicao, serializer.run_validation(linha)))
+        except ValidationError as excecao:
+            erros[posicao] = excecao.detail
+
+    clientes = existentes(Cliente, {dados['cliente_id'] for _, dados in validos})
+    atendentes = existentes(Usuario, {dados['atendente_id'] for _, dados in validos if dados.get('atendente_id')})
+    atendimentos = []
+    for posicao, dados in validos:
+        erros_da_linha = {}
+        if dados['cliente_id'] not in clientes:
+            erros_da_linha['cliente'] = [f'Cliente {dados["cliente_id"]} não encontrado.']
+        if dados.get('atendente_id') and dados['atendente_id'] not in atendentes:
+            erros_da_linha['atendente'] = [f'Usuário {dados["atendente_id"]} não encontrado.']
+        if erros_da_linha:
+            erros[posicao] = erros_da_linha
+        else:
+            atendimentos.append((posicao, Atendimento(**{'data_atendimento': agora, **dados})))
+    return atendimentos, erros
+
+
+def existentes(modelo, ids, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    ids = list(ids)
+    encontrados = set()
+    for inicio in range(0, len(ids), tamanho_lote):
+        encontrados.update(modelo.objects.filter(pk__in=ids[inicio:inicio + tamanho_lote]).values_list('pk', flat=True))
+    return encontrados
+
+
+def registrar_atendimentos(linhas, serializer, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Grava os atendimentos válidos com bulk_create (uma transação por bloco,
+    junto com o incremento dos contadores) e devolve um resumo com os erros
+    das linhas recusadas, que não impedem a gravação das outras.
+    """
+    atendimentos, erros = validar(linhas, serializer)
+    for inicio in range(0, len(atendimentos), tamanho_lote):
+        bloco = [atendimento for _, atendimento in atendimentos[inicio:inicio + tamanho_lote]]
+        with transaction.atomic():
+            Atendimento.objects.bulk_create(bloco)
+            incrementar_contadores(bloco)
+    if atendimentos:
+        alteracao_em_lote.send(sender=Cliente, campos=CAMPOS_CONTADORES)
+
+    return {
+        'total': len(linhas),
+        'criados': len(atendimentos),
+        'erros': [{'linha': posicao + 1, 'erros': erros[posicao]} for posicao in sorted(erros)],
+    }
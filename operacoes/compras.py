@@ -0,0 +1,116 @@
+# operacoes/compras.py
+"""
+Resumo de compras de cada cliente, guardado no próprio Cliente.
+
+qtd_compras, ultima_compra_em, valor_total_compras e segmento_favorito
+deixam a listagem de clientes ordenar e filtrar pelo histórico de compras com
+colunas indexadas, sem um JOIN + GROUP BY com as vendas a cada página.
+
+- venda nova: um UPDATE no cliente soma a quantidade e o valor, ajusta a data
+  da última compra (GREATEST) e recalcula o segmento favorito com uma
+  subconsulta que anda pelo índice (cliente, -data_venda) das vendas;
+- venda alterada ou apagada: o resumo dos clientes envolvidos é refeito a
+  partir das vendas, uma vez só, depois do commit;
+- importação de planilhas: o resumo dos clientes que receberam vendas é
+  refeito no fim (importacao.importar_vendas);
+- recalcular_resumo_compras() / comando recalcular_resumo_compras: refaz
+  tudo com UPDATEs baseados em conjunto, em faixas da chave primária.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from dealerconnect_backend.apos_commit import LoteAposCommit
+from usuarios.models import Cliente
+from usuarios.signals import alteracao_em_lote
+from .models import Venda
+
+TAMANHO_LOTE_PADRAO = 5000
+
+CAMPOS_RESUMO_COMPRAS = ['qtd_compras', 'ultima_compra_em', 'valor_total_compras', 'segmento_favorito']
+
+_VALOR = DecimalField(max_digits=14, decimal_places=2)
+
+
+def vendas_do_cliente():
+    """Vendas do cliente da linha sendo atualizada, para as subconsultas (sem ORDER BY)."""
+    return Venda.objects.filter(cliente=OuterRef('pk')).order_by()
+
+
+def segmento_favorito():
+    """
+    Subconsulta com o segmento em que o cliente mais comprou; no empate, o da
+    compra mais recente (e, por fim, o de menor id, para o resultado ser estável).
+    """
+    por_segmento = (
+        vendas_do_cliente()
+        .filter(veiculo__segmento__isnull=False)
+        .values('veiculo__segmento')
+        .annotate(qtd=Count('id'), ultima=Max('data_venda'))
+        .order_by('-qtd', '-ultima', 'veiculo__segmento')
+    )
+    return Subquery(por_segmento.values('veiculo__segmento')[:1])
+
+
+def registrar_venda(venda):
+    """Soma uma venda recém-criada ao resumo do cliente, num único UPDATE."""
+    Cliente.objects.filter(pk=venda.cliente_id).update(
+        qtd_compras=F('qtd_compras') + 1,
+        valor_total_compras=F('valor_total_compras') + Value(Decimal(venda.valor_final), output_field=_VALOR),
+        # GREATEST com NULL dá NULL no MySQL; o Coalesce cobre a primeira compra.
+        ultima_compra_em=Greatest(Coalesce('ultima_compra_em', Value(venda.data_venda)), Value(venda.data_venda)),
+        segmento_favorito=segmento_favorito(),
+    )
+
+
+def atualizar_resumo(clientes):
+    """Refaz o resumo dos clientes do queryset a partir das vendas (um UPDATE)."""
+    vendas = vendas_do_cliente().values('cliente')
+    return clientes.update(
+        qtd_compras=Coalesce(Subquery(vendas.annotate(qtd=Count('id')).values('qtd')), 0),
+        ultima_compra_em=Subquery(vendas.annotate(ultima=Max('data_venda')).values('ultima')),
+        valor_total_compras=Coalesce(
+            Subquery(vendas.annotate(total=Sum('valor_final')).values('total')),
+            Value(Decimal('0')), output_field=_VALOR,
+        ),
+        segmento_favorito=segmento_favorito(),
+    )
+
+
+def recalcular_resumo_compras(clientes_ids=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Refaz o resumo dos clientes informados ou de todos. A base inteira é
+    percorrida em faixas de `tamanho_lote` clientes pela chave primária, cada
+    uma num UPDATE próprio: nenhuma transação segura a tabela toda de uma vez.
+    Retorna quantos clientes foram gravados.
+    """
+    total = 0
+    if clientes_ids is not None:
+        ids = sorted(set(clientes_ids))
+        for inicio in range(0, len(ids), tamanho_lote):
+            total += atualizar_resumo(Cliente.objects.filter(pk__in=ids[inicio:inicio + tamanho_lote]))
+    else:
+        chaves = Cliente.objects.order_by('pk').values_list('pk', flat=True)
+        ultimo_pk = None
+        while True:
+            faixa = chaves if ultimo_pk is None else chaves.filter(pk__gt=ultimo_pk)
+            faixa = list(faixa[:tamanho_lote])
+            if not faixa:
+                break
+            total += atualizar_resumo(Cliente.objects.filter(pk__gte=faixa[0], pk__lte=faixa[-1]))
+            ultimo_pk = faixa[-1]
+    if total:
+        alteracao_em_lote.send(sender=Cliente, campos=CAMPOS_RESUMO_COMPRAS)
+    return total
+
+
+_recalculo = LoteAposCommit(recalcular_resumo_compras)
+
+
+def agendar_recalculo(clientes_ids):
+    """
+    Junta os clientes afetados dentro da transação atual e refaz o resumo
+    deles uma vez só, depois do commit.
+    """
+    _recalculo.agendar(clientes_ids)
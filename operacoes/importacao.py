@@ -0,0 +1,301 @@
+# operacoes/importacao.py
+"""
+Motor de importação das planilhas de vendas.
+
+Em vez de buscar cliente, veículo e vendedor linha a linha, as três tabelas de
+consulta são carregadas uma vez (uma consulta cada) e cruzadas com a planilha
+usando merges do pandas. As vendas são gravadas com bulk_create em lotes e as
+linhas que não puderam ser casadas vão para um relatório de rejeitadas.
+
+O mesmo motor serve para a carga completa do popular_banco e para anexar
+planilhas novas: vendas cujo chassi já foi importado naquela mesma data não são
+inseridas de novo (só atualizadas, se algo mudou), então reimportar um arquivo
+não duplica nada. Por isso linhas sem chassi vão para as rejeitadas (não há
+como reconhecê-las numa segunda importação), assim como a repetição de um
+mesmo chassi e dia dentro da planilha.
+
+A função sincronizar faz o mesmo "diff" para as outras tabelas, pela chave
+natural de cada uma (CPF, modelo, nome do segmento).
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from produtos.models import Veiculo
+from usuarios.models import Cliente, Pessoa, Usuario
+from usuarios.signals import alteracao_em_lote
+from .compras import recalcular_resumo_compras
+from .models import Venda
+from .resumos import atualizar_resumo_dias
+
+TAMANHO_LOTE_PADRAO = 1000
+
+# Colunas da planilha vendas_processado.csv usadas na importação.
+COLUNAS_OBRIGATORIAS = ['Data', 'Veículo', 'Cliente']
+
+# Motivos de rejeição gravados no relatório.
+MOTIVO_INCOMPLETA = 'linha incompleta (sem data, veículo ou cliente)'
+MOTIVO_DATA_INVALIDA = 'data inválida'
+MOTIVO_SEM_CLIENTE = 'cliente não encontrado'
+MOTIVO_SEM_VEICULO = 'veículo não encontrado'
+MOTIVO_SEM_CHASSI = 'sem chassi (não daria para reconhecê-la numa reimportação)'
+MOTIVO_REPETIDA = 'chassi e data repetidos na planilha'
+
+
+def em_lotes(valores, tamanho):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+
+@dataclass
+class ResumoSincronizacao:
+    inseridos: int = 0
+    atualizados: int = 0
+    inalterados: int = 0
+    # Linhas novas que o banco recusou por conflito em outra restrição única.
+    ignorados: int = 0
+
+    def como_dict(self):
+        return {'inseridos': self.inseridos, 'atualizados': self.atualizados, 'inalterados': self.inalterados,
+                'ignorados': self.ignorados}
+
+
+def sincronizar(modelo, campo_chave, registros, campos_atualizaveis=(), tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Compara `registros` ({chave natural: {campo: valor}}) com o que está no banco:
+    insere as chaves novas, atualiza com bulk_update só as linhas em que algum
+    dos `campos_atualizaveis` mudou e não toca nas demais.
+    Campos fora de `campos_atualizaveis` só são usados na inserção.
+    """
+    resumo = ResumoSincronizacao()
+    campos_atualizaveis = list(campos_atualizaveis)
+    # Normaliza os valores para o tipo do campo (ex.: telefone numérico do CSV
+    # vira texto), senão toda linha pareceria alterada.
+    conversores = {campo: modelo._meta.get_field(campo).to_python for campo in campos_atualizaveis}
+
+    existentes = {}
+    for lote in em_lotes(registros, tamanho_lote):
+        consulta = modelo.objects.filter(**{f'{campo_chave}__in': lote}).order_by('pk')
+        for objeto in consulta.only('pk', campo_chave, *campos_atualizaveis):
+            # Se a chave se repetir no banco, vale o registro mais antigo.
+            existentes.setdefault(getattr(objeto, campo_chave), objeto)
+
+    novos, alterados = [], []
+    # {pk: campos que mudaram}, enviado no sinal para quem precisa saber o que mudou em cada linha.
+    campos_alterados = {}
+    for chave, valores in registros.items():
+        objeto = existentes.get(chave)
+        if objeto is None:
+            novos.append(modelo(**{campo_chave: chave}, **valores))
+            continue
+        mudaram = []
+        for campo in campos_atualizaveis:
+            valor = conversores[campo](valores[campo])
+            if getattr(objeto, campo) != valor:
+                setattr(objeto, campo, valor)
+                mudaram.append(campo)
+        if mudaram:
+            alterados.append(objeto)
+            campos_alterados[objeto.pk] = mudaram
+        else:
+            resumo.inalterados += 1
+
+    with transaction.atomic():
+        modelo.objects.bulk_create(novos, batch_size=tamanho_lote, ignore_conflicts=True)
+        if alterados:
+            modelo.objects.bulk_update(alterados, campos_atualizaveis, batch_size=tamanho_lote)
+    # O ignore_conflicts descarta em silêncio as linhas que batem em outra
+    # restrição única (ex.: e-mail repetido); só conta como inserido o que
+    # está mesmo no banco, relido pela chave natural.
+    inseridos = ids_inseridos(modelo, campo_chave, [getattr(objeto, campo_chave) for objeto in novos], tamanho_lote)
+    resumo.inseridos = len(inseridos)
+    resumo.ignorados = len(novos) - len(inseridos)
+    resumo.atualizados = len(alterados)
+    if inseridos or alterados:
+        alteracao_em_lote.send(
+            sender=modelo, campos=campos_atualizaveis if not inseridos else None, alterados=campos_alterados,
+            inseridos=inseridos,
+        )
+    return resumo
+
+
+def ids_inseridos(modelo, campo_chave, chaves, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Pks das linhas recém-inseridas, relidas pela chave natural: o bulk_create
+    do MySQL (e qualquer um com ignore_conflicts) não preenche o pk.
+    """
+    ids = []
+    for lote in em_lotes(chaves, tamanho_lote):
+        ids.extend(modelo.objects.filter(**{f'{campo_chave}__in': lote}).values_list('pk', flat=True))
+    return ids
+
+
+@dataclass
+class ResultadoImportacao:
+    inseridas: int = 0
+    atualizadas: int = 0
+    ja_importadas: int = 0
+    rejeitadas: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Clientes e dias que receberam vendas novas, para quem precisar recalcular resumos.
+    clientes_afetados: set = field(default_factory=set)
+    dias_afetados: set = field(default_factory=set)
+
+    def como_dict(self):
+        return {
+            'inseridos': self.inseridas,
+            'atualizados': self.atualizadas,
+            'inalterados': self.ja_importadas,
+            'rejeitados': len(self.rejeitadas),
+        }
+
+    def motivos(self):
+        if self.rejeitadas.empty:
+            return {}
+        return self.rejeitadas['motivo'].value_counts().to_dict()
+
+
+def vendedor_sistema():
+    """Vendedor usado quando a venda não tem um vendedor cadastrado (ex.: entregas via CNH)."""
+    pessoa_sistema, _ = Pessoa.objects.get_or_create(cpf_cnpj='000SYSTEM000', defaults={'nome': 'Sistema / CNH'})
+    usuario, _ = Usuario.objects.get_or_create(pessoa=pessoa_sistema, defaults={'senha_hash': 'sistema', 'perfil': 'SISTEMA'})
+    return usuario
+
+
+def tabela_de_consulta(queryset, campo_nome, coluna_id):
+    """
+    Carrega {nome: id} em um DataFrame com uma única consulta. Se houver nomes
+    repetidos, vale o de menor id (o mesmo que o .first() fazia antes).
+    """
+    linhas = queryset.order_by('pk').values_list(campo_nome, 'pk')
+    tabela = pd.DataFrame(list(linhas), columns=['_chave', coluna_id])
+    return tabela.drop_duplicates(subset=['_chave'])
+
+
+def converter_datas(serie):
+    """Converte a coluna 'Data' (AAAA-MM-DD) em datas com fuso, como o Django espera."""
+    datas = pd.to_datetime(serie, errors='coerce')
+    return datas.dt.tz_localize(timezone.get_current_timezone())
+
+
+# Campos de uma venda já importada que são atualizados se a planilha mudar.
+CAMPOS_ATUALIZAVEIS_VENDA = ['cliente_id', 'veiculo_id', 'vendedor_id', 'tipo_pagamento']
+
+
+def vendas_ja_importadas(chassis):
+    """
+    Vendas que já estão no banco para os chassis informados,
+    indexadas pelo par (chassi, dia da venda).
+    """
+    existentes = {}
+    for lote in em_lotes(set(chassis), TAMANHO_LOTE_PADRAO):
+        consulta = Venda.objects.filter(chassi__in=lote).order_by('pk')
+        for venda in consulta.only('pk', 'chassi', 'data_venda', *CAMPOS_ATUALIZAVEIS_VENDA):
+            existentes.setdefault((venda.chassi, timezone.localtime(venda.data_venda).date()), venda)
+    return existentes
+
+
+def importar_vendas(df_vendas, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Importa as vendas do DataFrame (no formato de vendas_processado.csv).
+    Retorna um ResultadoImportacao com as contagens e as linhas rejeitadas.
+    """
+    resultado = ResultadoImportacao()
+    df = df_vendas.copy()
+    df['motivo'] = None
+
+    incompleta = df[COLUNAS_OBRIGATORIAS].isna().any(axis=1)
+    df.loc[incompleta, 'motivo'] = MOTIVO_INCOMPLETA
+    df['_data'] = converter_datas(df['Data'])
+    df.loc[df['motivo'].isna() & df['_data'].isna(), 'motivo'] = MOTIVO_DATA_INVALIDA
+    df['_dia'] = df['_data'].dt.date
+
+    # Uma consulta para cada tabela de consulta, depois tudo é resolvido em memória.
+    clientes = tabela_de_consulta(Cliente.objects.all(), 'pessoa__nome', '_cliente_id')
+    veiculos = tabela_de_consulta(Veiculo.objects.all(), 'modelo', '_veiculo_id')
+    vendedores = tabela_de_consulta(Usuario.objects.all(), 'pessoa__nome', '_vendedor_id')
+
+    df = df.merge(clientes, how='left', left_on='Cliente', right_on='_chave').drop(columns='_chave')
+    df = df.merge(veiculos, how='left', left_on='Veículo', right_on='_chave').drop(columns='_chave')
+    df = df.merge(vendedores, how='left', left_on='Vendedor', right_on='_chave').drop(columns='_chave')
+
+    df.loc[df['motivo'].isna() & df['_cliente_id'].isna(), 'motivo'] = MOTIVO_SEM_CLIENTE
+    df.loc[df['motivo'].isna() & df['_veiculo_id'].isna(), 'motivo'] = MOTIVO_SEM_VEICULO
+    df.loc[df['motivo'].isna() & df['Chassi'].isna(), 'motivo'] = MOTIVO_SEM_CHASSI
+    # O mesmo chassi duas vezes no mesmo dia: vale a primeira linha.
+    validas = df['motivo'].isna()
+    repetidas = df.loc[validas].duplicated(subset=['Chassi', '_dia'])
+    df.loc[repetidas[repetidas].index, 'motivo'] = MOTIVO_REPETIDA
+
+    resultado.rejeitadas = df.loc[df['motivo'].notna(), list(df_vendas.columns) + ['motivo']]
+    df = df[df['motivo'].isna()]
+
+    if df.empty:
+        return resultado
+
+    # Vendas sem vendedor cadastrado ficam com o vendedor "Sistema / CNH".
+    df['_vendedor_id'] = df['_vendedor_id'].fillna(vendedor_sistema().pk)
+    df['_tipo_pagamento'] = df['Forma de venda'].astype(object).where(df['Forma de venda'].notna(), '')
+    df['_chassi'] = df['Chassi'].astype(object)
+
+    # Importação incremental: a venda cujo chassi já foi importado naquele dia
+    # não é inserida de novo; se algum dado dela mudou, é atualizada.
+    existentes = vendas_ja_importadas(df['_chassi'])
+    if existentes:
+        ja_importada = pd.Series(
+            [(chassi, dia) in existentes for chassi, dia in zip(df['_chassi'], df['_dia'])],
+            index=df.index, dtype=bool,
+        )
+        alteradas = []
+        for chassi, dia, cliente_id, veiculo_id, vendedor_id, tipo_pagamento in zip(
+            *(df.loc[ja_importada, coluna] for coluna in
+              ['_chassi', '_dia', '_cliente_id', '_veiculo_id', '_vendedor_id', '_tipo_pagamento'])
+        ):
+            venda = existentes[(chassi, dia)]
+            novos_valores = [int(cliente_id), int(veiculo_id), int(vendedor_id), tipo_pagamento]
+            if [getattr(venda, campo) for campo in CAMPOS_ATUALIZAVEIS_VENDA] != novos_valores:
+                # Se a venda trocou de cliente, o cliente antigo também é afetado.
+                resultado.clientes_afetados.add(venda.cliente_id)
+                for campo, valor in zip(CAMPOS_ATUALIZAVEIS_VENDA, novos_valores):
+                    setattr(venda, campo, valor)
+                alteradas.append(venda)
+        if alteradas:
+            Venda.objects.bulk_update(alteradas, CAMPOS_ATUALIZAVEIS_VENDA, batch_size=tamanho_lote)
+        resultado.atualizadas = len(alteradas)
+        resultado.ja_importadas = int(ja_importada.sum()) - len(alteradas)
+        resultado.clientes_afetados.update(venda.cliente_id for venda in alteradas)
+        resultado.dias_afetados.update(timezone.localtime(venda.data_venda).date() for venda in alteradas)
+        df = df[~ja_importada]
+
+    if not df.empty:
+        inserir_vendas(df, resultado, tamanho_lote)
+
+    if resultado.inseridas or resultado.atualizadas:
+        alteracao_em_lote.send(sender=Venda, campos=None)
+        # Mantém o resumo diário em dia recalculando só os dias que receberam vendas.
+        atualizar_resumo_dias(resultado.dias_afetados)
+        # E o resumo de compras só dos clientes que ganharam (ou perderam) vendas.
+        recalcular_resumo_compras(resultado.clientes_afetados)
+    return resultado
+
+
+def inserir_vendas(df, resultado, tamanho_lote):
+    """Grava as vendas novas (já casadas) em lotes, uma transação por lote."""
+    vendas = [
+        Venda(
+            cliente_id=int(cliente_id), veiculo_id=int(veiculo_id), vendedor_id=int(vendedor_id),
+            data_venda=data.to_pydatetime(), chassi=chassi, valor_final=0, tipo_pagamento=tipo_pagamento,
+        )
+        for cliente_id, veiculo_id, vendedor_id, data, chassi, tipo_pagamento in zip(
+            df['_cliente_id'], df['_veiculo_id'], df['_vendedor_id'], df['_data'], df['_chassi'], df['_tipo_pagamento'],
+        )
+    ]
+    for lote in em_lotes(vendas, tamanho_lote):
+        with transaction.atomic():
+            Venda.objects.bulk_create(lote, batch_size=tamanho_lote)
+        resultado.inseridas += len(lote)
+
+    resultado.clientes_afetados.update(df['_cliente_id'].astype(int))
+    resultado.dias_afetados.update(df['_dia'])
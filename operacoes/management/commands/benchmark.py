@@ -0,0 +1,380 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from operacoes.compras import recalcular_resumo_compras
+from operacoes.management.commands.popular_banco import Command as PopularBanco
+from operacoes.models import Venda
+from operacoes.resumos import reconstruir_resumo
+from produtos.busca import indice_veiculos
+from produtos.models import Segmento, Veiculo
+from usuarios.busca import indice_pessoas
+from usuarios.cache_previsoes import cache_previsoes
+from usuarios.classificacao import CAMPOS_ENTRADA, prever
+from usuarios.ml_registry import registro
+from usuarios.models import Cliente, Pessoa, Usuario
+from usuarios.views import ClientePaginacao
+
+TAMANHO_LOTE = 5000
+
+NOMES = ['MARIA', 'JOSE', 'ANA', 'JOAO', 'ANTONIO', 'FRANCISCO', 'CARLOS', 'PAULO', 'PEDRO', 'LUCAS',
+         'LUIZ', 'MARCOS', 'LUIS', 'GABRIEL', 'RAFAEL', 'FRANCISCA', 'DANIEL', 'MARCELO', 'BRUNO', 'EDUARDO',
+         'JULIANA', 'ADRIANA', 'MARCIA', 'FERNANDA', 'PATRICIA', 'ALINE', 'SANDRA', 'CAMILA', 'AMANDA', 'BRUNA']
+SOBRENOMES = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'RODRIGUES', 'FERREIRA', 'ALVES', 'PEREIRA', 'LIMA',
+              'GOMES', 'COSTA', 'RIBEIRO', 'MARTINS', 'CARVALHO', 'ALMEIDA', 'LOPES', 'SOARES', 'FERNANDES',
+              'VIEIRA', 'BARBOSA', 'ROCHA', 'DIAS', 'NASCIMENTO', 'ANDRADE', 'MOREIRA', 'NUNES', 'MARQUES']
+# Os mesmos municípios que aparecem na base real (e que o modelo conhece).
+MUNICIPIOS = ['Desconhecido', 'Ponte Nova', 'Mariana', 'João Monlevade', 'Viçosa', 'Campinas']
+SEGMENTOS = ['City', 'Street', 'Trail', 'Scooter', 'Naked']
+TIPOS_PAGAMENTO = [tipo for tipo, _ in Venda.TipoPagamento.choices]
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (valores já ordenados)."""
+    if not valores:
+        return None
+    posicao = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[posicao]
+
+
+def resumir_latencias(segundos):
+    ordenados = sorted(valor * 1000 for valor in segundos)
+    return {
+        'min': round(ordenados[0], 3),
+        'p50': round(percentil(ordenados, 50), 3),
+        'p90': round(percentil(ordenados, 90), 3),
+        'p95': round(percentil(ordenados, 95), 3),
+        'p99': round(percentil(ordenados, 99), 3),
+        'max': round(ordenados[-1], 3),
+        'media': round(sum(ordenados) / len(ordenados), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Mede a API, a classificação e o popular_banco num banco de teste com dados sintéticos '
+            '(latência em percentis, número de consultas e pico de memória) e grava o resultado em JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pessoas', type=int, default=10000,
+                            help='Pessoas sintéticas criadas (padrão: 10000; metade vira cliente).')
+        parser.add_argument('--vendas', type=int,
+                            help='Vendas sintéticas criadas (padrão: o mesmo número de pessoas).')
+        parser.add_argument('--repeticoes', type=int, default=30,
+                            help='Vezes que cada cenário é medido (padrão: 30).')
+        parser.add_argument('--cenarios', nargs='+', metavar='NOME',
+                            help='Roda só estes cenários (veja a lista com --listar).')
+        parser.add_argument('--listar', action='store_true', help='Lista os cenários e termina.')
+        parser.add_argument('--sem-popular-banco', action='store_true',
+                            help='Não mede o comando popular_banco (que lê os CSVs da raiz do projeto).')
+        parser.add_argument('--manter-banco', action='store_true',
+                            help='Reaproveita o banco de teste (e os dados) da execução anterior.')
+        parser.add_argument('--semente', type=int, default=42, help='Semente dos dados sintéticos.')
+        parser.add_argument('--saida', metavar='ARQUIVO_JSON', help='Grava o resultado neste arquivo.')
+        parser.add_argument('--comparar', metavar='ARQUIVO_JSON',
+                            help='Mostra a variação do p50 e das consultas em relação a um resultado anterior.')
+
+    def handle(self, *args, **options):
+        cenarios = self.cenarios()
+        if options['listar']:
+            for nome, (descricao, *_) in cenarios.items():
+                self.stdout.write(f'{nome}: {descricao}')
+            return
+        if options['pessoas'] <= 0 or options['repeticoes'] <= 0:
+            raise CommandError('--pessoas e --repeticoes devem ser inteiros positivos.')
+        escolhidos = options['cenarios'] or list(cenarios)
+        desconhecidos = set(escolhidos) - set(cenarios)
+        if desconhecidos:
+            raise CommandError(f'Cenários desconhecidos: {", ".join(sorted(desconhecidos))}.')
+
+        self.repeticoes = options['repeticoes']
+        self.aleatorio = random.Random(options['semente'])
+        num_vendas = options['vendas'] if options['vendas'] is not None else options['pessoas']
+
+        # Tudo roda num banco de teste separado (test_<nome> no MySQL, memória
+        # no SQLite), para não tocar nos dados de verdade.
+        setup_test_environment()
+        nome_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['manter_banco'], serialize=False)
+        try:
+            resultado = {'ambiente': self.ambiente(options['pessoas'], num_vendas), 'cenarios': {}}
+            with override_settings(CLASSIFICACAO_AUTOMATICA=False):
+                resultado['carga'] = self.carregar_dados(options['pessoas'], num_vendas)
+            for nome in escolhidos:
+                descricao, executar, preparar, repeticoes = cenarios[nome]
+                self.stdout.write(f'{nome}: {descricao}...')
+                resultado['cenarios'][nome] = self.medir(executar, preparar, repeticoes or self.repeticoes)
+                medidas = resultado['cenarios'][nome]
+                self.stdout.write(
+                    f'   p50 {medidas["latencia_ms"]["p50"]}ms, p95 {medidas["latencia_ms"]["p95"]}ms, '
+                    f'{medidas["consultas"]["max"]} consultas, pico de {medidas["pico_memoria_kb"]} KB'
+                )
+            if not options['sem_popular_banco']:
+                resultado['popular_banco'] = self.medir_popular_banco()
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options['manter_banco'])
+            teardown_test_environment()
+
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto)
+            self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["saida"]}.'))
+        else:
+            self.stdout.write(texto)
+        if options['comparar']:
+            self.comparar(resultado, options['comparar'])
+
+    # --- Cenários ---------------------------------------------------------
+
+    def cenarios(self):
+        """{nome: (descrição, executar, preparar antes de cada repetição, repetições fixas ou None)}."""
+        return {
+            'clientes_lista': ('GET /api/clientes/ (primeira página)',
+                               lambda: self.get('/api/clientes/?page_size=25'), None, None),
+            'clientes_lista_pagina_funda': ('GET /api/clientes/ (página a partir do meio da lista)',
+                                            lambda: self.get(self.cursor_do_meio), None, None),
+            'clientes_busca': ('GET /api/clientes/?search= (prefixo de nome comum)',
+                               lambda: self.get('/api/clientes/?search=mar&page_size=25'), None, None),
+            'clientes_ranking': ('GET /api/clientes/?ordering=-prob_alto&min_prob=0.7',
+                                 lambda: self.get('/api/clientes/?ordering=-prob_alto&min_prob=0.7&page_size=25'),
+                                 None, None),
+            'vendas_lista': ('GET /api/vendas/ (primeira página)',
+                             lambda: self.get('/api/vendas/?page_size=25'), None, None),
+            'dashboard_stats': ('GET /api/dashboard/stats/ (cache quente)',
+                                lambda: self.get('/api/dashboard/stats/'), None, None),
+            'dashboard_stats_sem_cache': ('GET /api/dashboard/stats/ (cache limpo a cada pedido)',
+                                          lambda: self.get('/api/dashboard/stats/'), cache.clear, None),
+            'classificar': ('POST /api/clientes/<id>/classificar/ (um cliente)',
+                            self.classificar_um, None, None),
+            'classificar_lote': ('POST /api/clientes/classificar-lote/ (todos os clientes, cache de previsões vazio)',
+                                 lambda: self.post('/api/clientes/classificar-lote/', {}), cache_previsoes.limpar, 3),
+            'inferencia': ('prever() em todos os clientes, sem HTTP nem gravação (cache de previsões vazio)',
+                           self.inferencia, cache_previsoes.limpar, 5),
+        }
+
+    def get(self, url):
+        resposta = self.http.get(url)
+        if resposta.status_code >= 400:
+            raise CommandError(f'GET {url} respondeu {resposta.status_code}: {resposta.content[:300]!r}')
+        return resposta
+
+    def post(self, url, dados):
+        resposta = self.http.post(url, dados, format='json')
+        if resposta.status_code >= 400:
+            raise CommandError(f'POST {url} respondeu {resposta.status_code}: {resposta.content[:300]!r}')
+        return resposta
+
+    def classificar_um(self):
+        self.proximo_cliente = (self.proximo_cliente + 1) % len(self.ids_amostra)
+        return self.post(f'/api/clientes/{self.ids_amostra[self.proximo_cliente]}/classificar/', {})
+
+    def inferencia(self):
+        return prever(registro.obter(), list(Cliente.objects.values_list(*CAMPOS_ENTRADA)))
+
+    def medir(self, executar, preparar, repeticoes):
+        """
+        Mede `repeticoes` execuções (depois de uma de aquecimento). A memória
+        é medida numa execução a mais, com o tracemalloc ligado só nela, para
+        não atrapalhar as medidas de tempo.
+        """
+        if preparar:
+            preparar()
+        executar()
+        latencias, consultas = [], []
+        for _ in range(repeticoes):
+            if preparar:
+                preparar()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                executar()
+                latencias.append(time.perf_counter() - inicio)
+            consultas.append(len(capturadas))
+
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        try:
+            executar()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'repeticoes': repeticoes,
+            'latencia_ms': resumir_latencias(latencias),
+            'consultas': {'min': min(consultas), 'max': max(consultas)},
+            'pico_memoria_kb': round(pico / 1024, 1),
+        }
+
+    def medir_popular_banco(self):
+        """
+        Roda o popular_banco (com os CSVs da raiz do projeto) sobre o banco de
+        teste e devolve o tempo de cada etapa, o total e o pico de memória.
+        """
+        self.stdout.write('popular_banco: carga completa dos CSVs...')
+        comando = PopularBanco()
+        diretorio_atual = os.getcwd()
+        os.chdir(settings.BASE_DIR)
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                call_command(comando, stdout=StringIO())
+                total = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            os.chdir(diretorio_atual)
+        self.stdout.write(f'   {total:.2f}s')
+        return {
+            'etapas_s': {titulo: round(segundos, 3) for titulo, segundos in comando.tempos_etapas.items()},
+            'total_s': round(total, 3),
+            'consultas': len(capturadas),
+            'pico_memoria_kb': round(pico / 1024, 1),
+            'observacao': 'tempos medidos com o tracemalloc ligado (mais lentos que numa carga normal)',
+        }
+
+    # --- Dados sintéticos -------------------------------------------------
+
+    def carregar_dados(self, num_pessoas, num_vendas):
+        """Cria os dados sintéticos (se o banco estiver vazio) e prepara o que os cenários usam."""
+        inicio = time.perf_counter()
+        if Pessoa.objects.exists():
+            self.stdout.write('Banco de teste já tem dados; a carga foi pulada.')
+        else:
+            self.stdout.write(f'Criando {num_pessoas} pessoas e {num_vendas} vendas sintéticas...')
+            self.criar_dados(num_pessoas, num_vendas)
+        tempo = time.perf_counter() - inicio
+
+        self.http = APIClient()
+        clientes = Cliente.objects.order_by('pk').values_list('pk', flat=True)
+        total_clientes = clientes.count()
+        if not total_clientes:
+            raise CommandError('Nenhum cliente no banco de teste.')
+        self.ids_amostra = list(clientes[:1000])
+        self.proximo_cliente = 0
+        # Cursor de uma página no meio da lista, para medir se a página 200
+        # custa o mesmo que a primeira.
+        nome, pk = (Cliente.objects.order_by(*ClientePaginacao.ordering)
+                    .values_list(*ClientePaginacao.ordering)[total_clientes // 2])
+        paginacao = ClientePaginacao()
+        paginacao.base_url = 'http://testserver/api/clientes/?page_size=25'
+        self.cursor_do_meio = paginacao.encode_cursor(Cursor(offset=0, reverse=False, position=(nome, str(pk))))
+        # O ranking por probabilidade precisa dos clientes já classificados.
+        call_command('classificar_clientes', stdout=StringIO())
+        cache.clear()
+        return {
+            'pessoas': Pessoa.objects.count(),
+            'clientes': total_clientes,
+            'vendas': Venda.objects.count(),
+            'tempo_s': round(tempo, 3),
+        }
+
+    def criar_dados(self, num_pessoas, num_vendas):
+        aleatorio = self.aleatorio
+        Segmento.objects.bulk_create(Segmento(nome_segmento=nome) for nome in SEGMENTOS)
+        segmentos = list(Segmento.objects.order_by('pk'))
+        Veiculo.objects.bulk_create(
+            Veiculo(modelo=f'MODELO {i:03d}', segmento=segmentos[i % len(segmentos)], ano=2020 + i % 5)
+            for i in range(60)
+        )
+        veiculos = list(Veiculo.objects.values_list('pk', flat=True))
+
+        num_vendedores = 20
+        for inicio in range(0, num_pessoas + num_vendedores, TAMANHO_LOTE):
+            fim = min(inicio + TAMANHO_LOTE, num_pessoas + num_vendedores)
+            Pessoa.objects.bulk_create([
+                Pessoa(
+                    nome=f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}',
+                    cpf_cnpj=f'{i:011d}',
+                    endereco=aleatorio.choice(MUNICIPIOS),
+                    idade=aleatorio.randint(18, 80),
+                    lead_score=aleatorio.randint(1, 10),
+                )
+                for i in range(inicio, fim)
+            ], batch_size=TAMANHO_LOTE)
+        # O bulk_create do MySQL não devolve os ids, então eles são lidos de novo.
+        pessoas = list(Pessoa.objects.order_by('pk').values_list('pk', flat=True))
+        vendedores, pessoas = pessoas[:num_vendedores], pessoas[num_vendedores:]
+        Usuario.objects.bulk_create(
+            Usuario(pessoa_id=pk, senha_hash='x', perfil=Usuario.Perfil.VENDEDOR) for pk in vendedores
+        )
+        clientes = pessoas[::2]
+        for inicio in range(0, len(clientes), TAMANHO_LOTE):
+            Cliente.objects.bulk_create(
+                [Cliente(pessoa_id=pk) for pk in clientes[inicio:inicio + TAMANHO_LOTE]], batch_size=TAMANHO_LOTE,
+            )
+
+        agora = timezone.now()
+        for inicio in range(0, num_vendas, TAMANHO_LOTE):
+            Venda.objects.bulk_create([
+                Venda(
+                    cliente_id=aleatorio.choice(clientes),
+                    veiculo_id=aleatorio.choice(veiculos),
+                    vendedor_id=aleatorio.choice(vendedores),
+                    data_venda=agora - timedelta(minutes=aleatorio.randint(0, 3 * 365 * 24 * 60)),
+                    valor_final=Decimal(aleatorio.randint(800000, 3500000)) / 100,
+                    tipo_pagamento=aleatorio.choice(TIPOS_PAGAMENTO),
+                )
+                for _ in range(inicio, min(inicio + TAMANHO_LOTE, num_vendas))
+            ], batch_size=TAMANHO_LOTE)
+
+        # bulk_create não dispara sinais: resumo e índices de busca são montados aqui.
+        reconstruir_resumo()
+        recalcular_resumo_compras()
+        indice_pessoas.reindexar()
+        indice_veiculos.reindexar()
+
+    # --- Relatório --------------------------------------------------------
+
+    def ambiente(self, num_pessoas, num_vendas):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'pessoas_pedidas': num_pessoas,
+            'vendas_pedidas': num_vendas,
+            'repeticoes': self.repeticoes,
+        }
+
+    def comparar(self, resultado, caminho_anterior):
+        with open(caminho_anterior, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        self.stdout.write(f'Comparação com {caminho_anterior} (commit {anterior.get("ambiente", {}).get("commit")}):')
+        for nome, medidas in resultado['cenarios'].items():
+            antes = anterior.get('cenarios', {}).get(nome)
+            if not antes:
+                continue
+            p50, p50_antes = medidas['latencia_ms']['p50'], antes['latencia_ms']['p50']
+            variacao = (p50 - p50_antes) / p50_antes * 100 if p50_antes else 0
+            linha = (f'   {nome}: p50 {p50_antes}ms -> {p50}ms ({variacao:+.1f}%), '
+                     f'consultas {antes["consultas"]["max"]} -> {medidas["consultas"]["max"]}')
+            estilo = self.style.WARNING if variacao > 20 or medidas['consultas']['max'] > antes['consultas']['max'] else str
+            self.stdout.write(estilo(linha))
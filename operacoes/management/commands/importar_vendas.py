@@ -0,0 +1,35 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from operacoes.importacao import importar_vendas, TAMANHO_LOTE_PADRAO
+
+
+class Command(BaseCommand):
+    help = 'Anexa as vendas de uma planilha nova ao banco, sem apagar as que já existem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='CSV no mesmo formato de vendas_processado.csv.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                            help=f'Quantidade de vendas por INSERT em lote (padrão: {TAMANHO_LOTE_PADRAO}).')
+        parser.add_argument('--rejeitados', metavar='ARQUIVO_CSV',
+                            help='Grava as vendas que não puderam ser importadas, com o motivo, neste CSV.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+        try:
+            df_vendas = pd.read_csv(options['arquivo'], encoding='utf-8-sig')
+        except FileNotFoundError:
+            raise CommandError(f'Arquivo {options["arquivo"]} não encontrado.')
+
+        resultado = importar_vendas(df_vendas, tamanho_lote=options['tamanho_lote'])
+
+        self.stdout.write(self.style.SUCCESS(f'{resultado.inseridas} vendas importadas.'))
+        if resultado.atualizadas:
+            self.stdout.write(f'{resultado.atualizadas} vendas já importadas foram atualizadas.')
+        if resultado.ja_importadas:
+            self.stdout.write(f'{resultado.ja_importadas} vendas já estavam no banco e foram puladas.')
+        for motivo, quantidade in resultado.motivos().items():
+            self.stdout.write(self.style.WARNING(f'{quantidade} vendas rejeitadas: {motivo}.'))
+        if options['rejeitados'] and not resultado.rejeitadas.empty:
+            resultado.rejeitadas.to_csv(options['rejeitados'], index=False, encoding='utf-8-sig')
+            self.stdout.write(f'Relatório de rejeitadas gravado em {options["rejeitados"]}.')
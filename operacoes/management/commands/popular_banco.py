@@ -1,103 +1,252 @@
+import json
 import os
+import time
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
-from django.core.management.base import BaseCommand
-from django.db import transaction, IntegrityError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from produtos.models import Segmento, Veiculo
 from usuarios.models import Pessoa, Cliente, Usuario
-from operacoes.models import Venda
+from usuarios.signals import avisar_exclusao
+from operacoes.models import Venda, VendaResumoDiario
+from operacoes.importacao import em_lotes, importar_vendas, sincronizar
 import re
 
+TAMANHO_LOTE_PADRAO = 1000
+
+# Campos de Pessoa atualizados quando o CPF já existe no banco. O lead_score fica
+# de fora: ele é sorteado a cada carga e a sincronização não deve sobrescrever
+# o valor já gravado (nem disparar atualização de todas as linhas toda noite).
+CAMPOS_ATUALIZAVEIS_PESSOA = ['nome', 'email', 'telefone', 'endereco', 'idade']
+
 def limpar_cpf(cpf_cnpj):
     return re.sub(r'[^0-9]', '', str(cpf_cnpj))
 
+def limpar_cpfs(serie):
+    """Versão vetorizada do limpar_cpf, para uma coluna inteira do DataFrame."""
+    return serie.astype(str).str.replace(r'[^0-9]', '', regex=True)
+
 class Command(BaseCommand):
     help = 'Limpa e popula o banco de dados com dados reais e sintéticos'
 
-    # Removi o @transaction.atomic daqui para controlar as transações manualmente
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                            help=f'Quantidade de linhas por INSERT em lote (padrão: {TAMANHO_LOTE_PADRAO}).')
+        parser.add_argument('--rejeitados', metavar='ARQUIVO_CSV',
+                            help='Grava as vendas que não puderam ser importadas, com o motivo, neste CSV.')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Não limpa o banco: insere o que é novo, atualiza o que mudou e mantém o resto '
+                                 '(inclusive classificação e situação dos clientes).')
+        parser.add_argument('--resumo', metavar='ARQUIVO_JSON',
+                            help='Grava as contagens de inseridos/atualizados/inalterados/ignorados por tabela neste JSON.')
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.WARNING('Limpando o banco de dados...'))
-        # A limpeza precisa ser feita em uma única transação
-        with transaction.atomic():
-            Venda.objects.all().delete()
-            Cliente.objects.all().delete()
-            Usuario.objects.all().delete()
-            Pessoa.objects.all().delete()
-            Veiculo.objects.all().delete()
-            Segmento.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS('Banco de dados limpo.'))
-        
+        # Conferido antes da limpeza: com 0 o em_lotes nunca avança, e o banco já estaria vazio.
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+        self.tamanho_lote = options['tamanho_lote']
+        self.caminho_rejeitados = options['rejeitados']
+        self.resumo = {}
+        # Segundos gastos em cada etapa (lidos também pelo comando benchmark).
+        self.tempos_etapas = {}
+        inicio = time.perf_counter()
+
+        if options['incremental']:
+            self.stdout.write(self.style.WARNING('Modo incremental: o banco não será limpo.'))
+        else:
+            with self.etapa('Limpando o banco de dados'):
+                # A limpeza precisa ser feita em uma única transação
+                with transaction.atomic():
+                    VendaResumoDiario.objects.all().delete()
+                    Venda.objects.all().delete()
+                    Cliente.objects.all().delete()
+                    Usuario.objects.all().delete()
+                    Pessoa.objects.all().delete()
+                    Veiculo.objects.all().delete()
+                    Segmento.objects.all().delete()
+                    # Sem post_delete em Pessoa/Cliente: o dashboard fica sabendo por aqui.
+                    avisar_exclusao(Pessoa)
+
         self.stdout.write(self.style.SUCCESS('Iniciando o processo de povoamento...'))
-        self.importar_segmentos_e_veiculos()
-        
-        clientes_reais_df = self.importar_pessoas_reais()
-        self.gerar_leads_sinteticos(clientes_reais_df)
-        self.importar_vendas()
+        with self.etapa('1/4 - Importando Segmentos e Veículos'):
+            self.importar_segmentos_e_veiculos()
 
-        self.stdout.write(self.style.SUCCESS('Banco de dados povoado com sucesso!'))
+        with self.etapa('2/4 - Importando Pessoas e Clientes Reais'):
+            clientes_reais_df = self.importar_pessoas_reais()
+        with self.etapa('3/4 - Gerando Leads Sintéticos (Não-Compradores)'):
+            self.gerar_leads_sinteticos(clientes_reais_df)
+        with self.etapa('4/4 - Importando Vendas'):
+            self.importar_vendas()
+
+        self.escrever_resumo(options['resumo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Banco de dados povoado com sucesso em {time.perf_counter() - inicio:.2f}s!'
+        ))
+
+    def escrever_resumo(self, caminho_resumo):
+        self.stdout.write('Resumo da sincronização:')
+        for tabela, contagens in self.resumo.items():
+            detalhes = ', '.join(f'{quantidade} {tipo}' for tipo, quantidade in contagens.items())
+            self.stdout.write(f'   {tabela}: {detalhes}')
+        if caminho_resumo:
+            with open(caminho_resumo, 'w', encoding='utf-8') as arquivo:
+                json.dump(self.resumo, arquivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Resumo gravado em {caminho_resumo}.')
+
+    @contextmanager
+    def etapa(self, titulo):
+        """Escreve o título da etapa e, ao final, quanto tempo ela levou."""
+        self.stdout.write(f'{titulo}...')
+        inicio = time.perf_counter()
+        yield
+        self.tempos_etapas[titulo] = time.perf_counter() - inicio
+        self.stdout.write(f'   ({self.tempos_etapas[titulo]:.2f}s)')
+
+    def mapa_de_ids(self, modelo, campo, valores):
+        """
+        Monta um dicionário {valor do campo: id} para os valores informados,
+        com uma consulta por lote em vez de uma por linha.
+        """
+        mapa = {}
+        for lote in em_lotes(set(valores), self.tamanho_lote):
+            mapa.update(modelo.objects.filter(**{f'{campo}__in': lote}).values_list(campo, 'pk'))
+        return mapa
 
     def importar_segmentos_e_veiculos(self):
-        self.stdout.write('1/4 - Importando Segmentos e Veículos...')
         caminho_csv = os.path.join(os.getcwd(), 'modelos_segmentados.csv')
         df = pd.read_csv(caminho_csv, encoding='utf-8-sig')
-        for _, row in df.iterrows():
-            Segmento.objects.get_or_create(nome_segmento=row['Segmento'])
-            Veiculo.objects.get_or_create(modelo=row['Modelo'], defaults={'segmento': Segmento.objects.get(nome_segmento=row['Segmento']), 'marca': 'Honda'})
+
+        nomes_segmentos = df['Segmento'].dropna().unique()
+        self.resumo['Segmento'] = sincronizar(
+            Segmento, 'nome_segmento', {nome: {} for nome in nomes_segmentos}, tamanho_lote=self.tamanho_lote,
+        ).como_dict()
+        segmentos = self.mapa_de_ids(Segmento, 'nome_segmento', nomes_segmentos)
+
+        # Como no get_or_create antigo, vale a primeira linha de cada modelo.
+        # Linhas sem modelo viravam um veículo chamado "nan"; agora são ignoradas.
+        df = df.dropna(subset=['Modelo']).drop_duplicates(subset=['Modelo'])
+        self.resumo['Veiculo'] = sincronizar(
+            Veiculo, 'modelo',
+            {modelo: {'segmento_id': segmentos.get(segmento), 'marca': 'Honda'}
+             for modelo, segmento in zip(df['Modelo'], df['Segmento'])},
+            campos_atualizaveis=['segmento_id'], tamanho_lote=self.tamanho_lote,
+        ).como_dict()
         self.stdout.write(self.style.SUCCESS(f'{Veiculo.objects.count()} veículos importados.'))
 
+    def preparar_pessoas(self, df, clientes_reais_df):
+        """
+        Limpa e deduplica as pessoas do CSV de uma vez só, com operações vetorizadas.
+        Retorna o DataFrame pronto para virar objetos Pessoa.
+        """
+        df = df.copy()
+        df['cpf_limpo'] = limpar_cpfs(df['CPF'])
+        validos = (df['cpf_limpo'] != '') & df['Nome'].notna() & (df['Nome'].astype(str).str.lower() != 'nan')
+        df = df[validos]
+
+        # O lead_score dos clientes reais foi sorteado em clientes_reais_df;
+        # quem não está lá (usuários, por exemplo) fica com o padrão 5.
+        scores = (
+            clientes_reais_df.assign(cpf_limpo=limpar_cpfs(clientes_reais_df['CPF']))
+            .drop_duplicates(subset=['cpf_limpo'])
+            .set_index('cpf_limpo')['lead_score']
+        )
+        df['lead_score'] = df['cpf_limpo'].map(scores).fillna(5).astype(int)
+
+        df['Email'] = df['Email'].astype(object).where(df['Email'].notna(), None)
+        df['Telefone'] = df['Telefone'].astype(object).where(df['Telefone'].notna(), None)
+        df['Municipio'] = df['Municipio'].fillna('Desconhecido')
+        df['Idade'] = df['Idade'].astype(object).where(df['Idade'].notna(), None)
+
+        # CPF e e-mail são únicos no banco: fica a primeira ocorrência de cada um,
+        # como acontecia quando o IntegrityError pulava as repetidas.
+        total = len(df)
+        df = df.drop_duplicates(subset=['cpf_limpo'])
+        df = df[df['Email'].isna() | ~df['Email'].duplicated()]
+        repetidas = total - len(df)
+        if repetidas:
+            self.stdout.write(self.style.WARNING(f'{repetidas} pessoas com CPF ou Email repetido foram puladas.'))
+        return df
+
+    def remover_conflitos_de_email(self, registros):
+        """
+        Tira da carga as pessoas cujo e-mail já pertence a outro CPF no banco
+        (por exemplo, um cliente cadastrado pela API), em vez de deixar o
+        UPDATE/INSERT falhar por causa do índice único.
+        """
+        cpf_por_email = {}
+        emails = [valores['email'] for valores in registros.values() if valores['email']]
+        for lote in em_lotes(set(emails), self.tamanho_lote):
+            cpf_por_email.update(Pessoa.objects.filter(email__in=lote).values_list('email', 'cpf_cnpj'))
+        conflitos = [
+            cpf for cpf, valores in registros.items()
+            if cpf_por_email.get(valores['email'], cpf) != cpf
+        ]
+        for cpf in conflitos:
+            del registros[cpf]
+        if conflitos:
+            self.stdout.write(self.style.WARNING(f'{len(conflitos)} pessoas com e-mail já usado por outro CPF foram puladas.'))
+
     def importar_pessoas_reais(self):
-        self.stdout.write('2/4 - Importando Pessoas e Clientes Reais...')
         caminho_csv = os.path.join(os.getcwd(), 'tabela_pessoa_para_banco.csv')
         df = pd.read_csv(caminho_csv, encoding='utf-8-sig')
 
         clientes_reais_df = df[df['Tipo'] == 'Cliente'].copy()
         clientes_reais_df['Municipio'] = clientes_reais_df['Municipio'].fillna('Desconhecido').replace('', 'Desconhecido')
         clientes_reais_df.dropna(subset=['Idade'], inplace=True)
-        
+
         np.random.seed(42)
         media_compradores = 7.5
         desvio_compradores = 1.5
         scores_reais = np.random.normal(loc=media_compradores, scale=desvio_compradores, size=len(clientes_reais_df))
         clientes_reais_df['lead_score'] = np.clip(scores_reais, 1, 10).astype(int)
 
-        for _, row in df.iterrows():
-            # Cada tentativa de criar uma pessoa agora está em sua própria "caixa de transação".
-            try:
-                with transaction.atomic(): # Inicia a "caixa"
-                    cpf_limpo = limpar_cpf(row['CPF'])
-                    if not cpf_limpo or pd.isna(row['Nome']) or row['Nome'].lower() == 'nan':
-                        continue
-                    
-                    score_row = clientes_reais_df.loc[clientes_reais_df['CPF'].apply(limpar_cpf) == cpf_limpo, 'lead_score']
-                    score = score_row.iloc[0] if not score_row.empty else 5
-
-                    pessoa = Pessoa.objects.create(
-                        cpf_cnpj=cpf_limpo, nome=row['Nome'], email=row['Email'], telefone=row['Telefone'],
-                        endereco=row['Municipio'] if pd.notna(row['Municipio']) else 'Desconhecido',
-                        idade=int(row['Idade']) if pd.notna(row['Idade']) else None,
-                        lead_score=score
-                    )
-                    
-                    if row['Tipo'] == 'Cliente':
-                        Cliente.objects.create(pessoa=pessoa)
-                    elif row['Tipo'] == 'Usuario':
-                        Usuario.objects.create(pessoa=pessoa, senha_hash='senha_padrao', perfil='VENDEDOR')
-            
-            except IntegrityError:
-                # Se der erro aqui dentro, apenas esta "caixa" é descartada.
-                # O script pode continuar para a próxima pessoa com uma "caixa" limpa.
-                self.stdout.write(self.style.WARNING(f"Pessoa com CPF {limpar_cpf(row['CPF'])} ou Email {row['Email']} já existe. Pulando."))
-                continue
-        
+        pessoas_df = self.preparar_pessoas(df, clientes_reais_df)
+
+        registros = {
+            cpf: {
+                'nome': nome, 'email': email, 'telefone': telefone, 'endereco': municipio,
+                'idade': int(idade) if idade is not None else None, 'lead_score': score,
+            }
+            for cpf, nome, email, telefone, municipio, idade, score in zip(
+                pessoas_df['cpf_limpo'], pessoas_df['Nome'], pessoas_df['Email'], pessoas_df['Telefone'],
+                pessoas_df['Municipio'], pessoas_df['Idade'], pessoas_df['lead_score'],
+            )
+        }
+        self.remover_conflitos_de_email(registros)
+
+        with transaction.atomic():
+            self.resumo['Pessoa'] = sincronizar(
+                Pessoa, 'cpf_cnpj', registros,
+                campos_atualizaveis=CAMPOS_ATUALIZAVEIS_PESSOA, tamanho_lote=self.tamanho_lote,
+            ).como_dict()
+
+            # O MySQL não devolve os IDs do bulk_create, então buscamos pelo CPF.
+            # Clientes e usuários já existentes não são tocados, para não perder
+            # classificação e situação.
+            ids_por_cpf = self.mapa_de_ids(Pessoa, 'cpf_cnpj', registros)
+            cpfs_clientes = pessoas_df.loc[pessoas_df['Tipo'] == 'Cliente', 'cpf_limpo']
+            cpfs_usuarios = pessoas_df.loc[pessoas_df['Tipo'] == 'Usuario', 'cpf_limpo']
+            self.resumo['Cliente'] = sincronizar(
+                Cliente, 'pessoa_id',
+                {ids_por_cpf[cpf]: {} for cpf in cpfs_clientes if cpf in ids_por_cpf},
+                tamanho_lote=self.tamanho_lote,
+            ).como_dict()
+            self.resumo['Usuario'] = sincronizar(
+                Usuario, 'pessoa_id',
+                {ids_por_cpf[cpf]: {'senha_hash': 'senha_padrao', 'perfil': 'VENDEDOR'}
+                 for cpf in cpfs_usuarios if cpf in ids_por_cpf},
+                tamanho_lote=self.tamanho_lote,
+            ).como_dict()
+
         self.stdout.write(self.style.SUCCESS(f'{Pessoa.objects.count()} pessoas reais importadas.'))
         return clientes_reais_df
 
     def gerar_leads_sinteticos(self, clientes_reais_df):
-        self.stdout.write('3/4 - Gerando Leads Sintéticos (Não-Compradores)...')
         if clientes_reais_df.empty:
             self.stdout.write(self.style.WARNING("Nenhum cliente real encontrado para basear a geração de leads sintéticos. Pulando esta etapa."))
             return
-        
+
         num_falsos = len(clientes_reais_df)
         np.random.seed(42)
         idades_falsas = np.random.normal(loc=clientes_reais_df['Idade'].mean(), scale=clientes_reais_df['Idade'].std(), size=num_falsos).astype(int)
@@ -107,28 +256,28 @@ class Command(BaseCommand):
         desvio_nao_compradores = 1.5
         scores_falsos = np.random.normal(loc=media_nao_compradores, scale=desvio_nao_compradores, size=num_falsos)
         scores_falsos = np.clip(scores_falsos, 1, 10).astype(int)
-        novos_leads = []
+        novos_leads = {}
         for i in range(num_falsos):
-            novos_leads.append(Pessoa(
-                nome=f"Lead Sintético {i}", cpf_cnpj=f"000000000{i:02}",
-                endereco=municipios_falsos[i], idade=idades_falsas[i], lead_score=scores_falsos[i]
-            ))
-        Pessoa.objects.bulk_create(novos_leads)
-        self.stdout.write(self.style.SUCCESS(f'{len(novos_leads)} leads sintéticos criados.'))
+            novos_leads[f"000000000{i:02}"] = dict(
+                nome=f"Lead Sintético {i}",
+                endereco=municipios_falsos[i], idade=int(idades_falsas[i]), lead_score=int(scores_falsos[i])
+            )
+        # Leads sintéticos só são inseridos; os que já existem ficam como estão.
+        resumo = sincronizar(Pessoa, 'cpf_cnpj', novos_leads, tamanho_lote=self.tamanho_lote)
+        self.resumo['Pessoa (leads sintéticos)'] = resumo.como_dict()
+        self.stdout.write(self.style.SUCCESS(f'{resumo.inseridos} leads sintéticos criados.'))
 
     def importar_vendas(self):
-        self.stdout.write('4/4 - Importando Vendas...')
         caminho_csv = os.path.join(os.getcwd(), 'vendas_processado.csv')
         df_vendas = pd.read_csv(caminho_csv, encoding='utf-8-sig')
-        pessoa_sistema, _ = Pessoa.objects.get_or_create(cpf_cnpj='000SYSTEM000', defaults={'nome': 'Sistema / CNH'})
-        vendedor_sistema, _ = Usuario.objects.get_or_create(pessoa=pessoa_sistema, defaults={'senha_hash': 'sistema', 'perfil': 'SISTEMA'})
-        for _, row in df_vendas.iterrows():
-            cliente_obj = Cliente.objects.filter(pessoa__nome=row['Cliente']).first()
-            veiculo_obj = Veiculo.objects.filter(modelo=row['Veículo']).first()
-            vendedor_obj = Usuario.objects.filter(pessoa__nome=row['Vendedor']).first() or vendedor_sistema
-            if cliente_obj and veiculo_obj:
-                Venda.objects.create(
-                    cliente=cliente_obj, veiculo=veiculo_obj, vendedor=vendedor_obj,
-                    data_venda=row['Data'], valor_final=0, tipo_pagamento=row['Forma de venda']
-                )
-        self.stdout.write(self.style.SUCCESS(f'{Venda.objects.count()} vendas importadas.'))
+        resultado = importar_vendas(df_vendas, tamanho_lote=self.tamanho_lote)
+        self.resumo['Venda'] = resultado.como_dict()
+        self.stdout.write(self.style.SUCCESS(f'{resultado.inseridas} vendas importadas.'))
+        self.relatar_rejeitadas(resultado, self.caminho_rejeitados)
+
+    def relatar_rejeitadas(self, resultado, caminho_rejeitados):
+        for motivo, quantidade in resultado.motivos().items():
+            self.stdout.write(self.style.WARNING(f'{quantidade} vendas rejeitadas: {motivo}.'))
+        if caminho_rejeitados and not resultado.rejeitadas.empty:
+            resultado.rejeitadas.to_csv(caminho_rejeitados, index=False, encoding='utf-8-sig')
+            self.stdout.write(f'Relatório de rejeitadas gravado em {caminho_rejeitados}.')
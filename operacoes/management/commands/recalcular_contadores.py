@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from operacoes.atendimentos import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula, a partir dos atendimentos, a quantidade e a data do último atendimento de cada cliente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', nargs='+', type=int,
+                            help='Só estes clientes (ids). Sem a opção, recalcula todos.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = recalcular_contadores(options['clientes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores de {total} clientes recalculados em {time.perf_counter() - inicio:.2f}s.'
+        ))
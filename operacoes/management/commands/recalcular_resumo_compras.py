@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from operacoes.compras import TAMANHO_LOTE_PADRAO, recalcular_resumo_compras
+
+
+class Command(BaseCommand):
+    help = ('Refaz, a partir das vendas, o resumo de compras de cada cliente '
+            '(quantidade, última compra, valor total e segmento favorito)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', nargs='+', type=int,
+                            help='Só estes clientes (ids). Sem a opção, recalcula todos.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                            help=f'Clientes atualizados por UPDATE (padrão: {TAMANHO_LOTE_PADRAO}).')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+
+        inicio = time.perf_counter()
+        total = recalcular_resumo_compras(options['clientes'], tamanho_lote=options['tamanho_lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumo de compras de {total} clientes recalculado em {time.perf_counter() - inicio:.2f}s.'
+        ))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from operacoes.resumos import reconstruir_resumo
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o resumo diário de vendas, inteiro ou só para um intervalo de datas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Primeiro dia a recalcular (AAAA-MM-DD).')
+        parser.add_argument('--fim', help='Último dia a recalcular (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        datas = {}
+        for nome in ('inicio', 'fim'):
+            valor = options[nome]
+            try:
+                datas[nome] = parse_date(valor) if valor else None
+            except ValueError:
+                datas[nome] = None
+            if valor and datas[nome] is None:
+                raise CommandError(f'Data inválida em --{nome}. Use o formato AAAA-MM-DD.')
+
+        inicio = time.perf_counter()
+        linhas = reconstruir_resumo(datas['inicio'], datas['fim'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{linhas} linhas de resumo gravadas em {time.perf_counter() - inicio:.2f}s.'
+        ))
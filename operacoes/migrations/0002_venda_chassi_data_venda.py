@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacoes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='chassi',
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='venda',
+            name='data_venda',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
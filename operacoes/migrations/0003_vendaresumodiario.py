@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacoes', '0002_venda_chassi_data_venda'),
+        ('produtos', '0001_initial'),
+        ('usuarios', '0003_cliente_classificacao_cliente_situacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('tipo_pagamento', models.CharField(blank=True, max_length=50)),
+                ('qtd', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('segmento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtos.segmento')),
+                ('vendedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Vendas',
+                'verbose_name_plural': 'Resumos Diários de Vendas',
+                'indexes': [models.Index(fields=['dia'], name='operacoes_v_dia_731175_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacoes', '0003_vendaresumodiario'),
+        ('produtos', '0002_veiculo_indice_modelo'),
+        ('usuarios', '0004_cliente_pessoa_indices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['-data_venda', 'id'], name='operacoes_v_data_ve_9f0488_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['cliente', '-data_venda'], name='operacoes_v_cliente_14d690_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['vendedor', '-data_venda'], name='operacoes_v_vendedo_9bfe57_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:50
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def preencher_contadores(apps, schema_editor):
+    # Contadores dos clientes que já têm atendimentos (ver operacoes/atendimentos.py).
+    Cliente = apps.get_model('usuarios', 'Cliente')
+    Atendimento = apps.get_model('operacoes', 'Atendimento')
+    do_cliente = Atendimento.objects.filter(cliente=OuterRef('pk')).order_by().values('cliente')
+    Cliente.objects.filter(pk__in=Atendimento.objects.values('cliente')).update(
+        qtd_atendimentos=Subquery(do_cliente.annotate(qtd=Count('id')).values('qtd')),
+        ultimo_atendimento_em=Subquery(do_cliente.annotate(ultimo=Max('data_atendimento')).values('ultimo')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacoes', '0004_venda_indices'),
+        ('usuarios', '0009_cliente_contadores_atendimento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='atendimento',
+            name='data_atendimento',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='atendimento',
+            index=models.Index(fields=['cliente', '-data_atendimento', '-id'], name='operacoes_at_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='atendimento',
+            index=models.Index(fields=['-data_atendimento', '-id'], name='operacoes_at_data_idx'),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
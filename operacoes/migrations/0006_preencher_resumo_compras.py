@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_resumo(apps, schema_editor):
+    # Resumo de compras dos clientes que já têm vendas (ver operacoes/compras.py).
+    Cliente = apps.get_model('usuarios', 'Cliente')
+    Venda = apps.get_model('operacoes', 'Venda')
+    vendas = Venda.objects.filter(cliente=OuterRef('pk')).order_by()
+    por_cliente = vendas.values('cliente')
+    por_segmento = (
+        vendas.filter(veiculo__segmento__isnull=False).values('veiculo__segmento')
+        .annotate(qtd=Count('id'), ultima=Max('data_venda')).order_by('-qtd', '-ultima', 'veiculo__segmento')
+    )
+    Cliente.objects.filter(pk__in=Venda.objects.values('cliente')).update(
+        qtd_compras=Subquery(por_cliente.annotate(qtd=Count('id')).values('qtd')),
+        ultima_compra_em=Subquery(por_cliente.annotate(ultima=Max('data_venda')).values('ultima')),
+        valor_total_compras=Coalesce(
+            Subquery(por_cliente.annotate(total=Sum('valor_final')).values('total')),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        segmento_favorito=Subquery(por_segmento.values('veiculo__segmento')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operacoes', '0005_atendimento_timeline'),
+        ('usuarios', '0010_cliente_resumo_compras'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 # operacoes/models.py
 
 from django.db import models
+from django.utils import timezone
 
 class Venda(models.Model):
     class TipoPagamento(models.TextChoices):
@@ -11,19 +12,65 @@ class Venda(models.Model):
     cliente = models.ForeignKey('usuarios.Cliente', on_delete=models.PROTECT, related_name='vendas')
     veiculo = models.ForeignKey('produtos.Veiculo', on_delete=models.PROTECT, related_name='vendas')
     vendedor = models.ForeignKey('usuarios.Usuario', on_delete=models.PROTECT, related_name='vendas_realizadas')
-    data_venda = models.DateTimeField(auto_now_add=True)
+    # Com auto_now_add o Django ignorava a data vinda da planilha de vendas;
+    # o default mantém o "agora" para vendas novas e aceita datas históricas.
+    data_venda = models.DateTimeField(default=timezone.now)
+    # Chassi da moto vendida, usado para não importar a mesma venda duas vezes.
+    chassi = models.CharField(max_length=50, blank=True, null=True, db_index=True)
     valor_final = models.DecimalField(max_digits=10, decimal_places=2)
     tipo_pagamento = models.CharField(max_length=50, choices=TipoPagamento.choices, blank=True)
 
+    class Meta:
+        indexes = [
+            # Ordem da listagem (mais recentes primeiro) e paginação por cursor.
+            models.Index(fields=['-data_venda', 'id']),
+            # Vendas de um cliente ou de um vendedor, já na ordem da listagem.
+            models.Index(fields=['cliente', '-data_venda']),
+            models.Index(fields=['vendedor', '-data_venda']),
+        ]
+
     def __str__(self):
         return f"Venda #{self.id} - {self.cliente.pessoa.nome}"
 
 class Atendimento(models.Model):
     cliente = models.ForeignKey('usuarios.Cliente', on_delete=models.CASCADE, related_name='atendimentos')
     atendente = models.ForeignKey('usuarios.Usuario', on_delete=models.SET_NULL, null=True, blank=True, related_name='atendimentos_realizados')
-    data_atendimento = models.DateTimeField(auto_now_add=True)
+    # Como em Venda.data_venda: o default preenche o "agora", mas atendimentos
+    # registrados depois (importados de outro sistema) mantêm a data real.
+    data_atendimento = models.DateTimeField(default=timezone.now)
     canal = models.CharField(max_length=50)
     descricao = models.TextField()
 
+    class Meta:
+        indexes = [
+            # Linha do tempo de um cliente (mais recentes primeiro) com paginação por cursor.
+            models.Index(fields=['cliente', '-data_atendimento', '-id'], name='operacoes_at_timeline_idx'),
+            # Listagem geral, na mesma ordem.
+            models.Index(fields=['-data_atendimento', '-id'], name='operacoes_at_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"Atendimento para {self.cliente.pessoa.nome} em {self.data_atendimento.strftime('%d/%m/%Y')}"
+
+class VendaResumoDiario(models.Model):
+    """
+    Tabela pré-agregada das vendas: uma linha por dia, segmento, vendedor e
+    forma de pagamento. Os gráficos do dashboard leem daqui em vez de varrer
+    todas as vendas. É mantida por operacoes/resumos.py.
+    """
+    dia = models.DateField()
+    segmento = models.ForeignKey('produtos.Segmento', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    vendedor = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='+')
+    tipo_pagamento = models.CharField(max_length=50, blank=True)
+    qtd = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumo Diário de Vendas"
+        verbose_name_plural = "Resumos Diários de Vendas"
+        indexes = [
+            models.Index(fields=['dia']),
+        ]
+
     def __str__(self):
-        return f"Atendimento para {self.cliente.pessoa.nome} em {self.data_atendimento.strftime('%d/%m/%Y')}"
\ No newline at end of file
+        return f"Resumo de {self.dia.strftime('%d/%m/%Y')}: {self.qtd} vendas"
@@ -0,0 +1,103 @@
+# operacoes/resumos.py
+"""
+Manutenção da tabela pré-agregada VendaResumoDiario.
+
+A regra é sempre a mesma: para um intervalo de dias, apaga as linhas do
+resumo e agrega de novo as vendas desses dias no banco (GROUP BY dia,
+segmento, vendedor e forma de pagamento). Como só os dias afetados são
+recalculados, uma venda nova ou uma planilha importada custa o tamanho
+desses dias, e não o histórico inteiro.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from dealerconnect_backend.apos_commit import LoteAposCommit
+from usuarios.signals import alteracao_em_lote
+from .models import Venda, VendaResumoDiario
+
+TAMANHO_LOTE_PADRAO = 1000
+
+
+def filtrar_intervalo(vendas, inicio=None, fim=None):
+    """
+    Filtra as vendas pelo intervalo de datas (as duas pontas inclusive). O filtro
+    é feito em data_venda diretamente, sem __date, para poder usar o índice.
+    """
+    fuso = timezone.get_current_timezone()
+    if inicio:
+        vendas = vendas.filter(data_venda__gte=datetime.combine(inicio, time.min, tzinfo=fuso))
+    if fim:
+        vendas = vendas.filter(data_venda__lt=datetime.combine(fim + timedelta(days=1), time.min, tzinfo=fuso))
+    return vendas
+
+
+def reconstruir_resumo(inicio=None, fim=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Recalcula o resumo diário entre `inicio` e `fim` (datas, inclusive).
+    Sem datas, reconstrói a tabela inteira. Retorna quantas linhas foram gravadas.
+    """
+    agregado = (
+        filtrar_intervalo(Venda.objects.all(), inicio, fim)
+        .annotate(dia=TruncDate('data_venda'))
+        .values('dia', 'veiculo__segmento', 'vendedor', 'tipo_pagamento')
+        .annotate(qtd=Count('id'), total=Sum('valor_final'))
+        .order_by()
+    )
+
+    resumo_antigo = VendaResumoDiario.objects.all()
+    if inicio:
+        resumo_antigo = resumo_antigo.filter(dia__gte=inicio)
+    if fim:
+        resumo_antigo = resumo_antigo.filter(dia__lte=fim)
+
+    with transaction.atomic():
+        resumo_antigo.delete()
+        linhas = [
+            VendaResumoDiario(
+                dia=linha['dia'], segmento_id=linha['veiculo__segmento'], vendedor_id=linha['vendedor'],
+                tipo_pagamento=linha['tipo_pagamento'], qtd=linha['qtd'], total=linha['total'] or 0,
+            )
+            for linha in agregado.iterator(chunk_size=tamanho_lote)
+        ]
+        VendaResumoDiario.objects.bulk_create(linhas, batch_size=tamanho_lote)
+    alteracao_em_lote.send(sender=VendaResumoDiario, campos=None)
+    return len(linhas)
+
+
+# Dias afetados separados por até este intervalo são recalculados juntos,
+# num único trecho, em vez de um DELETE/INSERT por dia.
+DISTANCIA_MAXIMA_TRECHO = timedelta(days=31)
+
+
+def atualizar_resumo_dias(dias):
+    """Recalcula o resumo só dos trechos que contêm os dias informados."""
+    dias = sorted({dia for dia in dias if dia is not None})
+    if not dias:
+        return
+    inicio = fim = dias[0]
+    for dia in dias[1:]:
+        if dia - fim > DISTANCIA_MAXIMA_TRECHO:
+            reconstruir_resumo(inicio, fim)
+            inicio = dia
+        fim = dia
+    reconstruir_resumo(inicio, fim)
+
+
+_atualizacao = LoteAposCommit(atualizar_resumo_dias)
+
+
+def agendar_atualizacao(dias):
+    """
+    Junta os dias afetados dentro da transação atual e recalcula o resumo uma
+    vez só, depois do commit. Assim, apagar mil vendas de uma vez (ex.: pelo
+    admin) gera um recálculo, e não mil.
+    """
+    _atualizacao.agendar(dias)
+
+
+def dia_da_venda(venda):
+    return timezone.localtime(venda.data_venda).date()
@@ -1,23 +1,26 @@
 # operacoes/serializers.py
 
 from rest_framework import serializers
+from dealerconnect_backend.api import CamposDinamicosMixin
 # Vamos importar os serializers que já criamos nos outros apps
 from produtos.serializers import VeiculoSerializer
 from usuarios.serializers import ClienteSerializer, UsuarioSerializer
-from .models import Venda
+from .models import Atendimento, Venda
 
-class VendaSerializer(serializers.ModelSerializer):
+class VendaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
-    Este serializer transforma os dados de uma Venda em um formato JSON rico.
-    Em vez de mostrar apenas os IDs, ele "aninha" as informações completas
-    do cliente, do veículo e do vendedor, usando os serializers que já tínhamos.
+    Este serializer transforma os dados de uma Venda em JSON.
+    Por padrão o cliente, o veículo e o vendedor aparecem só como IDs, o que
+    deixa a listagem leve. Com ?expand=cliente,veiculo,vendedor ele "aninha"
+    as informações completas, usando os serializers que já tínhamos.
     """
-    # Aqui está a chave: aninhando os serializers.
-    # 'read_only=True' significa que esses campos são apenas para leitura.
-    # Não usaremos este endpoint para criar vendas (por enquanto).
-    cliente = ClienteSerializer(read_only=True)
-    veiculo = VeiculoSerializer(read_only=True)
-    vendedor = UsuarioSerializer(read_only=True)
+    # Para cada relação: o serializer usado quando ela é expandida e o
+    # caminho do select_related que evita uma consulta por venda.
+    campos_expansiveis = {
+        'cliente': (ClienteSerializer, 'cliente__pessoa'),
+        'veiculo': (VeiculoSerializer, 'veiculo__segmento'),
+        'vendedor': (UsuarioSerializer, 'vendedor__pessoa'),
+    }
 
     class Meta:
         model = Venda
@@ -30,4 +33,32 @@ class VendaSerializer(serializers.ModelSerializer):
             'cliente', 
             'veiculo', 
             'vendedor'
-        ]
\ No newline at end of file
+        ]
+
+
+class AtendimentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Leitura dos atendimentos. Como nas vendas, cliente e atendente vêm como
+    IDs e são aninhados com ?expand=cliente,atendente.
+    """
+    campos_expansiveis = {
+        'cliente': (ClienteSerializer, 'cliente__pessoa'),
+        'atendente': (UsuarioSerializer, 'atendente__pessoa'),
+    }
+
+    class Meta:
+        model = Atendimento
+        fields = ['id', 'cliente', 'atendente', 'data_atendimento', 'canal', 'descricao']
+
+
+class AtendimentoCreateSerializer(serializers.ModelSerializer):
+    # Os ids entram como inteiros e são conferidos de uma vez, com uma consulta
+    # IN por tabela (operacoes/atendimentos.py), em vez do SELECT por linha
+    # que o PrimaryKeyRelatedField faria num lote de milhares de atendimentos.
+    cliente = serializers.IntegerField(source='cliente_id')
+    atendente = serializers.IntegerField(source='atendente_id', required=False, allow_null=True)
+
+    class Meta:
+        model = Atendimento
+        fields = ['cliente', 'atendente', 'data_atendimento', 'canal', 'descricao']
+        extra_kwargs = {'data_atendimento': {'required': False}}
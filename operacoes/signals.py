@@ -0,0 +1,87 @@
+# operacoes/signals.py
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from produtos.models import Veiculo
+from usuarios.signals import alteracao_em_lote
+from . import compras
+from .atendimentos import agendar_recalculo, incrementar_contadores
+from .models import Atendimento, Venda
+from .resumos import agendar_atualizacao, dia_da_venda, reconstruir_resumo
+
+
+@receiver(pre_save, sender=Venda)
+def guardar_dia_anterior(sender, instance, **kwargs):
+    # Se uma venda existente mudar de data, o dia antigo também precisa ser
+    # recalculado; se mudar de cliente, o resumo de compras do antigo também.
+    instance._dia_anterior = instance._cliente_anterior = None
+    if instance.pk is not None:
+        anterior = Venda.objects.filter(pk=instance.pk).values_list('data_venda', 'cliente_id').first()
+        if anterior is not None:
+            instance._dia_anterior = dia_da_venda(Venda(data_venda=anterior[0]))
+            instance._cliente_anterior = anterior[1]
+
+
+@receiver(post_save, sender=Venda)
+@receiver(post_delete, sender=Venda)
+def venda_alterada(sender, instance, **kwargs):
+    # O recálculo acontece uma vez só, depois do commit da transação.
+    agendar_atualizacao({dia_da_venda(instance), getattr(instance, '_dia_anterior', None)})
+
+
+@receiver(post_save, sender=Venda)
+def venda_salva(sender, instance, created, **kwargs):
+    # Venda nova só soma ao resumo do cliente; edição refaz o dos clientes envolvidos.
+    if created:
+        compras.registrar_venda(instance)
+    else:
+        compras.agendar_recalculo({instance.cliente_id, getattr(instance, '_cliente_anterior', None)} - {None})
+
+
+@receiver(post_delete, sender=Venda)
+def venda_apagada(sender, instance, **kwargs):
+    compras.agendar_recalculo([instance.cliente_id])
+
+
+@receiver(alteracao_em_lote, sender=Veiculo)
+def veiculos_alterados(sender, campos=None, alterados=None, **kwargs):
+    # O resumo diário e o segmento favorito dos clientes guardam o segmento do
+    # veículo. Veículo recém-inserido ainda não tem vendas; só a troca de
+    # segmento de um veículo existente pede recálculo, e só dos dias e dos
+    # clientes das vendas dele.
+    if alterados is None:
+        # Remetente que não diz quais linhas mudaram: não há como limitar.
+        if campos is None or 'segmento_id' in campos:
+            transaction.on_commit(reconstruir_resumo)
+            transaction.on_commit(compras.recalcular_resumo_compras)
+        return
+    veiculos = [pk for pk, campos_da_linha in alterados.items() if 'segmento_id' in campos_da_linha]
+    if not veiculos:
+        return
+    vendas = Venda.objects.filter(veiculo_id__in=veiculos).order_by()
+    agendar_atualizacao(vendas.annotate(dia=TruncDate('data_venda')).values_list('dia', flat=True).distinct())
+    compras.agendar_recalculo(vendas.values_list('cliente_id', flat=True).distinct())
+
+
+@receiver(pre_save, sender=Atendimento)
+def guardar_cliente_anterior(sender, instance, **kwargs):
+    # Um atendimento editado pode ter mudado de cliente ou de data.
+    instance._cliente_anterior = None
+    if instance.pk is not None:
+        instance._cliente_anterior = Atendimento.objects.filter(pk=instance.pk).values_list('cliente_id', flat=True).first()
+
+
+@receiver(post_save, sender=Atendimento)
+def atendimento_salvo(sender, instance, created, **kwargs):
+    # Atendimento novo só soma; edição recalcula os clientes envolvidos.
+    if created:
+        incrementar_contadores([instance])
+    else:
+        agendar_recalculo({instance.cliente_id, getattr(instance, '_cliente_anterior', None)} - {None})
+
+
+@receiver(post_delete, sender=Atendimento)
+def atendimento_apagado(sender, instance, **kwargs):
+    agendar_recalculo([instance.cliente_id])
@@ -1,3 +1,495 @@
+import json
+import re
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from dealerconnect_backend.apos_commit import LoteAposCommit
+from dealerconnect_backend.guarda_consultas import ConsultasRepetidas, GuardaConsultas, SemNMaisUmMixin
+
+from produtos.models import Segmento, Veiculo
+from usuarios.models import Cliente, Pessoa, Usuario
+from .importacao import MOTIVO_REPETIDA, MOTIVO_SEM_CHASSI, importar_vendas, sincronizar
+from .models import Atendimento, Venda, VendaResumoDiario
+
+
+BANCOS_COM_EXPLAIN = ('sqlite', 'mysql')
+
+
+def tabelas_varridas(sql):
+    """
+    Roda EXPLAIN na consulta e devolve as tabelas lidas por inteiro, sem
+    índice nenhum. Entende o formato do SQLite (usado nos testes locais) e
+    o do MySQL (produção); os testes que usam isto só rodam nesses dois
+    (BANCOS_COM_EXPLAIN).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            # Linhas como "SCAN usuarios_cliente" (ruim) ou
+            # "SCAN usuarios_pessoa USING INDEX ..." (ok).
+            return [
+                re.match(r'SCAN (\w+)', detalhe).group(1)
+                for *_, detalhe in cursor.fetchall()
+                if re.match(r'SCAN \w+$', detalhe)
+            ]
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN FORMAT=JSON ' + sql)
+            plano = json.loads(cursor.fetchone()[0])
+            return [tabela['table_name'] for tabela in tabelas_do_plano(plano) if tabela.get('access_type') == 'ALL']
+
+
+def tabelas_do_plano(no):
+    """Percorre o JSON do EXPLAIN do MySQL devolvendo cada bloco "table"."""
+    if isinstance(no, dict):
+        if 'table' in no:
+            yield no['table']
+        for valor in no.values():
+            yield from tabelas_do_plano(valor)
+    elif isinstance(no, list):
+        for item in no:
+            yield from tabelas_do_plano(item)
+
+
+@skipUnless(connection.vendor in BANCOS_COM_EXPLAIN, 'Só lê o EXPLAIN do SQLite e do MySQL.')
+class PlanoDasConsultasTests(TestCase):
+    """
+    Garante que a consulta principal de cada listagem usa índice. Se alguém
+    mudar a ordenação ou um filtro sem criar o índice correspondente, o
+    teste mostra qual tabela passou a ser varrida por inteiro.
+
+    A busca textual (?search=, com icontains) fica de fora: ela não tem como
+    usar um índice B-tree comum.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Algumas dezenas de linhas: com as tabelas vazias, o otimizador do
+        # MySQL prefere varrer a tabela mesmo havendo índice.
+        segmento = Segmento.objects.create(nome_segmento='City')
+        veiculos = Veiculo.objects.bulk_create(
+            Veiculo(modelo=f'MODELO {i}', segmento=segmento) for i in range(30)
+        )
+        pessoas = Pessoa.objects.bulk_create(
+            Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(60)
+        )
+        pessoas = list(Pessoa.objects.order_by('id'))
+        clientes = Cliente.objects.bulk_create(
+            Cliente(pessoa=pessoa, prob_alto=i / 50) for i, pessoa in enumerate(pessoas[:50])
+        )
+        vendedor = Usuario.objects.create(pessoa=pessoas[-1], senha_hash='x', perfil=Usuario.Perfil.VENDEDOR)
+        Venda.objects.bulk_create(
+            Venda(
+                cliente=clientes[i % len(clientes)], veiculo=veiculos[i % len(veiculos)],
+                vendedor=vendedor, valor_final=Decimal('0'), tipo_pagamento='FIN',
+            )
+            for i in range(120)
+        )
+        Atendimento.objects.bulk_create(
+            Atendimento(cliente=clientes[i % len(clientes)], canal='Loja', descricao='Visita') for i in range(120)
+        )
+        cls.cliente = clientes[0]
+        cls.vendedor = vendedor
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def consulta_principal(self, url, tabela):
+        """Faz a requisição e devolve o SQL da primeira consulta que lê `tabela`."""
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200, url)
+        for consulta in consultas.captured_queries:
+            if re.search(rf'FROM [`"]?{tabela}[`"]?', consulta['sql']):
+                return consulta['sql'], resposta
+        self.fail(f'{url} não consultou {tabela}')
+
+    def assertUsaIndice(self, url, tabela):
+        sql, resposta = self.consulta_principal(url, tabela)
+        self.assertEqual(tabelas_varridas(sql), [], f'{url} varre tabelas inteiras:\n{sql}')
+        return resposta
+
+    def test_listagem_de_vendas(self):
+        resposta = self.assertUsaIndice('/api/vendas/?page_size=10', 'operacoes_venda')
+        # A página seguinte (cursor) também precisa andar pelo índice.
+        self.assertUsaIndice(resposta.json()['next'], 'operacoes_venda')
+
+    def test_vendas_de_um_cliente_e_de_um_vendedor(self):
+        self.assertUsaIndice(f'/api/vendas/?cliente={self.cliente.pk}', 'operacoes_venda')
+        self.assertUsaIndice(f'/api/vendas/?vendedor={self.vendedor.pk}', 'operacoes_venda')
+
+    def test_listagem_de_clientes(self):
+        resposta = self.assertUsaIndice('/api/clientes/?page_size=10', 'usuarios_cliente')
+        self.assertUsaIndice(resposta.json()['next'], 'usuarios_cliente')
+        self.assertUsaIndice('/api/clientes/?pessoa__cpf_cnpj=00000000001', 'usuarios_cliente')
+
+    def test_ranking_de_clientes_por_probabilidade(self):
+        resposta = self.assertUsaIndice('/api/clientes/?ordering=-prob_alto&min_prob=0.7&page_size=10', 'usuarios_cliente')
+        self.assertUsaIndice(resposta.json()['next'], 'usuarios_cliente')
+
+    def test_listagem_de_veiculos(self):
+        self.assertUsaIndice('/api/veiculos/?page_size=10', 'produtos_veiculo')
+
+    def test_atendimentos(self):
+        resposta = self.assertUsaIndice(f'/api/clientes/{self.cliente.pk}/atendimentos/?page_size=2', 'operacoes_atendimento')
+        self.assertUsaIndice(resposta.json()['next'], 'operacoes_atendimento')
+        self.assertUsaIndice('/api/atendimentos/?page_size=10', 'operacoes_atendimento')
+
+    def test_clientes_por_resumo_de_compras(self):
+        for ordenacao in ('-ultima_compra_em', '-qtd_compras', '-valor_total_compras'):
+            resposta = self.assertUsaIndice(f'/api/clientes/?ordering={ordenacao}&page_size=10', 'usuarios_cliente')
+            self.assertUsaIndice(resposta.json()['next'], 'usuarios_cliente')
+
+    def test_clientes_por_ultimo_atendimento(self):
+        resposta = self.assertUsaIndice('/api/clientes/?ordering=-ultimo_atendimento_em&page_size=10', 'usuarios_cliente')
+        self.assertUsaIndice(resposta.json()['next'], 'usuarios_cliente')
+
+    def test_contagens_do_dashboard(self):
+        self.assertUsaIndice('/api/dashboard/stats/', 'usuarios_cliente')
+
+    def test_graficos_de_vendas(self):
+        self.assertUsaIndice('/api/dashboard/vendas/serie/?inicio=2024-01-01', 'operacoes_vendaresumodiario')
+
+
+class ConsultasPorLinhaTests(SemNMaisUmMixin, TestCase):
+    """
+    As listagens de vendas e atendimentos (API e admin) precisam de um número
+    fixo de consultas, qualquer que seja o tamanho da página.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        segmento = Segmento.objects.create(nome_segmento='City')
+        veiculos = Veiculo.objects.bulk_create(Veiculo(modelo=f'MODELO {i}', segmento=segmento) for i in range(10))
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(31))
+        pessoas = list(Pessoa.objects.order_by('id'))
+        clientes = Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in pessoas[:30])
+        clientes = list(Cliente.objects.order_by('pk'))
+        vendedor = Usuario.objects.create(pessoa=pessoas[-1], senha_hash='x', perfil=Usuario.Perfil.VENDEDOR)
+        Venda.objects.bulk_create(
+            Venda(cliente=clientes[i], veiculo=veiculos[i % len(veiculos)], vendedor=vendedor,
+                  valor_final=Decimal('0'), tipo_pagamento='FIN')
+            for i in range(30)
+        )
+        Atendimento.objects.bulk_create(
+            Atendimento(cliente=cliente, atendente=vendedor, canal='Loja', descricao='Visita')
+            for cliente in clientes for _ in range(3)
+        )
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+
+    def test_listagem_de_vendas(self):
+        api = APIClient()
+        self.assertConsultasNaoCrescem('/api/vendas/', client=api)
+        self.assertConsultasNaoCrescem('/api/vendas/?expand=cliente,veiculo,vendedor', client=api)
+
+    def test_listagens_do_admin(self):
+        self.client.force_login(self.admin)
+        for url in ('/admin/operacoes/venda/', '/admin/operacoes/atendimento/'):
+            with self.subTest(url=url), self.assertSemNMaisUm(descricao=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_listagem_de_atendimentos(self):
+        api = APIClient()
+        cliente = Atendimento.objects.values_list('cliente', flat=True).first()
+        self.assertConsultasNaoCrescem('/api/atendimentos/?expand=cliente,atendente', client=api)
+        self.assertConsultasNaoCrescem(f'/api/clientes/{cliente}/atendimentos/', client=api)
+
+    def test_sem_expansao_nao_junta_tabelas(self):
+        api = APIClient()
+        # O join com usuarios_pessoa dos clientes é o da ordenação por nome
+        # (trazido só como a anotação do cursor); as vendas e os atendimentos não juntam nada.
+        for url, tabela, joins in (('/api/vendas/?page_size=25', 'operacoes_venda', 0),
+                                   ('/api/atendimentos/?fields=id', 'operacoes_atendimento', 0),
+                                   ('/api/clientes/?fields=pessoa_id,classificacao&expand=', 'usuarios_cliente', 1)):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(api.get(url).status_code, 200)
+                sql = next(consulta['sql'] for consulta in consultas.captured_queries
+                           if re.search(rf'FROM [`"]?{tabela}[`"]?', consulta['sql']))
+                self.assertEqual(sql.count(' JOIN '), joins, sql)
+                colunas = re.sub(r'\S+ AS [`"]?cursor_\w+[`"]?', '', sql.split(' FROM ')[0])
+                self.assertEqual(set(re.findall(r'[`"]?(\w+)[`"]?\.[`"]?\w+', colunas)), {tabela}, sql)
+
+    def test_fields_cabe_numa_consulta_por_pagina(self):
+        # O .only() precisa incluir os campos da ordenação: o cursor da página
+        # seguinte é montado com eles, e um campo adiado custaria mais uma consulta.
+        api = APIClient()
+        for url in ('/api/vendas/?fields=id,cliente&page_size=5', '/api/veiculos/?fields=id&page_size=5',
+                    '/api/clientes/?fields=pessoa_id&ordering=-prob_alto&page_size=5'):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                resposta = api.get(url)
+            self.assertIsNotNone(resposta.json()['next'], url)
+
+    def test_guarda_aponta_o_atributo_e_a_origem(self):
+        with self.assertRaises(ConsultasRepetidas) as contexto:
+            with GuardaConsultas(limite=5):
+                [str(venda) for venda in Venda.objects.all()]
+        relatorio = str(contexto.exception)
+        self.assertIn('Venda.cliente', relatorio)
+        self.assertIn('Cliente.pessoa', relatorio)
+        self.assertIn('operacoes/models.py', relatorio)
+
+        # Com select_related as mesmas linhas saem numa consulta só.
+        with GuardaConsultas(limite=1) as guarda:
+            [str(venda) for venda in Venda.objects.select_related('cliente__pessoa')]
+        self.assertEqual(guarda.total, 1)
+
+
+class AtendimentoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(4))
+        pessoas = list(Pessoa.objects.order_by('id'))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in pessoas[:3])
+        cls.clientes = list(Cliente.objects.order_by('pk'))
+        cls.atendente = Usuario.objects.create(pessoa=pessoas[3], senha_hash='x', perfil=Usuario.Perfil.VENDEDOR)
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def contadores(self, cliente):
+        cliente.refresh_from_db()
+        return cliente.qtd_atendimentos, cliente.ultimo_atendimento_em
+
+    def test_lote_atualiza_contadores(self):
+        a, b, c = self.clientes
+        linhas = [
+            {'cliente': a.pk, 'canal': 'Loja', 'descricao': '1', 'data_atendimento': '2026-01-10T10:00:00Z'},
+            {'cliente': a.pk, 'canal': 'Telefone', 'descricao': '2', 'data_atendimento': '2026-03-01T10:00:00Z'},
+            {'cliente': b.pk, 'atendente': self.atendente.pk, 'canal': 'WhatsApp', 'descricao': '3'},
+            {'cliente': 999999, 'canal': 'Loja', 'descricao': 'cliente inexistente'},
+            {'cliente': b.pk, 'atendente': 999999, 'canal': 'Loja', 'descricao': 'atendente inexistente'},
+            {'cliente': c.pk},
+        ]
+        resposta = self.api.post('/api/atendimentos/lote/', linhas, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['criados'], 3)
+        self.assertEqual([erro['linha'] for erro in resposta.json()['erros']], [4, 5, 6])
+
+        qtd, ultimo = self.contadores(a)
+        self.assertEqual((qtd, ultimo.isoformat()), (2, '2026-03-01T10:00:00+00:00'))
+        self.assertEqual(self.contadores(b)[0], 1)
+        self.assertEqual(self.contadores(c), (0, None))
+
+        # Um atendimento mais antigo soma, mas não muda a data do último.
+        self.api.post('/api/atendimentos/lote/', [
+            {'cliente': a.pk, 'canal': 'Loja', 'descricao': '4', 'data_atendimento': '2025-12-01T10:00:00Z'},
+        ], format='json')
+        self.assertEqual(self.contadores(a), (3, ultimo))
+
+    def test_criar_editar_e_apagar(self):
+        a, b, _ = self.clientes
+        resposta = self.api.post('/api/atendimentos/', {'cliente': a.pk, 'canal': 'Loja', 'descricao': 'Visita'},
+                                 format='json')
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+        self.assertEqual(self.contadores(a)[0], 1)
+        self.assertEqual(self.api.post('/api/atendimentos/', {'cliente': 999999, 'canal': 'Loja', 'descricao': 'x'},
+                                       format='json').status_code, 400)
+
+        atendimento = Atendimento.objects.get(pk=resposta.json()['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            atendimento.cliente = b
+            atendimento.save()
+        self.assertEqual((self.contadores(a)[0], self.contadores(b)[0]), (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.delete(f'/api/atendimentos/{atendimento.pk}/')
+        self.assertEqual(self.contadores(b), (0, None))
+
+    def test_linha_do_tempo(self):
+        a = self.clientes[0]
+        self.api.post('/api/atendimentos/lote/', [
+            {'cliente': a.pk, 'canal': 'Loja', 'descricao': str(i), 'data_atendimento': f'2026-01-{i + 1:02d}T10:00:00Z'}
+            for i in range(7)
+        ] + [{'cliente': self.clientes[1].pk, 'canal': 'Loja', 'descricao': 'outro cliente'}], format='json')
+
+        descricoes = []
+        url = f'/api/clientes/{a.pk}/atendimentos/?page_size=3'
+        while url:
+            pagina = self.api.get(url).json()
+            descricoes += [atendimento['descricao'] for atendimento in pagina['results']]
+            url = pagina['next']
+        self.assertEqual(descricoes, ['6', '5', '4', '3', '2', '1', '0'])
+        self.assertEqual(self.api.get('/api/clientes/999999/atendimentos/').status_code, 404)
+
+        ordem = [c['pessoa_id'] for c in self.api.get('/api/clientes/?ordering=-ultimo_atendimento_em').json()['results']]
+        self.assertEqual(ordem, [self.clientes[1].pk, a.pk, self.clientes[2].pk])
+
+
+class LoteAposCommitTests(TestCase):
+
+    def test_junta_a_transacao_e_recomeca_depois_de_um_rollback(self):
+        chamadas = []
+        lote = LoteAposCommit(lambda itens: chamadas.append(sorted(itens)))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            lote.agendar([1, 2])
+            lote.agendar([2, 3])
+        self.assertEqual((len(callbacks), chamadas), (1, [[1, 2, 3]]))
+
+        # O savepoint desfeito leva o callback junto; o próximo agendar começa um lote novo.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    lote.agendar([4])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            lote.agendar([5])
+        self.assertEqual((len(callbacks), chamadas[-1]), (1, [5]))
+
+
+class ResumoComprasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city, cls.trail = Segmento.objects.create(nome_segmento='City'), Segmento.objects.create(nome_segmento='Trail')
+        cls.moto_city = Veiculo.objects.create(modelo='CITY', segmento=cls.city)
+        cls.moto_trail = Veiculo.objects.create(modelo='TRAIL', segmento=cls.trail)
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(3))
+        pessoas = list(Pessoa.objects.order_by('id'))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in pessoas[:2])
+        cls.a, cls.b = Cliente.objects.order_by('pk')
+        cls.vendedor = Usuario.objects.create(pessoa=pessoas[2], senha_hash='x', perfil=Usuario.Perfil.VENDEDOR)
+
+    def vender(self, cliente, veiculo, valor, data):
+        return Venda.objects.create(cliente=cliente, veiculo=veiculo, vendedor=self.vendedor,
+                                    valor_final=Decimal(valor), data_venda=parse_datetime(data))
+
+    def resumo(self, cliente):
+        cliente.refresh_from_db()
+        return (cliente.qtd_compras, cliente.ultima_compra_em and cliente.ultima_compra_em.isoformat(),
+                cliente.valor_total_compras, cliente.segmento_favorito_id)
+
+    def test_mantido_a_cada_venda(self):
+        self.vender(self.a, self.moto_trail, '20000.00', '2025-05-01T10:00:00Z')
+        self.vender(self.a, self.moto_city, '10000.00', '2025-03-01T10:00:00Z')
+        self.assertEqual(self.resumo(self.a), (2, '2025-05-01T10:00:00+00:00', Decimal('30000.00'), self.trail.pk))
+        venda = self.vender(self.a, self.moto_city, '12000.50', '2024-01-01T10:00:00Z')
+        self.assertEqual(self.resumo(self.a), (3, '2025-05-01T10:00:00+00:00', Decimal('42000.50'), self.city.pk))
+
+        # Trocar a venda de cliente refaz o resumo dos dois.
+        with self.captureOnCommitCallbacks(execute=True):
+            venda.cliente = self.b
+            venda.save()
+        self.assertEqual(self.resumo(self.a), (2, '2025-05-01T10:00:00+00:00', Decimal('30000.00'), self.trail.pk))
+        self.assertEqual(self.resumo(self.b), (1, '2024-01-01T10:00:00+00:00', Decimal('12000.50'), self.city.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            venda.delete()
+        self.assertEqual(self.resumo(self.b), (0, None, Decimal('0.00'), None))
+
+    def test_sincronizacao_de_veiculos_so_refaz_o_que_trocou_de_segmento(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender(self.a, self.moto_city, '10000.00', '2025-03-01T10:00:00Z')
+            self.vender(self.b, self.moto_trail, '15000.00', '2025-04-01T10:00:00Z')
+        # Resumos zerados de propósito: o que for recalculado aparece de novo.
+        VendaResumoDiario.objects.all().delete()
+        Cliente.objects.update(segmento_favorito=None)
+
+        # Veículo novo (sem vendas) e veículo sem mudança: nada é recalculado.
+        with self.captureOnCommitCallbacks(execute=True):
+            registros = {'CITY': {'segmento_id': self.city.pk}, 'NOVA': {'segmento_id': self.city.pk}}
+            sincronizar(Veiculo, 'modelo', registros, campos_atualizaveis=['segmento_id'])
+        self.assertFalse(VendaResumoDiario.objects.exists())
+        self.assertEqual(self.resumo(self.b)[3], None)
+
+        # A TRAIL vira City: só o dia e o cliente da venda dela são refeitos.
+        with self.captureOnCommitCallbacks(execute=True):
+            sincronizar(Veiculo, 'modelo', {'TRAIL': {'segmento_id': self.city.pk}},
+                        campos_atualizaveis=['segmento_id'])
+        self.assertEqual([(str(linha.dia), linha.segmento_id) for linha in VendaResumoDiario.objects.all()],
+                         [('2025-04-01', self.city.pk)])
+        self.assertEqual((self.resumo(self.a)[3], self.resumo(self.b)[3]), (None, self.city.pk))
+
+    def test_comando_recalcula_tudo(self):
+        self.vender(self.a, self.moto_city, '10000.00', '2025-03-01T10:00:00Z')
+        self.vender(self.b, self.moto_trail, '15000.00', '2025-04-01T10:00:00Z')
+        esperado = [self.resumo(self.a), self.resumo(self.b)]
+        Cliente.objects.update(qtd_compras=0, ultima_compra_em=None, valor_total_compras=0, segmento_favorito=None)
+        call_command('recalcular_resumo_compras', '--tamanho-lote', '1', stdout=StringIO())
+        self.assertEqual([self.resumo(self.a), self.resumo(self.b)], esperado)
+
+    def test_listagem_ordena_e_filtra(self):
+        self.vender(self.a, self.moto_city, '10000.00', '2025-03-01T10:00:00Z')
+        self.vender(self.b, self.moto_trail, '15000.00', '2024-04-01T10:00:00Z')
+        self.vender(self.b, self.moto_trail, '15000.00', '2024-05-01T10:00:00Z')
+        api = APIClient()
+
+        def ids(url):
+            return [cliente['pessoa_id'] for cliente in api.get(url).json()['results']]
+
+        self.assertEqual(ids('/api/clientes/?ordering=-valor_total_compras'), [self.b.pk, self.a.pk])
+        self.assertEqual(ids('/api/clientes/?ordering=-ultima_compra_em'), [self.a.pk, self.b.pk])
+        self.assertEqual(ids('/api/clientes/?min_compras=2'), [self.b.pk])
+        self.assertEqual(ids('/api/clientes/?sem_compra_desde=2025-01-01'), [self.b.pk])
+        self.assertEqual(ids(f'/api/clientes/?segmento_favorito={self.city.pk}'), [self.a.pk])
+        cliente = api.get(f'/api/clientes/{self.b.pk}/?expand=segmento_favorito').json()
+        self.assertEqual(cliente['segmento_favorito']['nome_segmento'], 'Trail')
+
+
+class ImportacaoDeVendasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Cliente.objects.create(pessoa=Pessoa.objects.create(nome='ANA', cpf_cnpj='00000000001'))
+        Veiculo.objects.create(modelo='CG 160')
+
+    def planilha(self):
+        linhas = [
+            ('2025-03-01', 'CHASSI1'), ('2025-03-01', 'CHASSI1'), ('2025-03-02', 'CHASSI1'),
+            ('2025-03-03', None), ('2025-03-04', 'CHASSI2'),
+        ]
+        return pd.DataFrame([
+            {'Data': data, 'Veículo': 'CG 160', 'Chassi': chassi, 'Vendedor': None, 'Cliente': 'ANA',
+             'Forma de venda': 'VENDA A VISTA'}
+            for data, chassi in linhas
+        ])
+
+    def test_reimportar_o_mesmo_arquivo_nao_insere_nada(self):
+        primeira = importar_vendas(self.planilha())
+        self.assertEqual(primeira.inseridas, 3)
+        self.assertEqual(primeira.motivos(), {MOTIVO_REPETIDA: 1, MOTIVO_SEM_CHASSI: 1})
+
+        segunda = importar_vendas(self.planilha())
+        self.assertEqual((segunda.inseridas, segunda.atualizadas, segunda.ja_importadas), (0, 0, 3))
+        self.assertEqual(Venda.objects.count(), 3)
+
+
+class SincronizacaoTests(TestCase):
+
+    def test_conflito_em_outra_restricao_conta_como_ignorado(self):
+        Pessoa.objects.create(nome='ANA', cpf_cnpj='00000000001', email='ana@example.com')
+        registros = {
+            '00000000001': {'nome': 'ANA', 'email': 'ana@example.com'},
+            '00000000002': {'nome': 'BIA', 'email': 'bia@example.com'},
+            # CPF novo com o e-mail da Ana: o banco descarta a linha.
+            '00000000003': {'nome': 'ANA 2', 'email': 'ana@example.com'},
+        }
+        resumo = sincronizar(Pessoa, 'cpf_cnpj', registros, campos_atualizaveis=['nome', 'email'])
+        self.assertEqual(resumo.como_dict(), {'inseridos': 1, 'atualizados': 0, 'inalterados': 1, 'ignorados': 1})
+        self.assertFalse(Pessoa.objects.filter(cpf_cnpj='00000000003').exists())
+
+
+class ComandosDeImportacaoTests(TestCase):
+
+    def test_tamanho_lote_invalido_nao_limpa_o_banco(self):
+        Cliente.objects.create(pessoa=Pessoa.objects.create(nome='ANA', cpf_cnpj='00000000001'))
+        for valor in ('0', '-5'):
+            with self.subTest(valor=valor), self.assertRaisesMessage(CommandError, '--tamanho-lote'):
+                call_command('popular_banco', '--tamanho-lote', valor, stdout=StringIO())
+        self.assertEqual(Cliente.objects.count(), 1)
 
-# Create your tests here.
+    def test_importar_vendas_recusa_tamanho_lote_invalido(self):
+        with self.assertRaisesMessage(CommandError, '--tamanho-lote'):
+            call_command('importar_vendas', 'vendas.csv', '--tamanho-lote', '0', stdout=StringIO())
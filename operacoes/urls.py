@@ -1,13 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VendaViewSet
+from .views import AtendimentoViewSet, VendaViewSet
 
 # Cria um roteador para gerenciar as URLs da API automaticamente.
 router = DefaultRouter()
 # Registra nossa VendaViewSet na rota 'vendas'.
 router.register(r'vendas', VendaViewSet, basename='venda')
+router.register(r'atendimentos', AtendimentoViewSet, basename='atendimento')
 
 # As URLs do nosso app serão as que o roteador gerar.
 urlpatterns = [
     path('', include(router.urls)),
+    # Linha do tempo de atendimentos de um cliente.
+    path('clientes/<int:cliente_pk>/atendimentos/', AtendimentoViewSet.as_view({'get': 'timeline'}),
+         name='cliente-atendimentos'),
 ]
\ No newline at end of file
@@ -1,13 +1,26 @@
 from django.shortcuts import render
 
 # Create your views here.
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Venda
-from .serializers import VendaSerializer
+from dealerconnect_backend.api import CamposDinamicosViewSetMixin, ExportacaoMixin, NDJSONParser
+from dealerconnect_backend.paginacao import PaginacaoPorCursor
+from usuarios.models import Cliente
+from . import atendimentos
+from .models import Atendimento, Venda
+from .serializers import AtendimentoCreateSerializer, AtendimentoSerializer, VendaSerializer
 
 
-class VendaViewSet(viewsets.ReadOnlyModelViewSet):
+class VendaPaginacao(PaginacaoPorCursor):
+    # Da venda mais recente para a mais antiga; o id desempata vendas do mesmo horário.
+    ordering = ('-data_venda', 'id')
+
+
+class VendaViewSet(CamposDinamicosViewSetMixin, ExportacaoMixin, viewsets.ReadOnlyModelViewSet):
     """
     Este endpoint da API permite visualizar e filtrar as vendas realizadas.
     
@@ -17,8 +30,17 @@ class VendaViewSet(viewsets.ReadOnlyModelViewSet):
     Exemplos de filtro na URL:
     - ?cliente=5              (Filtra todas as vendas de um cliente específico)
     - ?vendedor=10             (Filtra todas as vendas de um vendedor específico)
+
+    Por padrão cliente, veículo e vendedor vêm só como IDs. Para escolher:
+    - ?expand=cliente,veiculo  (Aninha os dados completos dessas relações)
+    - ?fields=id,data_venda    (Devolve só esses campos)
+
+    A listagem é paginada por cursor: siga os links "next" e "previous".
+    Para a base inteira, use /api/vendas/export/?formato=csv (ou ndjson).
     """
     serializer_class = VendaSerializer
+    pagination_class = VendaPaginacao
+    nome_exportacao = 'vendas'
     
     # Ativamos o "motor" de filtros do DjangoFilterBackend
     filter_backends = [DjangoFilterBackend]
@@ -31,11 +53,94 @@ class VendaViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Esta função é responsável por buscar os dados no banco de dados.
         Nós a otimizamos para que, em uma única consulta, ela já traga
-        todas as informações relacionadas (cliente, pessoa, veículo, etc.),
-        tornando a API muito mais rápida e eficiente.
+        as informações relacionadas que forem expandidas (cliente, pessoa,
+        veículo, etc.) e só as colunas que vão aparecer na resposta.
         """
-        return Venda.objects.select_related(
+        queryset = Venda.objects.select_related(
             'cliente__pessoa', 
             'veiculo__segmento', 
             'vendedor__pessoa'
-        ).all().order_by('-data_venda') # Ordena da mais recente para a mais antiga
\ No newline at end of file
+        ).all().order_by('-data_venda', 'id') # Ordena da mais recente para a mais antiga
+        return self.otimizar_queryset(queryset)
+
+
+class AtendimentoPaginacao(PaginacaoPorCursor):
+    # Do atendimento mais recente para o mais antigo; com o cliente na frente,
+    # é a mesma ordem do índice (cliente, -data_atendimento, -id).
+    ordering = ('-data_atendimento', '-id')
+
+
+class AtendimentoViewSet(CamposDinamicosViewSetMixin, ExportacaoMixin, viewsets.ModelViewSet):
+    """
+    Atendimentos (ligações, visitas, mensagens) registrados para os clientes.
+
+    - GET  /api/atendimentos/?cliente=5&canal=WhatsApp   (paginado por cursor)
+    - GET  /api/clientes/5/atendimentos/                 (linha do tempo de um cliente)
+    - POST /api/atendimentos/                            (um atendimento)
+    - POST /api/atendimentos/lote/                       (array JSON ou NDJSON, muitos de uma vez)
+
+    Cada atendimento novo atualiza qtd_atendimentos e ultimo_atendimento_em
+    do cliente (ver operacoes/atendimentos.py).
+    """
+    serializer_class = AtendimentoSerializer
+    pagination_class = AtendimentoPaginacao
+    nome_exportacao = 'atendimentos'
+    acoes_com_campos_dinamicos = CamposDinamicosViewSetMixin.acoes_com_campos_dinamicos + ('timeline',)
+
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['cliente', 'atendente', 'canal']
+
+    def get_queryset(self):
+        # O select_related cobre o __str__ (cliente.pessoa.nome) e as expansões;
+        # o otimizar_queryset tira o que a resposta não vai mostrar.
+        queryset = Atendimento.objects.select_related(
+            'cliente__pessoa',
+            'atendente__pessoa',
+        ).order_by('-data_atendimento', '-id')
+        return self.otimizar_queryset(queryset)
+
+    def get_serializer_class(self):
+        if self.action in ('create', 'lote'):
+            return AtendimentoCreateSerializer
+        return AtendimentoSerializer
+
+    def create(self, request, *args, **kwargs):
+        # A mesma validação do lote (cliente e atendente precisam existir).
+        validos, erros = atendimentos.validar([request.data], AtendimentoCreateSerializer())
+        if erros:
+            return Response(erros[0], status=status.HTTP_400_BAD_REQUEST)
+        atendimento = validos[0][1]
+        # O save() dispara o sinal que atualiza os contadores do cliente.
+        atendimento.save()
+        return Response(AtendimentoSerializer(atendimento).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='lote', parser_classes=[JSONParser, NDJSONParser])
+    def lote(self, request):
+        """
+        Registra muitos atendimentos numa requisição só, com bulk_create.
+        Linhas com erro (campos inválidos, cliente ou atendente inexistente)
+        voltam em "erros" com o número da linha; as outras são gravadas.
+        """
+        linhas = request.data
+        if not isinstance(linhas, list):
+            return Response({'erro': 'O corpo deve ser um array JSON ou NDJSON (um atendimento por linha).'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(linhas) > atendimentos.MAXIMO_LINHAS:
+            return Response({'erro': f'No máximo {atendimentos.MAXIMO_LINHAS} atendimentos por requisição.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        resumo = atendimentos.registrar_atendimentos(linhas, AtendimentoCreateSerializer())
+        codigo = status.HTTP_201_CREATED if not resumo['erros'] else status.HTTP_200_OK
+        return Response(resumo, status=codigo)
+
+    def timeline(self, request, cliente_pk=None):
+        """
+        GET /api/clientes/<id>/atendimentos/: os atendimentos de um cliente,
+        do mais recente para o mais antigo, paginados por cursor.
+        """
+        if not Cliente.objects.filter(pk=cliente_pk).exists():
+            raise NotFound('Cliente não encontrado.')
+        queryset = self.filter_queryset(self.get_queryset()).filter(cliente_id=cliente_pk)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
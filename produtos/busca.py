@@ -0,0 +1,6 @@
+# produtos/busca.py
+from dealerconnect_backend.busca import IndiceDeBusca
+from .models import Veiculo, VeiculoTermo
+
+# Índice de busca dos veículos: palavras da marca e do modelo.
+indice_veiculos = IndiceDeBusca(Veiculo, VeiculoTermo, 'veiculo', ['marca', 'modelo'])
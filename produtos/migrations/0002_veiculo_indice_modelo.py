@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['modelo', 'id'], name='produtos_ve_modelo_ee7dd5_idx'),
+        ),
+    ]
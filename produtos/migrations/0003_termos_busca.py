@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def indexar(apps, schema_editor):
+    # Monta os termos de busca dos registros que já existem.
+    from dealerconnect_backend.busca import IndiceDeBusca
+    IndiceDeBusca(apps.get_model('produtos', 'Veiculo'), apps.get_model('produtos', 'VeiculoTermo'), 'veiculo', ['marca', 'modelo']).reindexar()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0002_veiculo_indice_modelo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VeiculoTermo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=50)),
+                ('posicao', models.PositiveSmallIntegerField(default=0)),
+                ('veiculo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='produtos.veiculo')),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca (Veículo)',
+                'verbose_name_plural': 'Termos de Busca (Veículos)',
+                'indexes': [models.Index(fields=['termo', 'veiculo'], name='produtos_ve_termo_3193d2_idx')],
+            },
+        ),
+        migrations.RunPython(indexar, migrations.RunPython.noop),
+    ]
@@ -16,5 +16,30 @@ class Veiculo(models.Model):
     # Relacionamento ForeignKey para Segmento
     segmento = models.ForeignKey(Segmento, on_delete=models.SET_NULL, null=True, blank=True, related_name='veiculos')
 
+    class Meta:
+        indexes = [
+            # Ordem da listagem (modelo, id) e busca do veículo pelo modelo na importação.
+            models.Index(fields=['modelo', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.marca} {self.modelo}"
+
+class VeiculoTermo(models.Model):
+    """
+    Palavras normalizadas da marca e do modelo de cada veículo, usadas pela
+    busca de veículos. Mantida por dealerconnect_backend/busca.py.
+    """
+    veiculo = models.ForeignKey(Veiculo, on_delete=models.CASCADE, related_name='termos_busca')
+    termo = models.CharField(max_length=50)
+    posicao = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Termo de Busca (Veículo)"
+        verbose_name_plural = "Termos de Busca (Veículos)"
+        indexes = [
+            models.Index(fields=['termo', 'veiculo']),
+        ]
+
     def __str__(self):
-        return f"{self.marca} {self.modelo}"
\ No newline at end of file
+        return self.termo
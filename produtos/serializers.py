@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from dealerconnect_backend.api import CamposDinamicosMixin
 from .models import Veiculo, Segmento
 
 class SegmentoSerializer(serializers.ModelSerializer):
@@ -6,9 +7,12 @@ class SegmentoSerializer(serializers.ModelSerializer):
         model = Segmento
         fields = ['id', 'nome_segmento']
 
-class VeiculoSerializer(serializers.ModelSerializer):
+class VeiculoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     # Mostra o nome do segmento em vez de apenas o ID
+    # (com ?expand= sem 'segmento', ele aparece só como ID)
     segmento = SegmentoSerializer(read_only=True)
+    campos_expansiveis = {'segmento': (SegmentoSerializer, 'segmento')}
+    expandir_padrao = ('segmento',)
 
     class Meta:
         model = Veiculo
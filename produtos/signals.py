@@ -0,0 +1,19 @@
+# produtos/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from usuarios.signals import alteracao_em_lote
+from .busca import indice_veiculos
+from .models import Veiculo
+
+
+@receiver(post_save, sender=Veiculo)
+def veiculo_salvo(sender, instance, created, update_fields=None, **kwargs):
+    # Mantém os termos de busca (marca e modelo) em dia.
+    if created or indice_veiculos.campos_afetados(update_fields):
+        indice_veiculos.reindexar([instance.pk])
+
+
+@receiver(alteracao_em_lote, sender=Veiculo)
+def veiculos_alterados_em_lote(sender, campos=None, alterados=None, inseridos=None, **kwargs):
+    indice_veiculos.reindexar_alteracao(campos, alterados, inseridos)
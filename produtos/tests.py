@@ -1,3 +1,29 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from dealerconnect_backend.guarda_consultas import SemNMaisUmMixin
+from .models import Segmento, Veiculo
+
+
+class ConsultasPorLinhaTests(SemNMaisUmMixin, TestCase):
+    """A listagem de veículos (com o segmento aninhado) não pode fazer uma consulta por linha."""
+
+    @classmethod
+    def setUpTestData(cls):
+        segmentos = [Segmento.objects.create(nome_segmento=nome) for nome in ('City', 'Street', 'Trail')]
+        Veiculo.objects.bulk_create(
+            Veiculo(modelo=f'MODELO {i:02d}', segmento=segmentos[i % len(segmentos)]) for i in range(30)
+        )
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+
+    def test_listagem_de_veiculos(self):
+        api = APIClient()
+        self.assertConsultasNaoCrescem('/api/veiculos/', client=api)
+        self.assertConsultasNaoCrescem('/api/veiculos/?search=modelo', client=api)
+
+    def test_listagens_do_admin(self):
+        self.client.force_login(self.admin)
+        for url in ('/admin/produtos/veiculo/', '/admin/produtos/segmento/'):
+            with self.subTest(url=url), self.assertSemNMaisUm(descricao=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
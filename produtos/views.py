@@ -3,26 +3,46 @@ from django.shortcuts import render
 # Create your views here.
 from rest_framework import viewsets
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters
+from dealerconnect_backend.api import CamposDinamicosViewSetMixin, ExportacaoMixin
+from dealerconnect_backend.busca import BuscaPorTermos
+from dealerconnect_backend.paginacao import PaginacaoPorCursor
+from .busca import indice_veiculos
 from .models import Veiculo
 from .serializers import VeiculoSerializer
 
-class VeiculoViewSet(viewsets.ReadOnlyModelViewSet):
+
+class VeiculoPaginacao(PaginacaoPorCursor):
+    ordering = ('modelo', 'id')
+
+
+class VeiculoViewSet(CamposDinamicosViewSetMixin, ExportacaoMixin, viewsets.ReadOnlyModelViewSet):
     """
     Este endpoint da API permite visualizar e buscar veículos.
 
     Você pode filtrar os resultados usando os seguintes parâmetros na URL:
     - ?segmento=1              (Filtra por ID do segmento)
-    - ?search=cg               (Busca por parte do modelo ou marca)
+    - ?search=cg sta           (Busca por começo de palavra na marca ou no modelo,
+                                sem acento: acha "CG 160 START", mas "160" não acha "CG160")
+    - ?fields=id,modelo        (Devolve só esses campos)
+    - ?expand=                 (Mostra o segmento só como ID)
+
+    A listagem é paginada por cursor; /api/veiculos/export/ devolve tudo em CSV ou NDJSON.
     """
-    queryset = Veiculo.objects.select_related('segmento').all().order_by('modelo')
+    queryset = Veiculo.objects.select_related('segmento').all().order_by('modelo', 'id')
     serializer_class = VeiculoSerializer
+    pagination_class = VeiculoPaginacao
+    nome_exportacao = 'veiculos'
 
     # --- MESMA LÓGICA DA VIEW DE CLIENTES ---
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, BuscaPorTermos]
 
     # Permitimos filtrar exatamente pelo ID do segmento a que o veículo pertence.
     filterset_fields = ['segmento']
     
-    # A busca geral vai procurar tanto na marca quanto no modelo.
-    search_fields = ['marca', 'modelo']
\ No newline at end of file
+    # A busca geral vai procurar tanto na marca quanto no modelo,
+    # por começo de palavra (ver dealerconnect_backend/busca.py).
+    indice_busca = indice_veiculos
+    campo_indice_busca = 'id'
+
+    def get_queryset(self):
+        return self.otimizar_queryset(super().get_queryset())
@@ -1,6 +1,63 @@
 from django.contrib import admin
-from .models import Pessoa, Cliente, Usuario
+from django.db import transaction
 
-admin.site.register(Pessoa)
-admin.site.register(Cliente)
-admin.site.register(Usuario)
\ No newline at end of file
+from .models import Pessoa, Cliente, HistoricoSituacao, Usuario
+from .signals import avisar_exclusao
+from .situacao import mudar_situacao
+
+
+class AvisaExclusaoMixin:
+    """Apagar pelo admin (um registro ou a ação "apagar selecionados") avisa o dashboard."""
+
+    def delete_model(self, request, obj):
+        pk = obj.pk
+        super().delete_model(request, obj)
+        avisar_exclusao(self.model, [pk])
+
+    def delete_queryset(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        avisar_exclusao(self.model, ids)
+
+
+@admin.register(Pessoa)
+class PessoaAdmin(AvisaExclusaoMixin, admin.ModelAdmin):
+    pass
+
+
+# O __str__ de Cliente e de Usuario mostra o nome da pessoa; sem o
+# list_select_related, cada linha da listagem do admin faria mais uma consulta.
+@admin.register(Cliente)
+class ClienteAdmin(AvisaExclusaoMixin, admin.ModelAdmin):
+    list_select_related = ('pessoa',)
+
+    def save_model(self, request, obj, form, change):
+        # Uma situação alterada pelo admin também vai para o HistoricoSituacao:
+        # o resto do formulário é gravado com a situação antiga e a nova passa
+        # por mudar_situacao, na mesma transação.
+        if not change or 'situacao' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+        nova_situacao = obj.situacao
+        with transaction.atomic():
+            obj.situacao = form.initial['situacao']
+            super().save_model(request, obj, form, change)
+            mudar_situacao(obj, nova_situacao)
+
+
+@admin.register(Usuario)
+class UsuarioAdmin(admin.ModelAdmin):
+    list_select_related = ('pessoa',)
+
+
+# Somente leitura: o histórico só recebe linhas pelas mudanças de situação.
+@admin.register(HistoricoSituacao)
+class HistoricoSituacaoAdmin(admin.ModelAdmin):
+    list_display = ('cliente_id', 'situacao_anterior', 'situacao_nova', 'alterado_em')
+    list_filter = ('situacao_nova',)
+    date_hierarchy = 'alterado_em'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
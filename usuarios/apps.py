@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        # Conecta os sinais que mantêm o índice de busca das pessoas atualizado.
+        from . import signals  # noqa: F401
+        # O modelo de classificação não é carregado aqui: o ready() roda em todo
+        # manage.py (migrate, shell, check...). Quem serve a API chama
+        # ml_registry.precarregar() no wsgi.py/asgi.py; os demais carregam no primeiro uso.
@@ -0,0 +1,6 @@
+# usuarios/busca.py
+from dealerconnect_backend.busca import IndiceDeBusca
+from .models import Pessoa, PessoaTermo
+
+# Índice de busca das pessoas (e, por tabela, dos clientes): palavras do nome.
+indice_pessoas = IndiceDeBusca(Pessoa, PessoaTermo, 'pessoa', ['nome'])
@@ -0,0 +1,133 @@
+# usuarios/cache_previsoes.py
+"""
+Cache das previsões do modelo de classificação, pela combinação de entradas.
+
+O modelo só olha para (idade, município, lead_score), e essas combinações se
+repetem muito entre clientes: na base atual, ~5.700 clientes têm só ~600
+combinações diferentes. Então, em vez de mandar cada cliente para o
+scikit-learn, guardamos (classe, probabilidade de potencial alto) por
+(versão do modelo, idade, município, lead_score) e só as combinações nunca
+vistas passam pelo predict_proba, todas juntas numa chamada.
+
+A versão do modelo entra na chave; quando o arquivo .joblib é trocado, as
+entradas antigas são descartadas. O tamanho é limitado (LRU) e os contadores
+de acertos/faltas aparecem em GET /api/clientes/modelo/.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .previsao_processo import calcular
+
+
+class CachePrevisoes:
+
+    def __init__(self, capacidade=None):
+        self._capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._versao = None
+        self.acertos = 0
+        self.faltas = 0
+
+    @property
+    def capacidade(self):
+        if self._capacidade is not None:
+            return self._capacidade
+        return getattr(settings, 'ML_CACHE_PREVISOES_TAMANHO', 50000)
+
+    def prever(self, modelo, linhas):
+        """
+        Recebe tuplas (idade, municipio, lead_score) e devolve uma lista de
+        (classe, prob_alto) na mesma ordem, usando o modelo só para o que
+        não está no cache.
+        """
+        linhas = [tuple(linha) for linha in linhas]
+        resultados = [None] * len(linhas)
+        faltando = {}
+        with self._lock:
+            self._trocar_versao(modelo.versao)
+            for posicao, linha in enumerate(linhas):
+                valor = self._itens.get(linha)
+                if valor is None:
+                    faltando.setdefault(linha, []).append(posicao)
+                else:
+                    self._itens.move_to_end(linha)
+                    resultados[posicao] = valor
+            self.acertos += len(linhas) - sum(len(posicoes) for posicoes in faltando.values())
+            self.faltas += sum(len(posicoes) for posicoes in faltando.values())
+
+        if faltando:
+            # Uma chamada ao scikit-learn com cada combinação nova uma vez só.
+            novos = calcular(modelo.pipeline, list(faltando))
+            for linha, valor in zip(faltando, novos):
+                for posicao in faltando[linha]:
+                    resultados[posicao] = valor
+            self.guardar(modelo.versao, zip(faltando, novos))
+        return resultados
+
+    def guardar(self, versao, pares):
+        """Guarda pares (linha, (classe, prob_alto)) calculados fora daqui (ex.: no worker)."""
+        with self._lock:
+            self._trocar_versao(versao)
+            for linha, valor in pares:
+                self._itens[tuple(linha)] = valor
+                self._itens.move_to_end(tuple(linha))
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def consultar(self, versao, linhas):
+        """
+        Separa as linhas em já conhecidas e novas, sem chamar o modelo.
+        Devolve ({posicao: (classe, prob_alto)}, [posicoes que faltam]).
+        """
+        encontrados, faltando = {}, []
+        with self._lock:
+            self._trocar_versao(versao)
+            for posicao, linha in enumerate(linhas):
+                valor = self._itens.get(tuple(linha))
+                if valor is None:
+                    faltando.append(posicao)
+                else:
+                    self._itens.move_to_end(tuple(linha))
+                    encontrados[posicao] = valor
+            self.acertos += len(encontrados)
+            self.faltas += len(faltando)
+        return encontrados, faltando
+
+    def precomputar(self, modelo, linhas):
+        """Calcula de uma vez todas as combinações informadas que ainda não estão no cache."""
+        with self._lock:
+            self._trocar_versao(modelo.versao)
+            novas = list(dict.fromkeys(tuple(linha) for linha in linhas if tuple(linha) not in self._itens))
+        if novas:
+            self.guardar(modelo.versao, zip(novas, calcular(modelo.pipeline, novas)))
+        return len(novas)
+
+    def estatisticas(self):
+        consultas = self.acertos + self.faltas
+        return {
+            'versao': self._versao,
+            'tamanho': len(self._itens),
+            'capacidade': self.capacidade,
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+        }
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._versao = None
+            self.acertos = self.faltas = 0
+
+    def _trocar_versao(self, versao):
+        # Chamado com o lock já adquirido.
+        if versao != self._versao:
+            self._itens.clear()
+            self._versao = versao
+
+
+# Instância única por processo, como o registro de modelos.
+cache_previsoes = CachePrevisoes()
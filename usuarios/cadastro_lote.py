@@ -0,0 +1,219 @@
+# usuarios/cadastro_lote.py
+"""
+Cadastro de clientes em lote (POST /api/clientes/lote/).
+
+Os formulários de captação e os eventos mandam centenas de leads de uma vez.
+Pelo POST /api/clientes/ seriam centenas de requisições, cada uma com dois
+INSERTs. Aqui o lote inteiro passa por três etapas:
+
+1. validação de todas as linhas com o mesmo ClienteCreateSerializer do
+   cadastro individual (uma instância só, reaproveitada), mais a checagem
+   de CPF/CNPJ e e-mail repetidos dentro do próprio lote;
+2. para cada bloco de `tamanho_lote` linhas, uma consulta com IN descobre os
+   CPFs/e-mails que já existem no banco;
+3. o que sobrou é gravado com bulk_create de Pessoa e de Cliente, numa
+   transação por bloco. O bloco nunca passa do que cabe num único INSERT de
+   cada tabela no banco em uso (linhas_por_insert): no SQLite, com o limite de
+   999 parâmetros, são 83 clientes; no MySQL não há limite.
+
+Com classificar=True o modelo roda uma vez por bloco, antes do INSERT, e os
+clientes já nascem classificados (sem UPDATE depois). Sem ele, os clientes
+novos vão para a fila de classificação, como acontece no cadastro individual.
+
+Cada linha recebe um resultado: 'criado' com o pessoa_id, ou 'erro' com as
+mensagens no mesmo formato dos erros de validação do DRF. Linhas com erro não
+impedem a gravação das outras.
+"""
+import time
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .busca import indice_pessoas
+from .classificacao import prever
+from .jobs import agendar_reclassificacao
+from .models import Cliente, Pessoa
+from .serializers import ClienteCreateSerializer
+from .signals import alteracao_em_lote
+
+TAMANHO_LOTE_PADRAO = 500
+# Acima disso o pedido é recusado: o corpo inteiro fica na memória durante a validação.
+MAXIMO_LINHAS = 10000
+
+CRIADO = 'criado'
+ERRO = 'erro'
+
+
+def validar(linhas):
+    """
+    Valida cada linha e devolve (validos, resultados): validos é uma lista de
+    (posição, dados da pessoa) e resultados já traz os erros das inválidas.
+    """
+    serializer = ClienteCreateSerializer()
+    validos = []
+    resultados = [None] * len(linhas)
+    cpfs, emails = {}, {}
+    for posicao, linha in enumerate(linhas):
+        if not isinstance(linha, dict):
+            resultados[posicao] = erro(posicao, {'non_field_errors': ['Cada linha deve ser um objeto JSON.']})
+            continue
+        try:
+            dados = serializer.run_validation(linha)['pessoa']
+        except ValidationError as excecao:
+            resultados[posicao] = erro(posicao, excecao.detail)
+            continue
+
+        erros = {}
+        primeira = cpfs.setdefault(dados['cpf_cnpj'], posicao)
+        if primeira != posicao:
+            erros['cpf_cnpj'] = [f'CPF/CNPJ repetido no lote (linha {primeira + 1}).']
+        if dados.get('email'):
+            primeira = emails.setdefault(dados['email'].lower(), posicao)
+            if primeira != posicao:
+                erros['email'] = [f'E-mail repetido no lote (linha {primeira + 1}).']
+        if erros:
+            resultados[posicao] = erro(posicao, erros)
+        else:
+            validos.append((posicao, dados))
+    return validos, resultados
+
+
+def erro(posicao, erros):
+    return {'linha': posicao + 1, 'status': ERRO, 'erros': erros}
+
+
+def conflitos_no_banco(bloco):
+    """
+    {posição: erros} das linhas cujo CPF/CNPJ ou e-mail já está cadastrado,
+    descobertos com duas consultas para o bloco inteiro, um IN cada.
+    """
+    cpfs = [dados['cpf_cnpj'] for _, dados in bloco]
+    emails = list({dados['email'].lower() for _, dados in bloco if dados.get('email')})
+    existentes_cpf = dict(Pessoa.objects.filter(cpf_cnpj__in=cpfs).values_list('cpf_cnpj', 'pk'))
+    existentes_email = {}
+    if emails:
+        # E-mail não diferencia maiúsculas. Um email__in dependeria do collation
+        # (no SQLite, 'EXISTE@x.com' não acharia 'existe@x.com'); LOWER(email) IN
+        # (...) não depende, e usa o índice funcional usuarios_pessoa_email_lower.
+        existentes_email = dict(
+            Pessoa.objects.annotate(email_minusculo=Lower('email')).filter(email_minusculo__in=emails)
+            .values_list('email_minusculo', 'pk')
+        )
+
+    conflitos = {}
+    for posicao, dados in bloco:
+        erros = {}
+        if dados['cpf_cnpj'] in existentes_cpf:
+            erros['cpf_cnpj'] = [f'CPF/CNPJ já cadastrado (pessoa {existentes_cpf[dados["cpf_cnpj"]]}).']
+        if dados.get('email') and dados['email'].lower() in existentes_email:
+            erros['email'] = [f'E-mail já cadastrado (pessoa {existentes_email[dados["email"].lower()]}).']
+        if erros:
+            conflitos[posicao] = erros
+    return conflitos
+
+
+def gravar_bloco(bloco, modelo=None):
+    """
+    Grava as pessoas e os clientes de um bloco já sem conflitos e devolve
+    {posição: resultado}. Com `modelo`, os clientes já são gravados com a
+    classificação calculada a partir dos mesmos dados.
+    """
+    pessoas = [Pessoa(**dados) for _, dados in bloco]
+    previsoes = None
+    if modelo is not None:
+        previsoes = prever(modelo, [(pessoa.idade, pessoa.endereco, pessoa.lead_score) for pessoa in pessoas])
+
+    with transaction.atomic():
+        Pessoa.objects.bulk_create(pessoas)
+        # O bulk_create do MySQL não devolve os ids, então eles são lidos de novo pelo CPF.
+        ids = dict(Pessoa.objects.filter(cpf_cnpj__in=[pessoa.cpf_cnpj for pessoa in pessoas])
+                   .values_list('cpf_cnpj', 'pk'))
+        clientes = [Cliente(pessoa_id=ids[pessoa.cpf_cnpj]) for pessoa in pessoas]
+        if previsoes is not None:
+            agora = timezone.now()
+            for cliente, (classificacao, prob_alto) in zip(clientes, previsoes):
+                cliente.classificacao = classificacao
+                cliente.prob_alto = prob_alto
+                cliente.classificado_em = agora
+                cliente.modelo_versao = modelo.versao
+        Cliente.objects.bulk_create(clientes)
+
+        # O que os sinais de post_save fariam para cada um (ver usuarios/signals.py).
+        indice_pessoas.reindexar(ids.values())
+        if previsoes is None:
+            agendar_reclassificacao(list(ids.values()))
+
+    resultados = {}
+    for (posicao, _), cliente in zip(bloco, clientes):
+        resultado = {'linha': posicao + 1, 'status': CRIADO, 'pessoa_id': cliente.pessoa_id}
+        if previsoes is not None:
+            resultado.update(classificacao=cliente.get_classificacao_display(), prob_alto=cliente.prob_alto)
+        resultados[posicao] = resultado
+    return resultados
+
+
+def linhas_por_insert(quantidade):
+    """
+    Quantas das `quantidade` linhas cabem num único INSERT de Pessoa e de
+    Cliente neste banco. Acima disso o bulk_create quebraria o INSERT sozinho,
+    e o número de consultas do bloco passaria a depender do número de linhas.
+    """
+    return min(
+        connection.ops.bulk_batch_size(
+            [campo for campo in modelo._meta.concrete_fields if campo is not modelo._meta.auto_field],
+            [None] * quantidade,
+        )
+        for modelo in (Pessoa, Cliente)
+    )
+
+
+def cadastrar_clientes(linhas, tamanho_lote=TAMANHO_LOTE_PADRAO, modelo=None):
+    """
+    Cadastra as linhas (dicts com os campos do ClienteCreateSerializer) e
+    devolve um resumo com o resultado de cada uma, na ordem recebida.
+    Com `modelo` (um ModeloCarregado do ml_registry), já classifica os novos.
+    """
+    inicio = time.perf_counter()
+    validos, resultados = validar(linhas)
+    tamanho_lote = max(1, min(tamanho_lote, linhas_por_insert(tamanho_lote)))
+
+    lotes = 0
+    for comeco in range(0, len(validos), tamanho_lote):
+        bloco = validos[comeco:comeco + tamanho_lote]
+        lotes += 1
+        # Entre a checagem e o INSERT, outra requisição pode ter gravado o mesmo
+        # CPF. Nesse caso a transação do bloco é desfeita e os conflitos são
+        # checados de novo; na segunda falha o bloco inteiro fica com erro.
+        for tentativa in range(2):
+            conflitos = conflitos_no_banco(bloco)
+            for posicao, erros in conflitos.items():
+                resultados[posicao] = erro(posicao, erros)
+            bloco = [(posicao, dados) for posicao, dados in bloco if posicao not in conflitos]
+            try:
+                resultados_do_bloco = gravar_bloco(bloco, modelo) if bloco else {}
+                break
+            except IntegrityError as excecao:
+                if tentativa:
+                    resultados_do_bloco = {
+                        posicao: erro(posicao, {'non_field_errors': [f'Não foi possível gravar: {excecao}']})
+                        for posicao, _ in bloco
+                    }
+        for posicao, resultado in resultados_do_bloco.items():
+            resultados[posicao] = resultado
+
+    criados = sum(1 for resultado in resultados if resultado['status'] == CRIADO)
+    if criados:
+        # Total de leads e contagens por classificação mudaram (cache do dashboard).
+        alteracao_em_lote.send(sender=Cliente, campos=None)
+
+    return {
+        'total': len(linhas),
+        'criados': criados,
+        'erros': len(linhas) - criados,
+        'lotes': lotes,
+        'modelo_versao': modelo.versao if modelo is not None else None,
+        'tempo_segundos': round(time.perf_counter() - inicio, 3),
+        'resultados': resultados,
+    }
@@ -0,0 +1,141 @@
+# usuarios/classificacao.py
+"""
+Funções que aplicam o modelo de classificação de potencial aos clientes.
+
+Tanto o endpoint de um cliente só quanto a classificação em lote passam por
+aqui, para que os dados enviados ao modelo sejam montados sempre do mesmo jeito.
+"""
+import time
+from collections import Counter
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache_previsoes import cache_previsoes
+from .ml_registry import registro
+from .models import Cliente
+from .signals import alteracao_em_lote
+
+# Campos de Pessoa (vistos a partir de Cliente) que alimentam o modelo.
+CAMPOS_ENTRADA = ('pessoa__idade', 'pessoa__endereco', 'pessoa__lead_score')
+
+# Campos de Cliente gravados a cada classificação.
+CAMPOS_RESULTADO = ['classificacao', 'prob_alto', 'classificado_em', 'modelo_versao']
+
+TAMANHO_LOTE_PADRAO = 1000
+# Pedidos pela API com lotes maiores são reduzidos a este tamanho: cada lote
+# fica inteiro na memória (DataFrame + previsões) durante a requisição.
+TAMANHO_LOTE_MAXIMO = 5000
+
+
+def traduzir_previsao(previsao_numerica):
+    """O modelo devolve 0 ou 1; 1 significa potencial alto."""
+    if previsao_numerica == 1:
+        return Cliente.ClassificacaoCliente.ALTO_POTENCIAL
+    return Cliente.ClassificacaoCliente.POTENCIAL_PADRAO
+
+
+def traduzir_previsoes(previsoes):
+    """(classe numérica, prob_alto) -> (classificação, prob_alto)."""
+    return [(traduzir_previsao(classe), prob_alto) for classe, prob_alto in previsoes]
+
+
+def prever(modelo, linhas):
+    """
+    Classifica várias linhas de uma vez e devolve (classificação, prob_alto)
+    para cada uma. Combinações de entradas já vistas vêm do cache de
+    previsões; as novas passam juntas por um único predict_proba.
+    """
+    if not linhas:
+        return []
+    return traduzir_previsoes(cache_previsoes.prever(modelo, linhas))
+
+
+def agrupar_por_classificacao(ids, classificacoes):
+    """{classificacao: [ids]}: cada grupo de valores iguais vira um UPDATE só."""
+    grupos = {}
+    for pk, classificacao in zip(ids, classificacoes):
+        grupos.setdefault(classificacao, []).append(pk)
+    return grupos
+
+
+def gravar_classificacoes(ids, previsoes, modelo_versao):
+    """
+    Grava a classificação e a probabilidade de cada cliente, com a data e a
+    versão do modelo. Clientes com as mesmas entradas recebem o mesmo
+    resultado, então um UPDATE ... WHERE pk IN (...) por par (classificação,
+    prob_alto) ainda sai bem mais barato que o bulk_update, que monta um
+    CASE WHEN com uma linha para cada cliente.
+    """
+    agora = timezone.now()
+    for (classificacao, prob_alto), pks in agrupar_por_classificacao(ids, previsoes).items():
+        Cliente.objects.filter(pk__in=pks).update(
+            classificacao=classificacao, prob_alto=prob_alto, classificado_em=agora, modelo_versao=modelo_versao,
+        )
+
+
+def classificar_clientes(clientes, tamanho_lote=TAMANHO_LOTE_PADRAO, modelo=None):
+    """
+    Classifica todos os clientes do queryset, em lotes de `tamanho_lote`.
+
+    Cada lote é buscado pela chave primária (sem OFFSET), vira um único
+    DataFrame, passa por um único predict_proba e é gravado com um UPDATE por
+    resultado distinto.
+    Retorna um resumo com as contagens e o tempo gasto.
+    """
+    modelo = modelo or registro.obter()
+    inicio = time.perf_counter()
+    contagem = Counter()
+    total = lotes = 0
+
+    clientes = clientes.order_by('pk').values_list('pk', *CAMPOS_ENTRADA)
+    ultimo_pk = None
+    while True:
+        lote = clientes if ultimo_pk is None else clientes.filter(pk__gt=ultimo_pk)
+        lote = list(lote[:tamanho_lote])
+        if not lote:
+            break
+        ultimo_pk = lote[-1][0]
+
+        previsoes = prever(modelo, [linha[1:] for linha in lote])
+        gravar_classificacoes([linha[0] for linha in lote], previsoes, modelo.versao)
+
+        total += len(lote)
+        lotes += 1
+        contagem.update(classificacao for classificacao, _ in previsoes)
+
+    if total:
+        alteracao_em_lote.send(sender=Cliente, campos=CAMPOS_RESULTADO)
+
+    return {
+        'total': total,
+        'alto': contagem[Cliente.ClassificacaoCliente.ALTO_POTENCIAL],
+        'padrao': contagem[Cliente.ClassificacaoCliente.POTENCIAL_PADRAO],
+        'lotes': lotes,
+        'modelo_versao': modelo.versao,
+        'tempo_segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def desatualizados(clientes, modelo_versao):
+    """
+    Clientes nunca classificados, classificados por outra versão do modelo ou
+    ainda sem a probabilidade gravada (classificados antes de ela existir).
+    """
+    return clientes.filter(
+        Q(classificado_em__isnull=True) | Q(prob_alto__isnull=True) | ~Q(modelo_versao=modelo_versao)
+    )
+
+
+def linhas_dos_clientes():
+    """Todas as combinações distintas de entradas dos clientes atuais (uma consulta)."""
+    return Cliente.objects.values_list(*CAMPOS_ENTRADA).distinct()
+
+
+def precomputar_previsoes(modelo=None):
+    """
+    Enche o cache de previsões com todas as combinações de entradas que existem
+    hoje na base, numa única chamada ao modelo. Retorna quantas foram calculadas.
+    """
+    modelo = modelo or registro.obter()
+    return cache_previsoes.precomputar(modelo, linhas_dos_clientes())
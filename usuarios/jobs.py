@@ -0,0 +1,164 @@
+# usuarios/jobs.py
+"""
+Fila de classificação de clientes guardada no próprio banco (JobClassificacao).
+
+1. A API chama enfileirar(ids): um INSERT por lote, sem esperar o modelo.
+2. O comando processar_classificacoes reserva lotes de jobs pendentes com
+   SELECT ... FOR UPDATE SKIP LOCKED (no MySQL), então vários workers podem
+   rodar ao mesmo tempo sem pegar o mesmo job.
+3. Cada lote vira um único predict num processo filho; o processo principal
+   grava o resultado nos clientes e nos jobs.
+
+Um job que ficou em PROCESSANDO além do tempo limite (worker derrubado no
+meio do lote) volta a ser reservado pelo próximo worker.
+
+Quando idade, endereço ou lead_score de um cliente mudam, usuarios/signals.py
+chama agendar_reclassificacao: o cliente entra na fila com alguns segundos de
+espera, e edições seguidas só adiam o mesmo job.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dealerconnect_backend.apos_commit import LoteAposCommit
+from .classificacao import CAMPOS_ENTRADA, CAMPOS_RESULTADO, agrupar_por_classificacao, gravar_classificacoes, prever
+from .models import Cliente, JobClassificacao
+from .signals import alteracao_em_lote
+
+TAMANHO_LOTE_PADRAO = 500
+TEMPO_LIMITE_PADRAO = timedelta(minutes=10)
+
+Status = JobClassificacao.Status
+
+
+def enfileirar(clientes_ids, atraso=None, tamanho_lote=1000):
+    """
+    Cria um job pendente para cada cliente e devolve {cliente_id: job_id}.
+    Cliente que já tem um job pendente não ganha outro: o mesmo job é devolvido.
+
+    Com `atraso` (timedelta), o job só fica disponível depois desse tempo, e
+    um job pendente que já existia é adiado também. Assim, várias edições
+    seguidas do mesmo cliente viram uma reclassificação só (debounce).
+    """
+    ids = list(dict.fromkeys(clientes_ids))
+    executar_apos = timezone.now() + (atraso or timedelta(0))
+    jobs = {}
+    for inicio in range(0, len(ids), tamanho_lote):
+        lote = ids[inicio:inicio + tamanho_lote]
+        pendentes = JobClassificacao.objects.filter(cliente_id__in=lote, status=Status.PENDENTE)
+        ja_na_fila = set(pendentes.values_list('cliente_id', flat=True))
+        if atraso and ja_na_fila:
+            pendentes.filter(executar_apos__lt=executar_apos).update(executar_apos=executar_apos)
+        JobClassificacao.objects.bulk_create(
+            [JobClassificacao(cliente_id=cliente_id, executar_apos=executar_apos)
+             for cliente_id in lote if cliente_id not in ja_na_fila],
+            batch_size=tamanho_lote,
+        )
+        # O bulk_create do MySQL não devolve os ids, então eles são lidos de novo.
+        jobs.update(pendentes.order_by('id').values_list('cliente_id', 'id'))
+    return jobs
+
+
+def reservar(tamanho_lote=TAMANHO_LOTE_PADRAO, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """Marca até `tamanho_lote` jobs como PROCESSANDO e devolve os ids deles."""
+    agora = timezone.now()
+    disponiveis = (
+        Q(status=Status.PENDENTE, executar_apos__lte=agora)
+        | Q(status=Status.PROCESSANDO, iniciado_em__lt=agora - tempo_limite)
+    )
+    with transaction.atomic():
+        ids = list(
+            JobClassificacao.objects.filter(disponiveis)
+            .order_by('executar_apos', 'id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:tamanho_lote]
+        )
+        JobClassificacao.objects.filter(id__in=ids).update(status=Status.PROCESSANDO, iniciado_em=agora)
+    return ids
+
+
+def carregar_entradas(ids):
+    """Lista de (job_id, cliente_id, idade, endereco, lead_score) dos jobs."""
+    campos = [f'cliente__{campo}' for campo in CAMPOS_ENTRADA]
+    return list(JobClassificacao.objects.filter(id__in=ids).order_by('id').values_list('id', 'cliente_id', *campos))
+
+
+def gravar_resultados(entradas, previsoes, modelo_versao):
+    """
+    Grava a classificação e a probabilidade nos clientes e conclui os jobs,
+    tudo numa transação. `previsoes` são pares (classificação, prob_alto).
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        gravar_classificacoes([entrada[1] for entrada in entradas], previsoes, modelo_versao)
+        jobs_por_classe = agrupar_por_classificacao(
+            [entrada[0] for entrada in entradas], [classificacao for classificacao, _ in previsoes],
+        )
+        for classificacao, ids in jobs_por_classe.items():
+            JobClassificacao.objects.filter(id__in=ids).update(
+                status=Status.CONCLUIDO, concluido_em=agora, classificacao=classificacao, modelo_versao=modelo_versao,
+            )
+    if entradas:
+        alteracao_em_lote.send(sender=Cliente, campos=CAMPOS_RESULTADO)
+
+
+def marcar_erro(ids, mensagem):
+    JobClassificacao.objects.filter(id__in=ids).update(
+        status=Status.ERRO, concluido_em=timezone.now(), erro=str(mensagem)[:2000],
+    )
+
+
+def devolver(ids):
+    """Volta para a fila jobs reservados que não chegaram a ser processados."""
+    JobClassificacao.objects.filter(id__in=ids, status=Status.PROCESSANDO).update(
+        status=Status.PENDENTE, iniciado_em=None,
+    )
+
+
+def processar_lote(modelo, tamanho_lote=TAMANHO_LOTE_PADRAO, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """
+    Reserva e processa um lote no próprio processo, sem pool.
+    Retorna (quantos jobs foram processados, erro ou None); (0, None) quando a
+    fila está vazia. Como no worker com pool, um erro no predict marca os jobs
+    do lote como ERRO e não interrompe quem chamou: a fila segue andando.
+    """
+    ids = reservar(tamanho_lote, tempo_limite)
+    if not ids:
+        return 0, None
+    entradas = carregar_entradas(ids)
+    try:
+        previsoes = prever(modelo, [entrada[2:] for entrada in entradas])
+    except Exception as erro:
+        marcar_erro(ids, erro)
+        return len(ids), erro
+    gravar_resultados(entradas, previsoes, modelo.versao)
+    return len(ids), None
+
+
+# --- Reclassificação automática ----------------------------------------------
+
+def espera_reclassificacao():
+    return timedelta(seconds=getattr(settings, 'CLASSIFICACAO_ESPERA_SEGUNDOS', 5))
+
+
+def enfileirar_reclassificacao(ids):
+    # Só clientes viram job (a pessoa pode ser só um lead ou um vendedor).
+    clientes = Cliente.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    enfileirar(list(clientes), atraso=espera_reclassificacao())
+
+
+_reclassificacao = LoteAposCommit(enfileirar_reclassificacao)
+
+
+def agendar_reclassificacao(ids):
+    """
+    Junta os clientes cujas entradas do modelo mudaram dentro da transação
+    atual e os enfileira de uma vez, depois do commit (ver
+    dealerconnect_backend/apos_commit.py).
+    """
+    if not getattr(settings, 'CLASSIFICACAO_AUTOMATICA', True):
+        return
+    _reclassificacao.agendar(ids)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from usuarios.classificacao import classificar_clientes, desatualizados, TAMANHO_LOTE_PADRAO
+from usuarios.ml_registry import registro
+from usuarios.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Classifica o potencial de todos os clientes (ou de alguns) em lotes, usando o modelo de ML'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Classifica apenas os clientes com estes IDs.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                            help=f'Quantidade de clientes por predict/bulk_update (padrão: {TAMANHO_LOTE_PADRAO}).')
+        parser.add_argument('--somente-nao-classificados', action='store_true',
+                            help='Pula os clientes que já têm classificação.')
+        parser.add_argument('--desatualizados', action='store_true',
+                            help='Só os clientes nunca classificados ou classificados por outra versão do modelo.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+
+        clientes = Cliente.objects.all()
+        if options['ids']:
+            clientes = clientes.filter(pk__in=options['ids'])
+        if options['somente_nao_classificados']:
+            clientes = clientes.filter(classificacao=Cliente.ClassificacaoCliente.NAO_CLASSIFICADO)
+
+        try:
+            modelo = registro.obter()
+        except FileNotFoundError:
+            raise CommandError('Arquivo do modelo não encontrado.')
+        if options['desatualizados']:
+            clientes = desatualizados(clientes, modelo.versao)
+
+        self.stdout.write(f'Classificando clientes em lotes de {options["tamanho_lote"]}...')
+        resumo = classificar_clientes(clientes, tamanho_lote=options['tamanho_lote'], modelo=modelo)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumo["total"]} clientes classificados em {resumo["lotes"]} lotes '
+            f'({resumo["alto"]} potencial alto, {resumo["padrao"]} padrão) '
+            f'com o modelo {resumo["modelo_versao"]} em {resumo["tempo_segundos"]}s.'
+        ))
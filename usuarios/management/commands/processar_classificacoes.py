@@ -0,0 +1,152 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from usuarios import jobs, previsao_processo
+from usuarios.cache_previsoes import cache_previsoes
+from usuarios.classificacao import precomputar_previsoes, traduzir_previsoes
+from usuarios.ml_registry import registro
+
+
+class Command(BaseCommand):
+    help = ('Worker da fila de classificação: reserva lotes de jobs pendentes e faz o predict '
+            'num pool de processos, sem precisar de broker externo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Quantidade de processos filhos fazendo predict (0 = tudo no processo principal).')
+        parser.add_argument('--tamanho-lote', type=int, default=jobs.TAMANHO_LOTE_PADRAO,
+                            help=f'Jobs por lote/predict (padrão: {jobs.TAMANHO_LOTE_PADRAO}).')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia (padrão: 2).')
+        parser.add_argument('--tempo-limite', type=int, default=int(jobs.TEMPO_LIMITE_PADRAO.total_seconds()),
+                            help='Segundos em PROCESSANDO até um job ser considerado abandonado e voltar à fila.')
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Processa o que estiver na fila e termina, em vez de ficar esperando jobs novos.')
+        parser.add_argument('--precomputar', action='store_true',
+                            help='Ao iniciar (e a cada troca de modelo), calcula as previsões de todas as '
+                                 'combinações de entradas que existem na base.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+        if options['processos'] < 0:
+            raise CommandError('--processos não pode ser negativo.')
+
+        self.tamanho_lote = options['tamanho_lote']
+        self.tempo_limite = timedelta(seconds=options['tempo_limite'])
+        self.processos = options['processos']
+        self.precomputar = options['precomputar']
+        self.versao_precomputada = None
+        self.pool = None
+        self.versao_pool = None
+        # Jobs reservados por este worker e ainda não gravados; voltam para a
+        # fila se o worker for interrompido.
+        self.em_andamento = set()
+
+        self.stdout.write(f'Worker de classificação iniciado ({self.processos} processos, lotes de {self.tamanho_lote}).')
+        try:
+            while True:
+                try:
+                    modelo = registro.obter()
+                except FileNotFoundError:
+                    raise CommandError('Arquivo do modelo não encontrado.')
+                if self.precomputar and modelo.versao != self.versao_precomputada:
+                    calculadas = precomputar_previsoes(modelo)
+                    self.versao_precomputada = modelo.versao
+                    self.stdout.write(f'Cache de previsões: {calculadas} combinações calculadas (versão {modelo.versao}).')
+
+                processados = self.rodar_ciclo(modelo)
+                if processados:
+                    continue
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
+        finally:
+            if self.em_andamento:
+                jobs.devolver(self.em_andamento)
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+        self.stdout.write(self.style.SUCCESS('Worker encerrado.'))
+
+    def rodar_ciclo(self, modelo):
+        """Processa até um lote por processo filho. Retorna quantos jobs foram processados."""
+        if self.processos == 0:
+            total, erro = jobs.processar_lote(modelo, self.tamanho_lote, self.tempo_limite)
+            if erro is not None:
+                self.stderr.write(f'Erro ao classificar {total} jobs: {erro}')
+            elif total:
+                self.stdout.write(f'{total} jobs classificados.')
+            return total
+
+        pool = self.obter_pool(modelo)
+        lotes = []
+        for _ in range(self.processos):
+            ids = jobs.reservar(self.tamanho_lote, self.tempo_limite)
+            if not ids:
+                break
+            self.em_andamento.update(ids)
+            lotes.append(jobs.carregar_entradas(ids))
+        if not lotes:
+            return 0
+
+        inicio = time.perf_counter()
+        futuros = {}
+        total = erros = 0
+        for entradas in lotes:
+            linhas = [entrada[2:] for entrada in entradas]
+            # Combinações já vistas saem do cache; só as novas vão para os filhos,
+            # cada uma uma vez só.
+            encontrados, faltando = cache_previsoes.consultar(self.versao_pool, linhas)
+            novas = list(dict.fromkeys(linhas[posicao] for posicao in faltando))
+            if not novas:
+                total += self.gravar(entradas, [encontrados[posicao] for posicao in range(len(linhas))])
+                continue
+            # Os filhos só recebem as tuplas de entrada e devolvem (classe, prob); o banco fica aqui.
+            futuros[pool.submit(previsao_processo.prever, novas)] = (entradas, linhas, encontrados, novas)
+
+        for futuro in as_completed(futuros):
+            entradas, linhas, encontrados, novas = futuros[futuro]
+            ids = [entrada[0] for entrada in entradas]
+            try:
+                calculados = dict(zip(novas, futuro.result()))
+            except Exception as erro:
+                jobs.marcar_erro(ids, erro)
+                erros += len(ids)
+                self.em_andamento.difference_update(ids)
+                self.stderr.write(f'Erro ao classificar {len(ids)} jobs: {erro}')
+                continue
+            cache_previsoes.guardar(self.versao_pool, calculados.items())
+            total += self.gravar(entradas, [encontrados.get(posicao) or calculados[linha]
+                                            for posicao, linha in enumerate(linhas)])
+
+        self.stdout.write(f'{total} jobs classificados em {len(lotes)} lotes ({time.perf_counter() - inicio:.2f}s).')
+        # Jobs com erro também contam: a fila andou e o worker deve seguir para o próximo lote.
+        return total + erros
+
+    def gravar(self, entradas, previsoes):
+        jobs.gravar_resultados(entradas, traduzir_previsoes(previsoes), self.versao_pool)
+        self.em_andamento.difference_update(entrada[0] for entrada in entradas)
+        return len(entradas)
+
+    def obter_pool(self, modelo):
+        """Cria o pool na primeira vez e o recria se o arquivo do modelo mudar."""
+        if self.pool is not None and self.versao_pool == modelo.versao:
+            return self.pool
+        if self.pool is not None:
+            self.stdout.write(f'Modelo mudou para a versão {modelo.versao}; reiniciando os processos.')
+            self.pool.shutdown()
+        # Conexões abertas não devem ser herdadas pelos filhos criados com fork.
+        connections.close_all()
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.processos,
+            initializer=previsao_processo.iniciar,
+            initargs=(modelo.caminho,),
+        )
+        self.versao_pool = modelo.versao
+        return self.pool
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from produtos.busca import indice_veiculos
+from usuarios.busca import indice_pessoas
+
+
+class Command(BaseCommand):
+    help = 'Refaz os termos da busca de clientes e veículos (só grava o que mudou)'
+
+    def handle(self, *args, **options):
+        for nome, indice in [('pessoas', indice_pessoas), ('veículos', indice_veiculos)]:
+            inicio = time.perf_counter()
+            alterados = indice.reindexar()
+            self.stdout.write(self.style.SUCCESS(
+                f'{nome}: {alterados} reindexados em {time.perf_counter() - inicio:.2f}s.'
+            ))
@@ -0,0 +1,64 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from usuarios.treinamento import PROFUNDIDADES_PADRAO, TAMANHO_LOTE_PADRAO, promover, treinar_e_gravar
+
+
+class Command(BaseCommand):
+    help = ('Treina o modelo de classificação de clientes com os dados do banco, grava uma versão '
+            'em ml_models/ com as métricas e a promove a modelo ativo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                            help=f'Pessoas lidas do banco por consulta (padrão: {TAMANHO_LOTE_PADRAO}).')
+        parser.add_argument('--profundidades', nargs='+', type=int, default=list(PROFUNDIDADES_PADRAO),
+                            help='Profundidades da árvore testadas na validação cruzada.')
+        parser.add_argument('--folds', type=int, default=5, help='Número de folds da validação cruzada (padrão: 5).')
+        parser.add_argument('--n-jobs', type=int, default=-1,
+                            help='Processos usados na validação cruzada (padrão: -1, todos os núcleos).')
+        parser.add_argument('--nao-promover', action='store_true',
+                            help='Só grava a versão nova, sem trocar o modelo usado pela API.')
+        parser.add_argument('--min-f1', type=float,
+                            help='Não promove se o F1 médio da validação cruzada ficar abaixo deste valor.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] <= 0:
+            raise CommandError('--tamanho-lote deve ser um inteiro positivo.')
+        if options['folds'] < 2:
+            raise CommandError('--folds deve ser pelo menos 2.')
+
+        self.stdout.write('Treinando o modelo com os dados do banco...')
+        try:
+            resultado = treinar_e_gravar(
+                tamanho_lote=options['tamanho_lote'],
+                profundidades=options['profundidades'],
+                folds=options['folds'],
+                n_jobs=options['n_jobs'],
+                promover_modelo=False,
+            )
+        except ValueError as erro:
+            raise CommandError(str(erro))
+
+        validacao = resultado['metricas']['validacao_cruzada']
+        self.stdout.write(
+            f'{resultado["exemplos"]} exemplos ({resultado["positivos"]} com venda), '
+            f'max_depth={resultado["metricas"]["parametros"]["max_depth"]}, em {resultado["tempo_segundos"]["total"]}s.'
+        )
+        self.stdout.write(json.dumps(validacao, indent=2))
+        self.stdout.write(f'Versão {resultado["versao"]} gravada em {os.path.basename(resultado["arquivo"])}.')
+
+        f1 = validacao['f1']['media']
+        if options['nao_promover']:
+            return
+        if options['min_f1'] is not None and f1 < options['min_f1']:
+            self.stdout.write(self.style.WARNING(
+                f'F1 {f1} abaixo do mínimo {options["min_f1"]}: o modelo ativo não foi trocado.'
+            ))
+            return
+
+        promover(resultado['arquivo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Modelo {resultado["versao"]} promovido. Rode "classificar_clientes --desatualizados" '
+            '(ou processar_classificacoes) para reclassificar os clientes com ele.'
+        ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_cliente_classificacao_cliente_situacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['situacao'], name='usuarios_cl_situaca_19e124_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['classificacao'], name='usuarios_cl_classif_cb41ae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pessoa',
+            index=models.Index(fields=['nome'], name='usuarios_pe_nome_8921f6_idx'),
+        ),
+    ]
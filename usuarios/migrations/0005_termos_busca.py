@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def indexar(apps, schema_editor):
+    # Monta os termos de busca dos registros que já existem.
+    from dealerconnect_backend.busca import IndiceDeBusca
+    IndiceDeBusca(apps.get_model('usuarios', 'Pessoa'), apps.get_model('usuarios', 'PessoaTermo'), 'pessoa', ['nome']).reindexar()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_cliente_pessoa_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PessoaTermo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=50)),
+                ('posicao', models.PositiveSmallIntegerField(default=0)),
+                ('pessoa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='usuarios.pessoa')),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca (Pessoa)',
+                'verbose_name_plural': 'Termos de Busca (Pessoas)',
+                'indexes': [models.Index(fields=['termo', 'pessoa'], name='usuarios_pe_termo_3a43da_idx')],
+            },
+        ),
+        migrations.RunPython(indexar, migrations.RunPython.noop),
+    ]
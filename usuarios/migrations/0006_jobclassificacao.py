@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_termos_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobClassificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=12)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('classificacao', models.CharField(blank=True, choices=[('ALTO', 'Potencial Alto'), ('PADRAO', 'Potencial Padrão'), ('N/A', 'Não Classificado')], max_length=10)),
+                ('modelo_versao', models.CharField(blank=True, max_length=12)),
+                ('erro', models.TextField(blank=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs_classificacao', to='usuarios.cliente')),
+            ],
+            options={
+                'verbose_name': 'Job de Classificação',
+                'verbose_name_plural': 'Jobs de Classificação',
+                'indexes': [models.Index(fields=['status', 'id'], name='usuarios_jo_status_5fe1d3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_jobclassificacao'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='jobclassificacao',
+            name='usuarios_jo_status_5fe1d3_idx',
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='classificado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='modelo_versao',
+            field=models.CharField(blank=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='jobclassificacao',
+            name='executar_apos',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['modelo_versao'], name='usuarios_cl_modelo__41769a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobclassificacao',
+            index=models.Index(fields=['status', 'executar_apos'], name='usuarios_jo_status_907017_idx'),
+        ),
+    ]
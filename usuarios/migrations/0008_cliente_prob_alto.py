@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_cliente_classificado_em_job_executar_apos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='prob_alto',
+            field=models.FloatField(blank=True, null=True, verbose_name='Probabilidade de Potencial Alto'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-prob_alto', 'pessoa'], name='usuarios_cl_prob_alto_idx'),
+        ),
+    ]
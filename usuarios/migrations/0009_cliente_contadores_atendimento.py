@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_cliente_prob_alto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='qtd_atendimentos',
+            field=models.PositiveIntegerField(default=0, verbose_name='Atendimentos'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='ultimo_atendimento_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último Atendimento'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-ultimo_atendimento_em', 'pessoa'], name='usuarios_cl_ult_atend_idx'),
+        ),
+    ]
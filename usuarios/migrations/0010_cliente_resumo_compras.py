@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0003_termos_busca'),
+        ('usuarios', '0009_cliente_contadores_atendimento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='qtd_compras',
+            field=models.PositiveIntegerField(default=0, verbose_name='Compras'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='segmento_favorito',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtos.segmento', verbose_name='Segmento Favorito'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='ultima_compra_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Compra'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='valor_total_compras',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Total em Compras'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-ultima_compra_em', 'pessoa'], name='usuarios_cl_ult_compra_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-qtd_compras', 'pessoa'], name='usuarios_cl_qtd_compras_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-valor_total_compras', 'pessoa'], name='usuarios_cl_valor_compras_idx'),
+        ),
+    ]
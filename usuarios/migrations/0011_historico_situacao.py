@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0010_cliente_resumo_compras'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricoSituacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('situacao_anterior', models.CharField(choices=[('NOVO', 'Novo Contato'), ('NEGOCIANDO', 'Em Negociação'), ('VENDIDO', 'Venda Realizada'), ('PERDIDO', 'Perdido')], max_length=10)),
+                ('situacao_nova', models.CharField(choices=[('NOVO', 'Novo Contato'), ('NEGOCIANDO', 'Em Negociação'), ('VENDIDO', 'Venda Realizada'), ('PERDIDO', 'Perdido')], max_length=10)),
+                ('alterado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_situacao', to='usuarios.cliente')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Situação',
+                'verbose_name_plural': 'Históricos de Situação',
+                'indexes': [models.Index(fields=['cliente', '-alterado_em', '-id'], name='usuarios_hs_cliente_idx'), models.Index(fields=['alterado_em'], name='usuarios_hs_data_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0011_historico_situacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pessoa',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='usuarios_pessoa_email_lower'),
+        ),
+    ]
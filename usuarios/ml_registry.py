@@ -0,0 +1,158 @@
+# usuarios/ml_registry.py
+"""
+Registro dos modelos de Machine Learning usados pela API.
+
+Carregar o pipeline do scikit-learn com joblib.load é caro (o arquivo inteiro
+precisa ser lido e "despicklado"). Por isso cada processo (worker) mantém os
+modelos em memória e só volta a carregar o arquivo quando ele muda no disco:
+o mtime/tamanho é conferido a cada acesso (uma chamada de os.stat) e, se mudou,
+o conteúdo é lido, o hash calculado e o novo modelo entra no lugar do antigo
+sem precisar reiniciar o servidor.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+import joblib
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Nome (sem extensão) do arquivo do modelo de classificação de clientes.
+MODELO_CLASSIFICACAO = 'modelo_classificacao_cliente'
+
+
+@dataclass(frozen=True)
+class ModeloCarregado:
+    nome: str
+    caminho: str
+    pipeline: object = field(repr=False)
+    # Os 12 primeiros caracteres do SHA-256 do arquivo identificam a versão ativa.
+    versao: str
+    mtime_ns: int
+    tamanho: int
+    carregado_em: float
+    tempo_carga: float
+
+    def info(self):
+        """Resumo serializável do modelo, usado nos endpoints e nos logs."""
+        return {
+            'nome': self.nome,
+            'versao': self.versao,
+            'arquivo': os.path.basename(self.caminho),
+            'tamanho_bytes': self.tamanho,
+            'carregado_em': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.carregado_em)),
+            'tempo_carga_ms': round(self.tempo_carga * 1000, 2),
+        }
+
+
+class RegistroModelos:
+    """
+    Mantém um pipeline carregado por nome de modelo, dentro do processo atual.
+    """
+
+    def __init__(self, diretorio=None):
+        self._diretorio = diretorio
+        self._modelos = {}
+        self._lock = threading.Lock()
+
+    @property
+    def diretorio(self):
+        if self._diretorio:
+            return str(self._diretorio)
+        return str(getattr(settings, 'ML_MODELS_DIR', os.path.join(settings.BASE_DIR, 'ml_models')))
+
+    def caminho(self, nome=MODELO_CLASSIFICACAO):
+        return os.path.join(self.diretorio, f'{nome}.joblib')
+
+    def obter(self, nome=MODELO_CLASSIFICACAO):
+        """
+        Retorna o ModeloCarregado ativo, recarregando se o arquivo mudou.
+        Levanta FileNotFoundError se o arquivo do modelo não existir.
+        """
+        caminho = self.caminho(nome)
+        stat = os.stat(caminho)
+        atual = self._modelos.get(nome)
+        if self._atualizado(atual, caminho, stat):
+            return atual
+
+        # Só uma thread carrega o arquivo; as outras esperam e reaproveitam.
+        with self._lock:
+            atual = self._modelos.get(nome)
+            if self._atualizado(atual, caminho, stat):
+                return atual
+            novo = self._carregar(nome, caminho, atual)
+            self._modelos[nome] = novo
+            return novo
+
+    def pipeline(self, nome=MODELO_CLASSIFICACAO):
+        return self.obter(nome).pipeline
+
+    def info(self):
+        return [modelo.info() for modelo in self._modelos.values()]
+
+    def limpar(self):
+        with self._lock:
+            self._modelos.clear()
+
+    @staticmethod
+    def _atualizado(modelo, caminho, stat):
+        return (
+            modelo is not None
+            and modelo.caminho == caminho
+            and modelo.mtime_ns == stat.st_mtime_ns
+            and modelo.tamanho == stat.st_size
+        )
+
+    def _carregar(self, nome, caminho, atual):
+        inicio = time.perf_counter()
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        # O stat é refeito após a leitura para não registrar o mtime de uma
+        # versão anterior caso o arquivo seja trocado no meio do caminho.
+        stat = os.stat(caminho)
+        versao = hashlib.sha256(conteudo).hexdigest()[:12]
+
+        if atual is not None and atual.versao == versao:
+            # O arquivo foi "tocado" ou copiado por cima, mas o conteúdo é o mesmo.
+            return replace(atual, caminho=caminho, mtime_ns=stat.st_mtime_ns, tamanho=stat.st_size)
+
+        pipeline = joblib.load(io.BytesIO(conteudo))
+        tempo_carga = time.perf_counter() - inicio
+        modelo = ModeloCarregado(
+            nome=nome,
+            caminho=caminho,
+            pipeline=pipeline,
+            versao=versao,
+            mtime_ns=stat.st_mtime_ns,
+            tamanho=stat.st_size,
+            carregado_em=time.time(),
+            tempo_carga=tempo_carga,
+        )
+        if atual is None:
+            logger.info('Modelo %s carregado (versão %s) em %.1f ms.', nome, versao, tempo_carga * 1000)
+        else:
+            logger.info('Modelo %s trocado: versão %s -> %s (%.1f ms).', nome, atual.versao, versao, tempo_carga * 1000)
+        return modelo
+
+
+# Instância única por processo.
+registro = RegistroModelos()
+
+
+def precarregar():
+    """
+    Deixa o modelo de classificação na memória do processo que vai servir a
+    API, para que o primeiro POST em /classificar/ não pague o joblib.load.
+    Chamado pelo wsgi.py e pelo asgi.py (o runserver também passa pelo wsgi.py).
+    """
+    if not getattr(settings, 'ML_PRECARREGAR_MODELOS', True):
+        return
+    try:
+        registro.obter()
+    except FileNotFoundError:
+        logger.warning('Modelo de classificação não encontrado em %s.', registro.caminho())
@@ -1,5 +1,7 @@
 # usuarios/models.py
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 class Pessoa(models.Model):
     nome = models.CharField(max_length=150)
@@ -19,6 +21,12 @@ class Pessoa(models.Model):
     class Meta:
         verbose_name = "Pessoa"
         verbose_name_plural = "Pessoas"
+        indexes = [
+            # Listagem de clientes em ordem alfabética e busca de vendedores por nome na importação.
+            models.Index(fields=['nome']),
+            # E-mail já cadastrado, sem diferenciar maiúsculas (cadastro em lote).
+            models.Index(Lower('email'), name='usuarios_pessoa_email_lower'),
+        ]
 
 class Cliente(models.Model):
     # Classe interna para as opções de Situação do Atendimento
@@ -53,7 +61,53 @@ class Cliente(models.Model):
         default=SituacaoAtendimento.NOVO_CONTATO,
         verbose_name="Situação do Atendimento"
     )
+
+    # Quando e com qual versão do modelo (hash do arquivo, ver ml_registry.py)
+    # a classificação foi calculada. Clientes nunca classificados ou
+    # classificados por um modelo antigo são achados por aqui, sem recalcular nada.
+    classificado_em = models.DateTimeField(null=True, blank=True)
+    modelo_versao = models.CharField(max_length=12, blank=True)
+
+    # Probabilidade de potencial alto (predict_proba do modelo), de 0 a 1.
+    # Serve para ordenar os clientes do mais para o menos promissor; fica
+    # vazia enquanto o cliente não é classificado.
+    prob_alto = models.FloatField(null=True, blank=True, verbose_name="Probabilidade de Potencial Alto")
+
+    # Contadores dos atendimentos do cliente, mantidos por operacoes/atendimentos.py.
+    # Com eles a listagem ordena por "último contato" sem agregar os
+    # atendimentos de cada cliente a cada página.
+    qtd_atendimentos = models.PositiveIntegerField(default=0, verbose_name="Atendimentos")
+    ultimo_atendimento_em = models.DateTimeField(null=True, blank=True, verbose_name="Último Atendimento")
+
+    # Resumo das compras do cliente, mantido por operacoes/compras.py a cada
+    # venda criada, alterada ou apagada. A listagem ordena e filtra por estas
+    # colunas em vez de juntar e agregar as vendas de cada cliente da página.
+    qtd_compras = models.PositiveIntegerField(default=0, verbose_name="Compras")
+    ultima_compra_em = models.DateTimeField(null=True, blank=True, verbose_name="Última Compra")
+    valor_total_compras = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Valor Total em Compras")
+    # Segmento em que o cliente mais comprou (no empate, o da compra mais recente).
+    segmento_favorito = models.ForeignKey(
+        'produtos.Segmento', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        verbose_name="Segmento Favorito",
+    )
     
+    class Meta:
+        indexes = [
+            # O dashboard agrupa e conta os clientes por situação e por classificação.
+            models.Index(fields=['situacao']),
+            models.Index(fields=['classificacao']),
+            models.Index(fields=['modelo_versao']),
+            # Ranking de leads (?ordering=-prob_alto&min_prob=0.7): o filtro e a
+            # ordem da paginação por cursor saem do mesmo índice.
+            models.Index(fields=['-prob_alto', 'pessoa'], name='usuarios_cl_prob_alto_idx'),
+            # ?ordering=-ultimo_atendimento_em: clientes contatados mais recentemente primeiro.
+            models.Index(fields=['-ultimo_atendimento_em', 'pessoa'], name='usuarios_cl_ult_atend_idx'),
+            # ?ordering= pelos campos do resumo de compras (e os filtros ?min_compras= / ?min_valor=).
+            models.Index(fields=['-ultima_compra_em', 'pessoa'], name='usuarios_cl_ult_compra_idx'),
+            models.Index(fields=['-qtd_compras', 'pessoa'], name='usuarios_cl_qtd_compras_idx'),
+            models.Index(fields=['-valor_total_compras', 'pessoa'], name='usuarios_cl_valor_compras_idx'),
+        ]
+
     @property
     def nome(self):
         return self.pessoa.nome
@@ -61,6 +115,30 @@ class Cliente(models.Model):
     def __str__(self):
         return self.pessoa.nome
 
+class HistoricoSituacao(models.Model):
+    """
+    Cada mudança de situação de um cliente, gravada junto com a própria
+    mudança (ver usuarios/situacao.py). A tabela só recebe inserções: o tempo
+    que os clientes passam em cada etapa sai daqui.
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='historico_situacao')
+    situacao_anterior = models.CharField(max_length=10, choices=Cliente.SituacaoAtendimento.choices)
+    situacao_nova = models.CharField(max_length=10, choices=Cliente.SituacaoAtendimento.choices)
+    alterado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Histórico de Situação"
+        verbose_name_plural = "Históricos de Situação"
+        indexes = [
+            # Histórico de um cliente, do mais recente para o mais antigo.
+            models.Index(fields=['cliente', '-alterado_em', '-id'], name='usuarios_hs_cliente_idx'),
+            # Mudanças de um período (tempos por etapa no dashboard).
+            models.Index(fields=['alterado_em'], name='usuarios_hs_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cliente {self.cliente_id}: {self.situacao_anterior} -> {self.situacao_nova}"
+
 class Usuario(models.Model):
     class Perfil(models.TextChoices):
         ADMIN = 'ADMIN', 'Administrador'
@@ -81,4 +159,61 @@ class Usuario(models.Model):
         return self.pessoa.nome
 
     def __str__(self):
-        return self.pessoa.nome
\ No newline at end of file
+        return self.pessoa.nome
+
+class PessoaTermo(models.Model):
+    """
+    Palavras normalizadas (sem acento, minúsculas) do nome de cada pessoa,
+    usadas pela busca de clientes. Mantida por dealerconnect_backend/busca.py.
+    """
+    pessoa = models.ForeignKey(Pessoa, on_delete=models.CASCADE, related_name='termos_busca')
+    termo = models.CharField(max_length=50)
+    # Posição da palavra no nome (0 = primeiro nome), usada na relevância.
+    posicao = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Termo de Busca (Pessoa)"
+        verbose_name_plural = "Termos de Busca (Pessoas)"
+        indexes = [
+            models.Index(fields=['termo', 'pessoa']),
+        ]
+
+    def __str__(self):
+        return self.termo
+
+
+class JobClassificacao(models.Model):
+    """
+    Pedido de classificação de um cliente, processado fora da requisição pelo
+    comando processar_classificacoes (ver usuarios/jobs.py). A própria tabela
+    faz o papel de fila, então não é preciso nenhum broker externo.
+    """
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='jobs_classificacao')
+    status = models.CharField(max_length=12, choices=Status.choices, default=Status.PENDENTE)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    # O job só pode ser pego pelo worker a partir deste momento. Reclassificações
+    # automáticas esperam alguns segundos, para juntar várias edições seguidas.
+    executar_apos = models.DateTimeField(default=timezone.now)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    # Resultado: a classificação gravada no cliente e a versão do modelo que a calculou.
+    classificacao = models.CharField(max_length=10, choices=Cliente.ClassificacaoCliente.choices, blank=True)
+    modelo_versao = models.CharField(max_length=12, blank=True)
+    erro = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Job de Classificação"
+        verbose_name_plural = "Jobs de Classificação"
+        indexes = [
+            # O worker pega os pendentes já liberados, dos mais antigos para os mais novos.
+            models.Index(fields=['status', 'executar_apos']),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} - cliente {self.cliente_id} ({self.status})"
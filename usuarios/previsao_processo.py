@@ -0,0 +1,45 @@
+# usuarios/previsao_processo.py
+"""
+Montagem dos dados e chamada do modelo, sem nada do Django.
+
+Este módulo roda também dentro dos processos filhos do worker de
+classificação. Os filhos só fazem a parte pesada de CPU (o predict_proba do
+scikit-learn); leitura e escrita no banco ficam no processo principal. Por isso
+aqui não se importa nada do Django: o processo filho pode ter sido iniciado do
+zero (spawn/forkserver), sem settings nem apps carregados.
+"""
+import joblib
+import numpy as np
+import pandas as pd
+
+# Colunas exatamente como o pipeline foi treinado no Colab.
+COLUNAS_MODELO = ['Idade', 'Municipio', 'lead_score']
+
+_pipeline = None
+
+
+def montar_dados(linhas):
+    """
+    Recebe tuplas (idade, endereco, lead_score) e monta o DataFrame
+    no formato que o modelo espera.
+    """
+    return pd.DataFrame(list(linhas), columns=COLUNAS_MODELO)
+
+
+def calcular(pipeline, linhas):
+    """(classe, prob_alto) de cada linha, com uma única chamada ao predict_proba."""
+    probabilidades = pipeline.predict_proba(montar_dados(linhas))
+    coluna_alto = list(pipeline.classes_).index(1)
+    vencedoras = np.asarray(pipeline.classes_)[probabilidades.argmax(axis=1)]
+    return [(int(classe), float(linha[coluna_alto])) for classe, linha in zip(vencedoras, probabilidades)]
+
+
+def iniciar(caminho):
+    """Initializer do ProcessPoolExecutor: carrega o modelo uma vez por processo."""
+    global _pipeline
+    _pipeline = joblib.load(caminho)
+
+
+def prever(linhas):
+    """Versão de calcular() para os processos filhos, com o modelo carregado no iniciar()."""
+    return calcular(_pipeline, linhas)
@@ -1,14 +1,23 @@
 from rest_framework import serializers
-from .models import Pessoa, Cliente, Usuario
+from dealerconnect_backend.api import CamposDinamicosMixin
+from produtos.serializers import SegmentoSerializer
+from .models import Pessoa, Cliente, Usuario, JobClassificacao
 
 class PessoaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pessoa
         fields = ['id', 'nome', 'cpf_cnpj', 'email', 'telefone', 'endereco', 'idade', 'lead_score']
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     # Usamos o PessoaSerializer para aninhar os dados da pessoa dentro do cliente
+    # (com ?expand= sem 'pessoa', ela aparece só como ID)
     pessoa = PessoaSerializer(read_only=True)
+    # O segmento favorito vem como ID; com ?expand=pessoa,segmento_favorito vem com o nome.
+    campos_expansiveis = {
+        'pessoa': (PessoaSerializer, 'pessoa'),
+        'segmento_favorito': (SegmentoSerializer, 'segmento_favorito'),
+    }
+    expandir_padrao = ('pessoa',)
     classificacao = serializers.CharField(source='get_classificacao_display', read_only=True)
     # Adicionamos o 'get_situacao_display' para mostrar o texto amigável
     situacao = serializers.CharField(source='get_situacao_display', read_only=True)
@@ -17,7 +26,16 @@ class ClienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cliente
         # O ID do cliente é o mesmo da pessoa, então usamos 'pessoa_id'
-        fields = ['pessoa_id', 'pessoa', 'classificacao', 'situacao']
+        fields = ['pessoa_id', 'pessoa', 'classificacao', 'prob_alto', 'situacao', 'classificado_em', 'modelo_versao',
+                  'qtd_atendimentos', 'ultimo_atendimento_em',
+                  'qtd_compras', 'ultima_compra_em', 'valor_total_compras', 'segmento_favorito']
+        # Mantidos pelos atendimentos e pelas vendas (operacoes/atendimentos.py e
+        # operacoes/compras.py), não pela API de clientes. O resultado da
+        # classificação só sai do modelo: o prob_alto ordena a lista de leads
+        # mais promissores, e data/versão decidem quem está desatualizado.
+        read_only_fields = ['prob_alto', 'classificado_em', 'modelo_versao',
+                            'qtd_atendimentos', 'ultimo_atendimento_em',
+                            'qtd_compras', 'ultima_compra_em', 'valor_total_compras', 'segmento_favorito']
 
 class UsuarioSerializer(serializers.ModelSerializer):
     pessoa = PessoaSerializer(read_only=True)
@@ -43,6 +61,11 @@ class ClienteCreateSerializer(serializers.ModelSerializer):
         # Os campos que este serializer vai "entender"
         fields = ['nome', 'cpf_cnpj', 'email', 'telefone', 'endereco', 'idade', 'lead_score']
 
+    def validate_email(self, valor):
+        # O e-mail é único no banco: vazio vira NULL, senão o segundo cliente
+        # sem e-mail já esbarraria no primeiro.
+        return valor or None
+
     def create(self, validated_data):
         """
         Esta é a função mágica. Quando a API recebe os dados, esta função é chamada.
@@ -52,4 +75,14 @@ class ClienteCreateSerializer(serializers.ModelSerializer):
         pessoa_data = validated_data.pop('pessoa')
         pessoa = Pessoa.objects.create(**pessoa_data)
         cliente = Cliente.objects.create(pessoa=pessoa, **validated_data)
-        return cliente
\ No newline at end of file
+        return cliente
+
+
+class JobClassificacaoSerializer(serializers.ModelSerializer):
+    # Mostra o texto amigável da classificação calculada pelo job.
+    classificacao = serializers.CharField(source='get_classificacao_display', read_only=True)
+
+    class Meta:
+        model = JobClassificacao
+        fields = ['id', 'cliente', 'status', 'criado_em', 'iniciado_em', 'concluido_em',
+                  'classificacao', 'modelo_versao', 'erro']
@@ -0,0 +1,95 @@
+# usuarios/signals.py
+from django.db import transaction
+from django.dispatch import Signal
+
+# Operações em lote (bulk_create, bulk_update, queryset.update) não disparam
+# post_save/post_delete. Quem altera muitas linhas de uma vez envia este sinal,
+# para que caches e resumos que dependem dessas tabelas possam se atualizar.
+# Argumentos: sender=<classe do model>, campos=<lista de campos alterados ou None>
+# e, opcionalmente, alterados={pk: conjunto de campos que mudaram naquela linha}
+# e inseridos=[pks das linhas novas] (quando quem envia sabe exatamente o que
+# mudou, ex.: a sincronização da importação). Exclusões mandam apagados=[pks]
+# (ver avisar_exclusao).
+alteracao_em_lote = Signal()
+
+
+def avisar_exclusao(modelo, ids=()):
+    """
+    Pessoa e Cliente não têm receptores de post_delete: com um, o Django
+    deixa de apagar as cascatas com um DELETE ... WHERE e passa a carregar
+    cada linha inteira para disparar o sinal, uma por uma. Quem apaga (API,
+    admin, popular_banco) avisa por aqui, uma vez, depois de apagar; `ids`
+    pode ficar vazio quando a tabela inteira foi limpa.
+
+    O aviso sai depois do commit: antes dele, uma leitura do dashboard ao
+    mesmo tempo ainda veria as linhas e guardaria no cache as contagens velhas.
+    """
+    ids = list(ids)
+    transaction.on_commit(lambda: alteracao_em_lote.send(sender=modelo, campos=None, apagados=ids))
+
+
+# --- Receptores ---------------------------------------------------------------
+# Ficam abaixo da definição do sinal porque os módulos importados aqui também
+# importam alteracao_em_lote deste arquivo.
+from django.db.models.signals import post_save, pre_save  # noqa: E402
+from django.dispatch import receiver  # noqa: E402
+
+from .busca import indice_pessoas  # noqa: E402
+from .jobs import agendar_reclassificacao  # noqa: E402
+from .models import Cliente, Pessoa  # noqa: E402
+
+# Campos de Pessoa que entram no modelo de classificação (ver classificacao.CAMPOS_ENTRADA).
+CAMPOS_DO_MODELO = ('idade', 'endereco', 'lead_score')
+
+
+@receiver(pre_save, sender=Pessoa)
+def guardar_entradas_anteriores(sender, instance, update_fields=None, **kwargs):
+    # Os valores anteriores das entradas do modelo são lidos do banco só no
+    # save, e só dos campos que vão mesmo ser gravados: uma consulta por
+    # edição, em vez de uma fotografia (post_init) de cada Pessoa montada nas
+    # listagens, exportações e importações, que quase nunca são salvas.
+    # Lê o __dict__ para não disparar consultas de campos adiados (.only()/.defer()).
+    instance._entradas_anteriores = {}
+    if instance._state.adding:
+        return
+    campos = [
+        campo for campo in CAMPOS_DO_MODELO
+        if campo in instance.__dict__ and (update_fields is None or campo in update_fields)
+    ]
+    if campos:
+        instance._entradas_anteriores = Pessoa.objects.filter(pk=instance.pk).values(*campos).first() or {}
+
+
+def entradas_mudaram(instance):
+    anteriores = getattr(instance, '_entradas_anteriores', {})
+    return any(instance.__dict__[campo] != valor for campo, valor in anteriores.items())
+
+
+@receiver(post_save, sender=Pessoa)
+def pessoa_salva(sender, instance, created, update_fields=None, **kwargs):
+    # Mantém os termos de busca do nome em dia (apagar a pessoa já apaga os termos, em cascata).
+    if created or indice_pessoas.campos_afetados(update_fields):
+        indice_pessoas.reindexar([instance.pk])
+    # Idade, endereço ou lead_score mudaram: a classificação do cliente ficou velha.
+    # (Uma pessoa recém-criada ainda não é cliente; ver cliente_salvo.)
+    if not created and entradas_mudaram(instance):
+        agendar_reclassificacao([instance.pk])
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_salvo(sender, instance, created, **kwargs):
+    # Cliente novo entra na fila para receber a primeira classificação.
+    if created:
+        agendar_reclassificacao([instance.pk])
+
+
+@receiver(alteracao_em_lote, sender=Pessoa)
+def pessoas_alteradas_em_lote(sender, campos=None, alterados=None, inseridos=None, apagados=None, **kwargs):
+    # Os termos de quem foi apagado já saíram em cascata.
+    if apagados is None:
+        indice_pessoas.reindexar_alteracao(campos, alterados, inseridos)
+    # Só quem teve uma entrada do modelo alterada é reclassificado.
+    if alterados:
+        agendar_reclassificacao(
+            [pk for pk, campos_da_linha in alterados.items() if set(campos_da_linha) & set(CAMPOS_DO_MODELO)]
+        )
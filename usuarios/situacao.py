@@ -0,0 +1,82 @@
+# usuarios/situacao.py
+"""
+Mudança da situação dos clientes (NOVO -> NEGOCIANDO -> VENDIDO/PERDIDO)
+com o histórico gravado na mesma transação.
+
+- um cliente (PATCH /api/clientes/<id>/atualizar_situacao/): save com
+  update_fields=['situacao'] e uma linha em HistoricoSituacao;
+- vários (PATCH /api/clientes/situacao-lote/): por bloco de ids, um SELECT
+  ... FOR UPDATE para saber a situação anterior, um UPDATE ... WHERE pk IN e
+  um bulk_create do histórico.
+
+Clientes que já estão na situação pedida não são gravados nem entram no
+histórico.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cliente, HistoricoSituacao
+from .signals import alteracao_em_lote
+
+TAMANHO_LOTE_PADRAO = 1000
+# Acima disso o pedido é recusado, como no cadastro em lote.
+MAXIMO_IDS = 10000
+
+# Montado uma vez só; antes a lista de opções era refeita a cada PATCH.
+SITUACOES = frozenset(Cliente.SituacaoAtendimento.values)
+
+
+def situacao_valida(valor):
+    # O corpo do PATCH é JSON: uma lista ou um objeto no lugar do texto não pode quebrar o "in".
+    return isinstance(valor, str) and valor in SITUACOES
+
+
+def mudar_situacao(cliente, nova_situacao):
+    """Muda a situação de um cliente e registra no histórico. Retorna se algo mudou."""
+    with transaction.atomic():
+        # Relê a situação com o registro travado: duas mudanças ao mesmo tempo
+        # não gravam a mesma "situação anterior" no histórico.
+        anterior = Cliente.objects.select_for_update().filter(pk=cliente.pk).values_list('situacao', flat=True).get()
+        cliente.situacao = nova_situacao
+        if anterior == nova_situacao:
+            return False
+        # Só a situação: um save() completo regravaria os contadores de
+        # atendimento lidos antes, desfazendo um atendimento registrado no meio.
+        cliente.save(update_fields=['situacao'])
+        HistoricoSituacao.objects.create(cliente=cliente, situacao_anterior=anterior, situacao_nova=nova_situacao)
+    return True
+
+
+def mudar_situacao_em_lote(ids, nova_situacao, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Move os clientes de `ids` para `nova_situacao`, uma transação por bloco.
+    Devolve um resumo com quantos mudaram e os ids que não existem.
+    """
+    ids = list(dict.fromkeys(ids))
+    agora = timezone.now()
+    alterados, encontrados = 0, set()
+    for inicio in range(0, len(ids), tamanho_lote):
+        bloco = ids[inicio:inicio + tamanho_lote]
+        with transaction.atomic():
+            atuais = dict(Cliente.objects.select_for_update().filter(pk__in=bloco).values_list('pk', 'situacao'))
+            encontrados.update(atuais)
+            mudar = [pk for pk, situacao in atuais.items() if situacao != nova_situacao]
+            if not mudar:
+                continue
+            Cliente.objects.filter(pk__in=mudar).update(situacao=nova_situacao)
+            HistoricoSituacao.objects.bulk_create(
+                HistoricoSituacao(cliente_id=pk, situacao_anterior=atuais[pk], situacao_nova=nova_situacao,
+                                  alterado_em=agora)
+                for pk in mudar
+            )
+            alterados += len(mudar)
+    if alterados:
+        # O update() não dispara post_save; o dashboard fica sabendo por aqui.
+        alteracao_em_lote.send(sender=Cliente, campos=['situacao'])
+
+    return {
+        'total': len(ids),
+        'alterados': alterados,
+        'inalterados': len(encontrados) - alterados,
+        'nao_encontrados': [pk for pk in ids if pk not in encontrados],
+    }
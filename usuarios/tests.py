@@ -1,3 +1,563 @@
-from django.test import TestCase
+import base64
+import json
+from dataclasses import replace
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from dealerconnect_backend.busca import termos_do_texto
+from dealerconnect_backend.guarda_consultas import SemNMaisUmMixin
+from operacoes.importacao import sincronizar
+from . import jobs
+from .busca import indice_pessoas
+from .ml_registry import precarregar, registro
+from .models import Cliente, HistoricoSituacao, JobClassificacao, Pessoa, Usuario
+
+
+class ConsultasPorLinhaTests(SemNMaisUmMixin, TestCase):
+    """
+    A quantidade de consultas das listagens de clientes não pode depender do
+    tamanho da página. Se alguém tirar um select_related ou adicionar ao
+    serializer um campo que lê outra tabela, o teste mostra o SQL repetido.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(
+            Pessoa(nome=f'PESSOA {i:02d}', cpf_cnpj=f'{i:011d}', idade=30, lead_score=5) for i in range(40)
+        )
+        pessoas = list(Pessoa.objects.order_by('id'))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in pessoas[:30])
+        Usuario.objects.bulk_create(
+            Usuario(pessoa=pessoa, senha_hash='x', perfil=Usuario.Perfil.VENDEDOR) for pessoa in pessoas[30:]
+        )
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def test_listagem_de_clientes(self):
+        self.assertConsultasNaoCrescem('/api/clientes/', client=self.api)
+        self.assertConsultasNaoCrescem('/api/clientes/?expand=', client=self.api)
+        self.assertConsultasNaoCrescem('/api/clientes/?search=pessoa', client=self.api)
+        self.assertConsultasNaoCrescem('/api/clientes/?ordering=-prob_alto', client=self.api)
+
+    def test_exportacao_de_clientes(self):
+        with self.assertSemNMaisUm():
+            resposta = self.api.get('/api/clientes/export/?formato=ndjson')
+            b''.join(resposta.streaming_content)
+
+    def test_listagens_do_admin(self):
+        self.client.force_login(self.admin)
+        for url in ('/admin/usuarios/pessoa/', '/admin/usuarios/cliente/', '/admin/usuarios/usuario/'):
+            with self.subTest(url=url), self.assertSemNMaisUm(descricao=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PaginacaoPorCursorTests(TestCase):
+    """A paginação por cursor (dealerconnect_backend/paginacao.py), pela listagem de clientes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i % 7}', cpf_cnpj=f'{i:011d}') for i in range(23))
+        # Probabilidades repetidas (empates no primeiro campo) e um terço sem classificação (NULL).
+        Cliente.objects.bulk_create(
+            Cliente(pessoa=pessoa, prob_alto=None if i % 3 == 0 else (i % 4) / 4)
+            for i, pessoa in enumerate(Pessoa.objects.order_by('id'))
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def percorrer(self, url, link='next'):
+        """Segue os links a partir de `url` e devolve as páginas (listas de pessoa_id) na ordem visitada."""
+        paginas = []
+        while url:
+            resposta = self.api.get(url)
+            self.assertEqual(resposta.status_code, 200, url)
+            paginas.append([cliente['pessoa_id'] for cliente in resposta.json()['results']])
+            url = resposta.json()[link]
+        return paginas
+
+    def esperado(self, chave):
+        return [cliente.pk for cliente in sorted(Cliente.objects.select_related('pessoa'), key=chave)]
+
+    def test_ida_e_volta(self):
+        paginas = self.percorrer('/api/clientes/?page_size=4&fields=pessoa_id')
+        self.assertEqual(sum(paginas, []), self.esperado(lambda cliente: (cliente.pessoa.nome, cliente.pk)))
+        self.assertEqual([len(pagina) for pagina in paginas], [4, 4, 4, 4, 4, 3])
+
+        # Voltando pelos links "previous" a partir da última página, as mesmas páginas em ordem inversa.
+        ultima = self.api.get('/api/clientes/?page_size=4&fields=pessoa_id')
+        while ultima.json()['next']:
+            ultima = self.api.get(ultima.json()['next'])
+        self.assertEqual(self.percorrer(ultima.json()['previous'], link='previous'), paginas[-2::-1])
+
+    def test_ordenacao_por_campo_que_aceita_nulo(self):
+        # Os nulos valem menos que qualquer valor: no fim em ordem decrescente, no começo em crescente.
+        def decrescente(cliente):
+            return (cliente.prob_alto is None, -(cliente.prob_alto or 0), cliente.pk)
+
+        def crescente(cliente):
+            return (cliente.prob_alto is not None, cliente.prob_alto or 0, cliente.pk)
+
+        for ordenacao, chave in (('-prob_alto', decrescente), ('prob_alto', crescente)):
+            with self.subTest(ordenacao=ordenacao):
+                paginas = self.percorrer(f'/api/clientes/?ordering={ordenacao}&page_size=5&fields=pessoa_id')
+                self.assertEqual(sum(paginas, []), self.esperado(chave))
+
+    def test_cursor_adulterado(self):
+        for posicao in ('nao-json', '["1"]', '["abc", "1"]', '[["x"], "1"]'):
+            with self.subTest(posicao=posicao):
+                cursor = base64.b64encode(urlencode({'p': posicao}).encode()).decode()
+                resposta = self.api.get(f'/api/clientes/?ordering=-prob_alto&cursor={cursor}')
+                self.assertEqual(resposta.status_code, 404)
+
+
+class BuscaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, nome in enumerate(['José da Silva', 'Joseane Souza', 'Maria Josefina', 'Silvano Costa']):
+            Cliente.objects.create(pessoa=Pessoa.objects.create(nome=nome, cpf_cnpj=f'{i + 1:03d}45678900'))
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def nomes(self, texto):
+        resposta = self.api.get('/api/clientes/?' + urlencode({'search': texto, 'expand': 'pessoa'}))
+        return [cliente['pessoa']['nome'] for cliente in resposta.json()['results']]
+
+    def termos(self, nome):
+        return list(indice_pessoas.termos().filter(pessoa__nome=nome).order_by('posicao').values_list('termo', flat=True))
+
+    def test_termos_normalizados(self):
+        self.assertEqual(termos_do_texto("  Joãozinho D'Ávila ", 'JOÃOZINHO'), ['joaozinho', 'd', 'avila'])
+        self.assertEqual(self.termos('José da Silva'), ['jose', 'da', 'silva'])
+
+    def test_prefixo_e_relevancia(self):
+        # Palavra inteira no primeiro nome > prefixo no primeiro nome > prefixo em outra palavra.
+        self.assertEqual(self.nomes('jose'), ['José da Silva', 'Joseane Souza', 'Maria Josefina'])
+        self.assertEqual(self.nomes('JOSÉ sil'), ['José da Silva'])
+        self.assertEqual(self.nomes('sil'), ['Silvano Costa', 'José da Silva'])
+        self.assertEqual(self.nomes('xyz'), [])
+        # Só números: vai pelo CPF/CNPJ.
+        self.assertEqual(self.nomes('002.45'), ['Joseane Souza'])
+
+    def test_edicao_reindexa(self):
+        pessoa = Pessoa.objects.get(nome='Silvano Costa')
+        pessoa.nome = 'Silvano Prado'
+        pessoa.save(update_fields=['nome'])
+        self.assertEqual(self.nomes('prado'), ['Silvano Prado'])
+        self.assertEqual(self.nomes('costa'), [])
+        # Índice em dia: reindexar tudo de novo não grava nada.
+        self.assertEqual(indice_pessoas.reindexar(), 0)
+
+    def test_sincronizacao_so_reindexa_as_linhas_afetadas(self):
+        # Uma pessoa com o índice desatualizado de propósito: se a sincronização
+        # reindexasse a tabela inteira, ela voltaria a aparecer na busca.
+        indice_pessoas.termos().filter(pessoa__nome='Maria Josefina').delete()
+        registros = {
+            '00145678900': {'nome': 'José da Silva Neto'},
+            '00145678901': {'nome': 'Ana Beatriz'},
+            '00245678900': {'nome': 'Joseane Souza'},
+        }
+        with CaptureQueriesContext(connection) as consultas:
+            sincronizar(Pessoa, 'cpf_cnpj', registros, campos_atualizaveis=['nome'])
+        self.assertEqual(self.termos('José da Silva Neto'), ['jose', 'da', 'silva', 'neto'])
+        self.assertEqual(self.termos('Ana Beatriz'), ['ana', 'beatriz'])
+        self.assertEqual(self.termos('Maria Josefina'), [])
+        leituras = [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'usuarios_pessoatermo' in c['sql']]
+        self.assertTrue(leituras)
+        self.assertTrue(all(' IN (' in sql for sql in leituras), leituras)
+
+
+class ClassificacaoEmLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(5))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in Pessoa.objects.order_by('id'))
+        cls.ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def test_pedido_invalido(self):
+        for corpo in (['x'], {'ids': 'todos'}, {'ids': ['1', 'a']}, {'ids': [1.5]}, {'ids': [True]},
+                      {'tamanho_lote': 0}, {'tamanho_lote': 'muitos'}):
+            with self.subTest(corpo=corpo):
+                resposta = self.api.post('/api/clientes/classificar-lote/?async=1', corpo, format='json')
+                self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(JobClassificacao.objects.exists())
+
+    def test_tamanho_lote_grande_demais_e_reduzido(self):
+        resposta = self.api.post('/api/clientes/classificar-lote/?async=1',
+                                 {'ids': self.ids[:3], 'tamanho_lote': 10 ** 12}, format='json')
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.json()['total'], 3)
+
+
+class FilaDeClassificacaoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(
+            Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}', idade=20 + i, endereco='Goiânia', lead_score=i)
+            for i in range(4)
+        )
+        # bulk_create: sem post_save, nenhum job de primeira classificação é criado.
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in Pessoa.objects.order_by('id'))
+        cls.ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+
+    def status(self):
+        return dict(JobClassificacao.objects.values_list('cliente_id', 'status'))
+
+    def test_enfileirar_nao_duplica_pendentes(self):
+        a, b, c = self.ids[:3]
+        primeiros = jobs.enfileirar([a, b, a])
+        self.assertEqual(set(primeiros), {a, b})
+        segundos = jobs.enfileirar([a, c])
+        self.assertEqual(segundos[a], primeiros[a])
+        self.assertEqual(JobClassificacao.objects.count(), 3)
+
+        # Concluído não conta: o cliente pode voltar para a fila.
+        JobClassificacao.objects.filter(pk=primeiros[a]).update(status=JobClassificacao.Status.CONCLUIDO)
+        self.assertNotEqual(jobs.enfileirar([a])[a], primeiros[a])
+
+    def test_atraso_adia_o_job_que_ja_estava_na_fila(self):
+        job_id = jobs.enfileirar(self.ids[:1], atraso=timedelta(seconds=30))[self.ids[0]]
+        antes = JobClassificacao.objects.get(pk=job_id).executar_apos
+        self.assertEqual(jobs.enfileirar(self.ids[:1], atraso=timedelta(minutes=5)), {self.ids[0]: job_id})
+        self.assertGreater(JobClassificacao.objects.get(pk=job_id).executar_apos, antes)
+        # Ainda não liberado para o worker.
+        self.assertEqual(jobs.reservar(), [])
+
+    def test_worker_processa_a_fila(self):
+        jobs.enfileirar(self.ids)
+        saida = StringIO()
+        call_command('processar_classificacoes', uma_vez=True, processos=0, stdout=saida)
+        self.assertIn('4 jobs classificados', saida.getvalue())
+
+        versao = registro.obter().versao
+        self.assertEqual(set(self.status().values()), {JobClassificacao.Status.CONCLUIDO})
+        self.assertEqual(set(JobClassificacao.objects.values_list('modelo_versao', flat=True)), {versao})
+        clientes = Cliente.objects.filter(pk__in=self.ids)
+        self.assertFalse(clientes.filter(classificacao=Cliente.ClassificacaoCliente.NAO_CLASSIFICADO).exists())
+        self.assertEqual(set(clientes.values_list('modelo_versao', flat=True)), {versao})
+        self.assertEqual(jobs.processar_lote(registro.obter()), (0, None))
+
+    def test_erro_no_predict_marca_os_jobs(self):
+        jobs.enfileirar(self.ids[:2])
+        quebrado = replace(registro.obter(), pipeline=None, versao='quebrado')
+        # O erro volta para quem chamou, sem derrubar o worker.
+        processados, erro = jobs.processar_lote(quebrado)
+        self.assertEqual(processados, 2)
+        self.assertIsInstance(erro, AttributeError)
+        self.assertEqual(set(self.status().values()), {JobClassificacao.Status.ERRO})
+        self.assertTrue(all(JobClassificacao.objects.values_list('erro', flat=True)))
+        self.assertTrue(Cliente.objects.filter(classificacao=Cliente.ClassificacaoCliente.NAO_CLASSIFICADO).exists())
+
+    def test_worker_sem_pool_respeita_o_tempo_limite(self):
+        jobs.enfileirar(self.ids[:1])
+        jobs.reservar()
+        JobClassificacao.objects.update(iniciado_em=timezone.now() - timedelta(minutes=2))
+        # Dentro do tempo limite padrão (10 min), o job reservado não é tocado.
+        call_command('processar_classificacoes', uma_vez=True, processos=0, stdout=StringIO())
+        self.assertEqual(set(self.status().values()), {JobClassificacao.Status.PROCESSANDO})
+        call_command('processar_classificacoes', uma_vez=True, processos=0, tempo_limite=60, stdout=StringIO())
+        self.assertEqual(set(self.status().values()), {JobClassificacao.Status.CONCLUIDO})
+
+    def test_job_abandonado_volta_para_a_fila(self):
+        jobs.enfileirar(self.ids[:2])
+        reservados = jobs.reservar()
+        self.assertEqual(len(reservados), 2)
+        # Reservados e dentro do tempo limite: outro worker não pega.
+        self.assertEqual(jobs.reservar(), [])
+
+        JobClassificacao.objects.filter(pk=reservados[0]).update(iniciado_em=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.reservar(tempo_limite=timedelta(minutes=10)), [reservados[0]])
+
+        jobs.devolver(reservados)
+        self.assertEqual(set(self.status().values()), {JobClassificacao.Status.PENDENTE})
+
+
+class EntradasAlteradasTests(TestCase):
+    """Só mudança real em idade, endereço ou lead_score põe o cliente na fila de reclassificação."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(
+            Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}', idade=30, endereco='Goiânia', lead_score=5)
+            for i in range(3)
+        )
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in Pessoa.objects.order_by('id'))
+        cls.ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+
+    def salvar(self, pessoa, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            pessoa.save(**kwargs)
+
+    def na_fila(self):
+        return set(JobClassificacao.objects.values_list('cliente_id', flat=True))
+
+    def test_save_sem_mudanca_nas_entradas(self):
+        pessoa = Pessoa.objects.get(pk=self.ids[0])
+        self.salvar(pessoa)
+        # O mesmo valor de novo (o int 30 vindo de outro lugar) não é mudança.
+        pessoa.idade = int('30')
+        pessoa.nome = 'OUTRO NOME'
+        self.salvar(pessoa)
+        self.assertEqual(self.na_fila(), set())
+
+    def test_carregar_pessoas_nao_roda_receptor(self):
+        # Listagens e exportações montam milhares de Pessoas que nunca são salvas.
+        self.assertFalse(post_init.has_listeners(Pessoa))
+
+    def test_save_que_nao_grava_entradas_nao_consulta(self):
+        pessoa = Pessoa.objects.get(pk=self.ids[0])
+        pessoa.nome = 'OUTRO NOME'
+        # Nenhuma entrada do modelo no update_fields: só o UPDATE, sem reler nada.
+        with self.assertNumQueries(1):
+            pessoa.save(update_fields=['telefone'])
+
+    def test_campos_adiados_nao_sao_lidos(self):
+        pessoa = Pessoa.objects.only('pk', 'nome').get(pk=self.ids[0])
+        pessoa.nome = 'SÓ O NOME'
+        self.salvar(pessoa, update_fields=['nome'])
+        # Comparar as entradas não pode carregar os campos adiados (uma consulta por objeto).
+        self.assertLessEqual({'idade', 'endereco', 'lead_score'}, pessoa.get_deferred_fields())
+        self.assertEqual(self.na_fila(), set())
+
+    def test_mudanca_real_entra_na_fila_uma_vez(self):
+        pessoa = Pessoa.objects.get(pk=self.ids[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            pessoa.lead_score = 9
+            pessoa.save()
+            pessoa.endereco = 'Anápolis'
+            pessoa.save()
+        self.assertEqual(self.na_fila(), {self.ids[1]})
+        self.assertEqual(JobClassificacao.objects.count(), 1)
+
+        # Os valores anteriores são relidos a cada save: salvar de novo sem mexer não enfileira outra vez.
+        JobClassificacao.objects.all().delete()
+        self.salvar(pessoa)
+        self.assertEqual(self.na_fila(), set())
+
+    def test_sincronizacao_so_enfileira_quem_mudou(self):
+        registros = {
+            '00000000000': {'nome': 'PESSOA 0', 'idade': 30},
+            '00000000001': {'nome': 'NOME NOVO', 'idade': 30},
+            '00000000002': {'nome': 'PESSOA 2', 'idade': 31},
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            sincronizar(Pessoa, 'cpf_cnpj', registros, campos_atualizaveis=['nome', 'idade'])
+        self.assertEqual(self.na_fila(), {self.ids[2]})
+
+
+class CargaDoModeloTests(TestCase):
+
+    def setUp(self):
+        registro.limpar()
+
+    def test_ready_nao_carrega_o_modelo(self):
+        # O ready() roda em todo comando do manage.py; a carga fica para quem serve a API.
+        apps.get_app_config('usuarios').ready()
+        self.assertEqual(registro.info(), [])
+
+    def test_precarregar(self):
+        with override_settings(ML_PRECARREGAR_MODELOS=False):
+            precarregar()
+        self.assertEqual(registro.info(), [])
+        precarregar()
+        self.assertEqual([modelo['nome'] for modelo in registro.info()], ['modelo_classificacao_cliente'])
+
+
+class EdicaoDeClienteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pessoa = Pessoa.objects.create(nome='ANA', cpf_cnpj='00000000001')
+        cls.cliente = Cliente.objects.create(pessoa=pessoa, prob_alto=0.25, modelo_versao='antiga')
+
+    def test_resultado_do_modelo_nao_e_editavel(self):
+        resposta = APIClient().patch(f'/api/clientes/{self.cliente.pk}/', {
+            'prob_alto': 0.99, 'classificado_em': '2030-01-01T00:00:00Z', 'modelo_versao': 'atual',
+        }, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.cliente.refresh_from_db()
+        self.assertEqual((self.cliente.prob_alto, self.cliente.classificado_em, self.cliente.modelo_versao),
+                         (0.25, None, 'antiga'))
+
+
+class CadastroEmLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.create(nome='JÁ CADASTRADA', cpf_cnpj='99999999999', email='existe@example.com')
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def linhas(self, quantidade, inicio=0):
+        return [
+            {'nome': f'Lead {i}', 'cpf_cnpj': f'{i:011d}', 'email': f'lead{i}@example.com',
+             'endereco': 'Maceió', 'idade': 20 + i % 40, 'lead_score': i % 10}
+            for i in range(inicio, inicio + quantidade)
+        ]
+
+    def test_array_json(self):
+        resposta = self.api.post('/api/clientes/lote/?tamanho_lote=20', self.linhas(50), format='json')
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual((resposta.json()['criados'], resposta.json()['lotes']), (50, 3))
+        self.assertEqual(Cliente.objects.count(), 50)
+        # Os clientes novos aparecem na busca (índice de termos) como no cadastro individual.
+        self.assertEqual(len(self.api.get('/api/clientes/?search=lead&page_size=100').json()['results']), 50)
+
+    def test_consultas_nao_dependem_do_tamanho_do_lote(self):
+        contagens = []
+        # Cada bloco grava cada tabela num único INSERT (no SQLite, com o limite de
+        # 999 parâmetros, 100 linhas viram dois blocos): as consultas crescem com
+        # o número de blocos, nunca com o de linhas.
+        for inicio, quantidade in ((0, 10), (100, 100)):
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.api.post('/api/clientes/lote/', self.linhas(quantidade, inicio), format='json')
+            contagens.append(len(consultas) / resposta.json()['lotes'])
+        self.assertEqual(contagens[0], contagens[1])
+
+    def test_erros_por_linha(self):
+        linhas = self.linhas(3)
+        linhas[1]['cpf_cnpj'] = linhas[0]['cpf_cnpj']                        # repetido no lote
+        linhas.append({'nome': 'Sem CPF'})                                    # inválido
+        linhas.append({**self.linhas(1, 10)[0], 'cpf_cnpj': '99999999999'})  # já no banco
+        linhas.append({**self.linhas(1, 11)[0], 'email': 'EXISTE@example.com'})
+        linhas.append({**self.linhas(1, 12)[0], 'email': ''})
+        linhas.append({**self.linhas(1, 13)[0], 'email': ''})
+
+        resposta = self.api.post('/api/clientes/lote/', linhas, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        resultados = resposta.json()['resultados']
+        self.assertEqual([r['status'] for r in resultados],
+                         ['criado', 'erro', 'criado', 'erro', 'erro', 'erro', 'criado', 'criado'])
+        self.assertIn('linha 1', resultados[1]['erros']['cpf_cnpj'][0])
+        self.assertIn('cpf_cnpj', resultados[3]['erros'])
+        self.assertIn('já cadastrado', resultados[4]['erros']['cpf_cnpj'][0])
+        self.assertIn('já cadastrado', resultados[5]['erros']['email'][0])
+        # E-mails em branco viram NULL e não colidem entre si.
+        self.assertEqual(Pessoa.objects.filter(email__isnull=True).count(), 2)
+
+    def test_email_ja_cadastrado_com_outras_maiusculas(self):
+        linha = {**self.linhas(1, 20)[0], 'email': 'Existe@Example.COM'}
+        resposta = self.api.post('/api/clientes/lote/', [linha], format='json')
+        resultado = resposta.json()['resultados'][0]
+        self.assertEqual(resultado['status'], 'erro')
+        self.assertEqual(list(resultado['erros']), ['email'])
+        self.assertFalse(Pessoa.objects.filter(cpf_cnpj=linha['cpf_cnpj']).exists())
+
+    def test_conflitos_de_email_numa_consulta_com_in(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.api.post('/api/clientes/lote/', self.linhas(50, 100), format='json')
+        emails = [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'LOWER(' in c['sql']]
+        self.assertEqual(len(emails), 1)
+        # Um IN só, e não um OR por linha do bloco.
+        self.assertNotIn(' OR ', emails[0])
+
+    def test_ndjson_com_classificacao(self):
+        corpo = '\n'.join(json.dumps(linha) for linha in self.linhas(5)) + '\n\n'
+        resposta = self.api.post('/api/clientes/lote/?classificar=1', corpo, content_type='application/x-ndjson')
+        self.assertEqual(resposta.status_code, 201, resposta.content)
+        self.assertTrue(all('prob_alto' in r for r in resposta.json()['resultados']))
+        self.assertFalse(Cliente.objects.filter(classificado_em__isnull=True).exists())
+
+    def test_ndjson_invalido(self):
+        resposta = self.api.post('/api/clientes/lote/', '{"nome": "ok"}\n{quebrado',
+                                 content_type='application/x-ndjson')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('linha 2', resposta.json()['detail'])
+
+
+class SituacaoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Pessoa.objects.bulk_create(Pessoa(nome=f'PESSOA {i}', cpf_cnpj=f'{i:011d}') for i in range(30))
+        Cliente.objects.bulk_create(Cliente(pessoa=pessoa) for pessoa in Pessoa.objects.order_by('id'))
+        cls.ids = list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def historico(self, cliente_id):
+        return list(HistoricoSituacao.objects.filter(cliente_id=cliente_id).order_by('id')
+                    .values_list('situacao_anterior', 'situacao_nova'))
+
+    def test_um_cliente(self):
+        url = f'/api/clientes/{self.ids[0]}/atualizar_situacao/'
+        resposta = self.api.patch(url, {'situacao': 'NEGOCIANDO'}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['situacao'], 'Em Negociação')
+        # Pedir a situação em que o cliente já está não grava nada.
+        self.api.patch(url, {'situacao': 'NEGOCIANDO'}, format='json')
+        self.api.patch(url, {'situacao': 'VENDIDO'}, format='json')
+        self.assertEqual(self.historico(self.ids[0]), [('NOVO', 'NEGOCIANDO'), ('NEGOCIANDO', 'VENDIDO')])
+
+        for situacao in ('GANHO', ['NOVO'], None):
+            with self.subTest(situacao=situacao):
+                self.assertEqual(self.api.patch(url, {'situacao': situacao}, format='json').status_code, 400)
+
+    def test_em_lote(self):
+        Cliente.objects.filter(pk=self.ids[0]).update(situacao='PERDIDO')
+        resposta = self.api.patch('/api/clientes/situacao-lote/',
+                                  {'ids': self.ids[:20] + [999999], 'situacao': 'PERDIDO'}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {'situacao': 'PERDIDO', 'total': 21, 'alterados': 19, 'inalterados': 1,
+                                           'nao_encontrados': [999999]})
+        self.assertEqual(Cliente.objects.filter(situacao='PERDIDO').count(), 20)
+        self.assertEqual(self.historico(self.ids[1]), [('NOVO', 'PERDIDO')])
+        self.assertEqual(self.historico(self.ids[0]), [])
+
+        for corpo in ({'ids': self.ids, 'situacao': 'X'}, {'ids': 'todos', 'situacao': 'NOVO'},
+                      {'ids': ['1'], 'situacao': 'NOVO'}):
+            with self.subTest(corpo=corpo):
+                self.assertEqual(self.api.patch('/api/clientes/situacao-lote/', corpo, format='json').status_code, 400)
+
+    def test_corpo_que_nao_e_objeto(self):
+        for url in (f'/api/clientes/{self.ids[0]}/atualizar_situacao/', '/api/clientes/situacao-lote/'):
+            with self.subTest(url=url):
+                resposta = self.api.patch(url, [{'ids': self.ids, 'situacao': 'PERDIDO'}], format='json')
+                self.assertEqual(resposta.status_code, 400)
+
+    def test_alteracao_pelo_admin_entra_no_historico(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        cliente = Cliente.objects.get(pk=self.ids[0])
+        formulario = {
+            'pessoa': cliente.pk, 'classificacao': cliente.classificacao, 'situacao': 'NEGOCIANDO',
+            'modelo_versao': '', 'qtd_atendimentos': 4, 'qtd_compras': 0, 'valor_total_compras': '0',
+        }
+        resposta = self.client.post(f'/admin/usuarios/cliente/{cliente.pk}/change/', formulario)
+        self.assertEqual(resposta.status_code, 302)
+        cliente.refresh_from_db()
+        self.assertEqual((cliente.situacao, cliente.qtd_atendimentos), ('NEGOCIANDO', 4))
+        self.assertEqual(self.historico(cliente.pk), [('NOVO', 'NEGOCIANDO')])
+
+        # Sem mudar a situação, o histórico fica como está.
+        self.client.post(f'/admin/usuarios/cliente/{cliente.pk}/change/', {**formulario, 'qtd_atendimentos': 5})
+        self.assertEqual(len(self.historico(cliente.pk)), 1)
+
+    def test_consultas_nao_dependem_do_tamanho_do_lote(self):
+        contagens = []
+        for ids in (self.ids[:5], self.ids[5:30]):
+            with CaptureQueriesContext(connection) as consultas:
+                self.api.patch('/api/clientes/situacao-lote/', {'ids': ids, 'situacao': 'NEGOCIANDO'}, format='json')
+            contagens.append(len(consultas))
+        self.assertEqual(contagens[0], contagens[1])
@@ -0,0 +1,224 @@
+# usuarios/treinamento.py
+"""
+Treino do modelo de classificação de potencial a partir do próprio banco.
+
+O modelo original foi treinado no Colab com as planilhas. Aqui o mesmo
+pipeline (OneHot no município + StandardScaler em idade e lead_score +
+árvore de decisão) é treinado com os dados atuais:
+
+- exemplos: todas as pessoas que não são usuários do sistema (clientes e leads);
+- rótulo: 1 se a pessoa tem pelo menos uma venda como cliente, 0 se não tem.
+
+Os dados são lidos em lotes pela chave primária, direto do ORM (sem passar
+pela API paginada). A validação cruzada roda com n_jobs, um fold/combinação
+por núcleo, e o resultado é gravado em ml_models/ como um arquivo versionado
+(<nome>.<versao>.joblib) com um JSON ao lado (métricas, esquema das entradas,
+parâmetros). Promover é trocar o arquivo ativo por uma cópia desse com
+os.replace, que é atômico: os processos da API nunca veem um arquivo pela
+metade e o ml_registry carrega a nova versão no próximo acesso.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from operacoes.models import Venda
+
+from .ml_registry import MODELO_CLASSIFICACAO, registro
+from .models import Pessoa
+from .previsao_processo import COLUNAS_MODELO
+
+TAMANHO_LOTE_PADRAO = 5000
+ROTULO = 'comprou'
+METRICAS = ('accuracy', 'precision', 'recall', 'f1', 'roc_auc')
+# Profundidades testadas na validação cruzada. O modelo do Colab usava 10.
+PROFUNDIDADES_PADRAO = (4, 6, 8, 10, 12)
+# Valor usado quando o município está vazio, o mesmo da importação (popular_banco).
+MUNICIPIO_DESCONHECIDO = 'Desconhecido'
+
+
+def extrair_dados(tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    DataFrame com as colunas do modelo e o rótulo, lido em lotes de
+    `tamanho_lote` pessoas (WHERE id > último ORDER BY id LIMIT n).
+    Pessoas sem idade ficam de fora, como no treino original.
+    """
+    pessoas = (
+        Pessoa.objects.filter(usuario__isnull=True, idade__isnull=False)
+        .annotate(comprou=Exists(Venda.objects.filter(cliente_id=OuterRef('pk'))))
+        .order_by('pk')
+        .values_list('pk', 'idade', 'endereco', 'lead_score', 'comprou')
+    )
+    blocos = []
+    ultimo_pk = None
+    while True:
+        lote = pessoas if ultimo_pk is None else pessoas.filter(pk__gt=ultimo_pk)
+        lote = list(lote[:tamanho_lote])
+        if not lote:
+            break
+        ultimo_pk = lote[-1][0]
+        blocos.append(pd.DataFrame([linha[1:] for linha in lote], columns=COLUNAS_MODELO + [ROTULO]))
+
+    if not blocos:
+        return pd.DataFrame(columns=COLUNAS_MODELO + [ROTULO])
+    dados = pd.concat(blocos, ignore_index=True)
+    dados['Municipio'] = dados['Municipio'].fillna(MUNICIPIO_DESCONHECIDO).replace('', MUNICIPIO_DESCONHECIDO)
+    dados[ROTULO] = dados[ROTULO].astype(int)
+    return dados
+
+
+def montar_pipeline(random_state=42):
+    """O mesmo formato do pipeline treinado no Colab (ver ml_models/)."""
+    preprocessador = ColumnTransformer(
+        transformers=[
+            ('cat', OneHotEncoder(handle_unknown='ignore'), ['Municipio']),
+            ('num', StandardScaler(), ['Idade', 'lead_score']),
+        ],
+        remainder='passthrough',
+    )
+    return Pipeline(steps=[
+        ('preprocessor', preprocessador),
+        ('classifier', DecisionTreeClassifier(max_depth=10, random_state=random_state)),
+    ])
+
+
+def treinar(dados, profundidades=PROFUNDIDADES_PADRAO, folds=5, n_jobs=-1, random_state=42):
+    """
+    Escolhe a profundidade da árvore por validação cruzada estratificada
+    (otimizando F1) e devolve (pipeline treinado com todos os dados, métricas).
+    """
+    if dados[ROTULO].nunique() < 2:
+        raise ValueError('Os dados de treino precisam ter exemplos das duas classes (com e sem venda).')
+
+    busca = GridSearchCV(
+        montar_pipeline(random_state),
+        param_grid={'classifier__max_depth': list(profundidades)},
+        scoring=list(METRICAS),
+        refit='f1',
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state),
+        n_jobs=n_jobs,
+    )
+    busca.fit(dados[COLUNAS_MODELO], dados[ROTULO])
+
+    melhor = busca.best_index_
+    resultados = busca.cv_results_
+    metricas = {
+        'validacao_cruzada': {
+            metrica: {
+                'media': round(float(resultados[f'mean_test_{metrica}'][melhor]), 4),
+                'desvio': round(float(resultados[f'std_test_{metrica}'][melhor]), 4),
+            }
+            for metrica in METRICAS
+        },
+        'candidatos': [
+            {'max_depth': parametros['classifier__max_depth'],
+             'f1': round(float(f1), 4)}
+            for parametros, f1 in zip(resultados['params'], resultados['mean_test_f1'])
+        ],
+        'parametros': {'max_depth': busca.best_params_['classifier__max_depth'], 'folds': folds},
+    }
+    return busca.best_estimator_, metricas
+
+
+def esquema_das_entradas(pipeline, dados):
+    """Descrição das entradas esperadas, gravada no JSON junto do modelo."""
+    codificador = pipeline.named_steps['preprocessor'].named_transformers_['cat']
+    return {
+        'colunas': COLUNAS_MODELO,
+        'tipos': {coluna: str(dados[coluna].dtype) for coluna in COLUNAS_MODELO},
+        'municipios': [str(valor) for valor in codificador.categories_[0]],
+        'classes': [int(classe) for classe in pipeline.classes_],
+        'rotulo': 'pessoa com pelo menos uma venda como cliente (1) ou sem nenhuma (0)',
+    }
+
+
+def gravar_atomicamente(caminho, conteudo):
+    """Grava num arquivo temporário da mesma pasta e troca com os.replace."""
+    diretorio = os.path.dirname(caminho)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp-', suffix=os.path.splitext(caminho)[1])
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(conteudo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        # O mkstemp cria o arquivo só para o dono; a API pode rodar com outro usuário.
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def gravar_artefato(pipeline, metadados, diretorio=None, nome=MODELO_CLASSIFICACAO):
+    """
+    Grava <nome>.<versao>.joblib e <nome>.<versao>.json no diretório dos
+    modelos. A versão é calculada do mesmo jeito que no ml_registry (hash do
+    arquivo), então é a mesma que aparece na API depois da promoção.
+    Retorna (versao, caminho do .joblib).
+    """
+    diretorio = str(diretorio or registro.diretorio)
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    conteudo = buffer.getvalue()
+    versao = hashlib.sha256(conteudo).hexdigest()[:12]
+
+    caminho = os.path.join(diretorio, f'{nome}.{versao}.joblib')
+    metadados = {'nome': nome, 'versao': versao, **metadados}
+    gravar_atomicamente(os.path.join(diretorio, f'{nome}.{versao}.json'),
+                        json.dumps(metadados, ensure_ascii=False, indent=2).encode('utf-8'))
+    gravar_atomicamente(caminho, conteudo)
+    return versao, caminho
+
+
+def promover(caminho_versao, diretorio=None, nome=MODELO_CLASSIFICACAO):
+    """
+    Faz de um artefato versionado o modelo ativo: o JSON vira <nome>.json e o
+    .joblib vira <nome>.joblib, cada um trocado de uma vez com os.replace.
+    """
+    diretorio = str(diretorio or registro.diretorio)
+    caminho_json = os.path.splitext(caminho_versao)[0] + '.json'
+    if os.path.exists(caminho_json):
+        with open(caminho_json, 'rb') as arquivo:
+            gravar_atomicamente(os.path.join(diretorio, f'{nome}.json'), arquivo.read())
+    with open(caminho_versao, 'rb') as arquivo:
+        gravar_atomicamente(os.path.join(diretorio, f'{nome}.joblib'), arquivo.read())
+
+
+def treinar_e_gravar(tamanho_lote=TAMANHO_LOTE_PADRAO, profundidades=PROFUNDIDADES_PADRAO,
+                     folds=5, n_jobs=-1, promover_modelo=True, diretorio=None):
+    """Extrai, treina, grava o artefato versionado e (opcionalmente) promove."""
+    inicio = time.perf_counter()
+    dados = extrair_dados(tamanho_lote)
+    tempo_extracao = time.perf_counter() - inicio
+
+    pipeline, metricas = treinar(dados, profundidades=profundidades, folds=folds, n_jobs=n_jobs)
+    tempo_total = time.perf_counter() - inicio
+
+    metadados = {
+        'treinado_em': timezone.now().isoformat(),
+        'exemplos': int(len(dados)),
+        'positivos': int(dados[ROTULO].sum()),
+        'metricas': metricas,
+        'esquema': esquema_das_entradas(pipeline, dados),
+        'versoes': {'scikit-learn': sklearn.__version__, 'pandas': pd.__version__, 'numpy': np.__version__},
+        'tempo_segundos': {'extracao': round(tempo_extracao, 3), 'total': round(tempo_total, 3)},
+    }
+    versao, caminho = gravar_artefato(pipeline, metadados, diretorio=diretorio)
+    if promover_modelo:
+        promover(caminho, diretorio=diretorio)
+    return {**metadados, 'versao': versao, 'arquivo': caminho, 'promovido': promover_modelo}
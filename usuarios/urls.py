@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ClienteViewSet
+from .views import ClienteViewSet, JobClassificacaoViewSet
 
 router = DefaultRouter()
 router.register(r'clientes', ClienteViewSet, basename='cliente')
+router.register(r'jobs-classificacao', JobClassificacaoViewSet, basename='job-classificacao')
 
 urlpatterns = [
     path('', include(router.urls)),
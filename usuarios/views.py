@@ -1,30 +1,91 @@
 # --- Imports necessários para a API completa ---
-from django.conf import settings
-import os
+from django.utils import timezone
 from rest_framework import viewsets, status # Adicionamos 'status' para respostas de erro
+from django_filters import rest_framework as filters
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters
 from rest_framework.decorators import action # Essencial para criar endpoints customizados
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response # Para enviar respostas JSON customizadas
-import joblib # Para carregar o modelo de ML
-import pandas as pd # Para formatar os dados para o modelo
-from .models import Cliente, Pessoa # Importamos Pessoa para acessar seus dados
-from .serializers import ClienteSerializer, ClienteCreateSerializer
+from rest_framework.reverse import reverse
+from dealerconnect_backend.api import CamposDinamicosViewSetMixin, ExportacaoMixin, NDJSONParser
+from dealerconnect_backend.busca import BuscaPorTermos
+from dealerconnect_backend.paginacao import PaginacaoPorCursor
+from .busca import indice_pessoas
+from . import cadastro_lote, situacao
+from .cache_previsoes import cache_previsoes
+from .classificacao import (CAMPOS_RESULTADO, classificar_clientes, desatualizados, prever, TAMANHO_LOTE_MAXIMO,
+                            TAMANHO_LOTE_PADRAO)
+from .jobs import enfileirar
+from .ml_registry import registro # Modelos de ML já carregados em memória
+from .models import Cliente, Pessoa, JobClassificacao # Importamos Pessoa para acessar seus dados
+from .serializers import ClienteSerializer, ClienteCreateSerializer, JobClassificacaoSerializer
+from .signals import avisar_exclusao
 
 
+def pedido_assincrono(request):
+    """?async=1 (ou true) pede que a classificação vá para a fila em vez de rodar na hora."""
+    return request.query_params.get('async', '').lower() in ('1', 'true', 'sim')
+
+
+class ClientePaginacao(PaginacaoPorCursor):
+    # Ordem alfabética; o pessoa_id (chave primária) desempata nomes iguais.
+    ordering = ('pessoa__nome', 'pessoa_id')
+    # ?ordering=-prob_alto lista os clientes do mais para o menos promissor
+    # (os ainda não classificados ficam no fim).
+    ordenacoes = {
+        '-prob_alto': ('-prob_alto', 'pessoa_id'),
+        'prob_alto': ('prob_alto', 'pessoa_id'),
+        # ?ordering=-ultimo_atendimento_em: contatados mais recentemente primeiro
+        # (quem nunca foi atendido fica no fim); sem o "-", os esquecidos há mais tempo.
+        '-ultimo_atendimento_em': ('-ultimo_atendimento_em', 'pessoa_id'),
+        'ultimo_atendimento_em': ('ultimo_atendimento_em', 'pessoa_id'),
+        # Resumo de compras (operacoes/compras.py): compra mais recente,
+        # mais compras e maior valor total primeiro.
+        '-ultima_compra_em': ('-ultima_compra_em', 'pessoa_id'),
+        '-qtd_compras': ('-qtd_compras', 'pessoa_id'),
+        '-valor_total_compras': ('-valor_total_compras', 'pessoa_id'),
+    }
+
+
+class ClienteFiltro(filters.FilterSet):
+    # ?min_prob=0.7 / ?max_prob=0.9: faixa da probabilidade de potencial alto.
+    min_prob = filters.NumberFilter(field_name='prob_alto', lookup_expr='gte')
+    max_prob = filters.NumberFilter(field_name='prob_alto', lookup_expr='lte')
+    # Resumo de compras: ?min_compras=2, ?min_valor=50000, ?comprou_desde=2025-01-01,
+    # ?sem_compra_desde=2024-01-01 (última compra antes dessa data) e ?segmento_favorito=3.
+    min_compras = filters.NumberFilter(field_name='qtd_compras', lookup_expr='gte')
+    min_valor = filters.NumberFilter(field_name='valor_total_compras', lookup_expr='gte')
+    comprou_desde = filters.IsoDateTimeFilter(field_name='ultima_compra_em', lookup_expr='gte')
+    sem_compra_desde = filters.IsoDateTimeFilter(field_name='ultima_compra_em', lookup_expr='lt')
+
+    class Meta:
+        model = Cliente
+        fields = ['pessoa__cpf_cnpj', 'classificacao', 'segmento_favorito']
+
 
 # Trocamos ReadOnlyModelViewSet por ModelViewSet.
 # Isso "desbloqueia" as ações de criar, editar e apagar.
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(CamposDinamicosViewSetMixin, ExportacaoMixin, viewsets.ModelViewSet):
     """
     Este endpoint da API permite visualizar, buscar, classificar e ATUALIZAR clientes.
+    A listagem é paginada por cursor; /api/clientes/export/ devolve tudo em CSV ou NDJSON.
     """
-    queryset = Cliente.objects.select_related('pessoa').all().order_by('pessoa__nome')
+    queryset = Cliente.objects.select_related('pessoa').all().order_by('pessoa__nome', 'pessoa_id')
     serializer_class = ClienteSerializer
+    pagination_class = ClientePaginacao
+    nome_exportacao = 'clientes'
     
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['pessoa__cpf_cnpj']
-    search_fields = ['pessoa__nome', 'pessoa__cpf_cnpj']
+    filter_backends = [DjangoFilterBackend, BuscaPorTermos]
+    filterset_class = ClienteFiltro
+    # ?search= procura por começo de palavra no nome (sem acento) ou,
+    # se forem só números, pelo começo do CPF/CNPJ. Ver dealerconnect_backend/busca.py.
+    indice_busca = indice_pessoas
+    campo_indice_busca = 'pessoa_id'
+    campo_documento_busca = 'pessoa__cpf_cnpj'
+
+    def get_queryset(self):
+        # Na listagem, busca só as colunas pedidas em ?fields= / ?expand=.
+        return self.otimizar_queryset(super().get_queryset())
     
     def get_serializer_class(self):
         """
@@ -38,6 +99,11 @@ class ClienteViewSet(viewsets.ModelViewSet):
         # Para todas as outras ações (list, retrieve, update, etc.),
         # continue usando o serializer de leitura padrão.
         return ClienteSerializer
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        super().perform_destroy(instance)
+        avisar_exclusao(Cliente, [pk])
     
     # Este é o código que cria o endpoint para usar o modelo de ML.
     @action(detail=True, methods=['post'])
@@ -45,35 +111,47 @@ class ClienteViewSet(viewsets.ModelViewSet):
         """
         Endpoint que executa o modelo de ML para classificar o potencial
         de um cliente específico, usando seus dados REAIS do banco.
+
+        Com ?async=1 a classificação vai para a fila (processada pelo comando
+        processar_classificacoes) e a resposta é 202 com o id do job, que pode
+        ser acompanhado em /api/jobs-classificacao/<id>/.
         """
+        if pedido_assincrono(request):
+            cliente = self.get_object()
+            job_id = enfileirar([cliente.pk])[cliente.pk]
+            return Response({
+                'status': JobClassificacao.Status.PENDENTE,
+                'job_id': job_id,
+                'url': reverse('job-classificacao-detail', args=[job_id], request=request),
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
-            # Carrega o modelo treinado que salvamos na raiz do projeto
-            caminho_modelo = os.path.join(settings.BASE_DIR, 'ml_models', 'modelo_classificacao_cliente.joblib')
-            pipeline = joblib.load(caminho_modelo)
+            # Pega o modelo do registro: ele só é lido do disco na primeira vez
+            # (ou quando o arquivo .joblib é trocado por uma nova versão).
+            modelo = registro.obter()
             cliente = self.get_object()
             
             # Prepara os dados do cliente no formato que o modelo espera
-            dados_para_previsao = pd.DataFrame({
-                'Idade': [cliente.pessoa.idade],
-                'Municipio': [cliente.pessoa.endereco],
-                'lead_score': [cliente.pessoa.lead_score] # Usa o dado real do banco
-            })
-            
-            # Faz a previsão (retorna 0 ou 1)
-            previsao_numerica = pipeline.predict(dados_para_previsao)[0]
-            
-            # Traduz o resultado numérico para o texto que definimos no model
-            if previsao_numerica == 1:
-                cliente.classificacao = Cliente.ClassificacaoCliente.ALTO_POTENCIAL
-                resultado_texto = 'Potencial Alto'
-            else:
-                cliente.classificacao = Cliente.ClassificacaoCliente.POTENCIAL_PADRAO
-                resultado_texto = 'Potencial Padrão'
+            # e faz a previsão (ALTO ou PADRAO); combinações de entradas já
+            # vistas nem chegam ao scikit-learn (ver cache_previsoes.py)
+            cliente.classificacao, cliente.prob_alto = prever(modelo, [(
+                cliente.pessoa.idade,
+                cliente.pessoa.endereco,
+                cliente.pessoa.lead_score, # Usa o dado real do banco
+            )])[0]
+            resultado_texto = cliente.get_classificacao_display()
             
+            cliente.classificado_em = timezone.now()
+            cliente.modelo_versao = modelo.versao
             # Salva o resultado no banco de dados
-            cliente.save()
+            cliente.save(update_fields=CAMPOS_RESULTADO)
             
-            return Response({'status': 'sucesso', 'classificacao': resultado_texto})
+            return Response({
+                'status': 'sucesso',
+                'classificacao': resultado_texto,
+                'prob_alto': cliente.prob_alto,
+                'modelo_versao': modelo.versao,
+            })
 
         except FileNotFoundError:
             return Response({'erro': 'Arquivo do modelo não encontrado.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -81,26 +159,176 @@ class ClienteViewSet(viewsets.ModelViewSet):
             return Response({'erro': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+    @action(detail=False, methods=['post'], url_path='classificar-lote')
+    def classificar_lote(self, request):
+        """
+        Classifica vários clientes de uma vez, em lotes.
+        Aceita um corpo como: { "ids": [1, 2, 3], "tamanho_lote": 1000 }
+        Sem "ids", classifica todos os clientes que passam pelos filtros da URL
+        (por exemplo ?search=silva). Com "somente_nao_classificados": true,
+        pula quem já tem classificação; com "somente_desatualizados": true, só
+        classifica quem nunca foi classificado ou foi por outra versão do
+        modelo. Com ?async=1, só enfileira os jobs
+        e responde 202 na hora.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'erro': 'O corpo deve ser um objeto JSON.'}, status=status.HTTP_400_BAD_REQUEST)
+        clientes = self.filter_queryset(self.get_queryset())
+
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                return Response({'erro': '"ids" deve ser uma lista de inteiros.'}, status=status.HTTP_400_BAD_REQUEST)
+            clientes = clientes.filter(pk__in=ids)
+
+        if request.data.get('somente_nao_classificados'):
+            clientes = clientes.filter(classificacao=Cliente.ClassificacaoCliente.NAO_CLASSIFICADO)
+        if request.data.get('somente_desatualizados'):
+            try:
+                clientes = desatualizados(clientes, registro.obter().versao)
+            except FileNotFoundError:
+                return Response({'erro': 'Arquivo do modelo não encontrado.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        try:
+            tamanho_lote = int(request.data.get('tamanho_lote', TAMANHO_LOTE_PADRAO))
+        except (TypeError, ValueError):
+            tamanho_lote = 0
+        if tamanho_lote <= 0:
+            return Response({'erro': '"tamanho_lote" deve ser um inteiro positivo.'}, status=status.HTTP_400_BAD_REQUEST)
+        tamanho_lote = min(tamanho_lote, TAMANHO_LOTE_MAXIMO)
+
+        if pedido_assincrono(request):
+            jobs = enfileirar(clientes.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=tamanho_lote))
+            return Response({
+                'status': JobClassificacao.Status.PENDENTE,
+                'total': len(jobs),
+                'url': reverse('job-classificacao-list', request=request) + '?status=' + JobClassificacao.Status.PENDENTE,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            resumo = classificar_clientes(clientes, tamanho_lote=tamanho_lote)
+            return Response({'status': 'sucesso', **resumo})
+        except FileNotFoundError:
+            return Response({'erro': 'Arquivo do modelo não encontrado.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as e:
+            return Response({'erro': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+    @action(detail=False, methods=['post'], url_path='lote', parser_classes=[JSONParser, NDJSONParser])
+    def lote(self, request):
+        """
+        Cadastra muitos clientes numa requisição só. O corpo é um array JSON
+        com os mesmos campos do POST /api/clientes/ ou NDJSON (um cliente por
+        linha, Content-Type: application/x-ndjson).
+
+        Todas as linhas são validadas antes de gravar qualquer coisa; as que
+        têm erro (inclusive CPF/e-mail já cadastrado ou repetido no lote) são
+        devolvidas com as mensagens e as outras são criadas. Com ?classificar=1
+        os clientes novos já são gravados classificados; sem ele, vão para a
+        fila de classificação. ?tamanho_lote= controla quantas linhas vão
+        em cada transação. Ver usuarios/cadastro_lote.py.
+        """
+        linhas = request.data
+        if not isinstance(linhas, list):
+            return Response({'erro': 'O corpo deve ser um array JSON ou NDJSON (um cliente por linha).'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(linhas) > cadastro_lote.MAXIMO_LINHAS:
+            return Response({'erro': f'No máximo {cadastro_lote.MAXIMO_LINHAS} clientes por requisição.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            tamanho_lote = int(request.query_params.get('tamanho_lote', cadastro_lote.TAMANHO_LOTE_PADRAO))
+        except (TypeError, ValueError):
+            tamanho_lote = 0
+        if tamanho_lote <= 0:
+            return Response({'erro': '"tamanho_lote" deve ser um inteiro positivo.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        modelo = None
+        if request.query_params.get('classificar', '').lower() in ('1', 'true', 'sim'):
+            try:
+                modelo = registro.obter()
+            except FileNotFoundError:
+                return Response({'erro': 'Arquivo do modelo não encontrado.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        resumo = cadastro_lote.cadastrar_clientes(linhas, tamanho_lote=tamanho_lote, modelo=modelo)
+        # 201 se todas as linhas foram criadas; com alguma recusada, 200 e o detalhe de cada uma.
+        codigo = status.HTTP_201_CREATED if resumo['criados'] == resumo['total'] else status.HTTP_200_OK
+        return Response(resumo, status=codigo)
+
+
+    @action(detail=False, methods=['get'])
+    def modelo(self, request):
+        """
+        Mostra qual versão do modelo de ML está ativa neste processo,
+        quanto tempo levou para carregá-la e os contadores do cache de previsões.
+        """
+        try:
+            return Response({**registro.obter().info(), 'cache_previsoes': cache_previsoes.estatisticas()})
+        except FileNotFoundError:
+            return Response({'erro': 'Arquivo do modelo não encontrado.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
     # Este é o código que permite ao vendedor mudar o status do atendimento.
     @action(detail=True, methods=['patch'])
     def atualizar_situacao(self, request, pk=None):
         """
         Endpoint específico para atualizar APENAS a situação de um cliente.
         Espera um corpo de requisição como: { "situacao": "NEGOCIANDO" }
+        A mudança fica registrada em HistoricoSituacao (ver usuarios/situacao.py).
         """
+        if not isinstance(request.data, dict):
+            return Response({'erro': 'O corpo deve ser um objeto JSON com "situacao".'},
+                            status=status.HTTP_400_BAD_REQUEST)
         cliente = self.get_object()
         nova_situacao = request.data.get('situacao')
 
         # Validação para garantir que a situação enviada é uma das opções válidas
-        opcoes_validas = [choice[0] for choice in Cliente.SituacaoAtendimento.choices]
-        if nova_situacao not in opcoes_validas:
+        if not situacao.situacao_valida(nova_situacao):
             return Response(
-                {'erro': f"Situação inválida. Opções são: {opcoes_validas}"}, 
+                {'erro': f"Situação inválida. Opções são: {Cliente.SituacaoAtendimento.values}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cliente.situacao = nova_situacao
-        cliente.save()
-        
+        situacao.mudar_situacao(cliente, nova_situacao)
+
         serializer = self.get_serializer(cliente)
         return Response(serializer.data)
+
+
+    @action(detail=False, methods=['patch'], url_path='situacao-lote')
+    def situacao_lote(self, request):
+        """
+        Move vários clientes para a mesma situação de uma vez.
+        Espera um corpo como: { "ids": [1, 2, 3], "situacao": "PERDIDO" }
+        Os clientes são gravados com um UPDATE por bloco e o histórico com
+        bulk_create; quem já estava na situação pedida fica como está. A
+        resposta traz quantos mudaram e os ids que não existem.
+        """
+        if not isinstance(request.data, dict):
+            return Response({'erro': 'O corpo deve ser um objeto JSON com "ids" e "situacao".'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        nova_situacao = request.data.get('situacao')
+        if not situacao.situacao_valida(nova_situacao):
+            return Response(
+                {'erro': f"Situação inválida. Opções são: {Cliente.SituacaoAtendimento.values}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return Response({'erro': '"ids" deve ser uma lista de inteiros.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > situacao.MAXIMO_IDS:
+            return Response({'erro': f'No máximo {situacao.MAXIMO_IDS} clientes por requisição.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'situacao': nova_situacao, **situacao.mudar_situacao_em_lote(ids, nova_situacao)})
+
+
+class JobClassificacaoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Acompanha os jobs de classificação criados com ?async=1.
+    Filtros: ?cliente=5, ?status=PENDENTE
+    """
+    queryset = JobClassificacao.objects.all().order_by('-id')
+    serializer_class = JobClassificacaoSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['cliente', 'status']